@@ -0,0 +1,95 @@
+# Compares the original once-per-second check_alarms loop with the
+# vectorized scan BatchScheduler runs on each tick (AlarmEngine(batch=True),
+# server.py --batch).
+#
+#   python benchmarks/batch_eval.py [counts...]
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine import AlarmEngine
+from recurrence import DAILY_RULE
+from store import load_numpy
+
+DEFAULT_COUNTS = (10_000, 100_000, 1_000_000)
+
+
+class LegacyAlarm:
+    # The per-alarm check as it was before the scheduler rewrite
+    def __init__(self, time, sound, snooze_duration=5, enabled=True):
+        self.time = time
+        self.sound = sound
+        self.snooze_duration = snooze_duration
+        self.enabled = enabled
+        self.snoozed_until = None
+        self.is_playing = False
+        self.last_triggered_minute = None
+
+    def check_and_trigger(self):
+        now = datetime.now()
+        current_time = now.strftime("%H:%M")
+        alarm_time = self.time.strftime("%H:%M")
+        current_minute = now.strftime("%H:%M")
+        if self.enabled and current_time == alarm_time and not self.is_playing:
+            if self.last_triggered_minute != current_minute:
+                if self.snoozed_until is None or now >= self.snoozed_until:
+                    self.is_playing = True
+                    self.last_triggered_minute = current_minute
+                    return True
+        return False
+
+
+def legacy_check_alarms(alarms):
+    for alarm in alarms:
+        if alarm.check_and_trigger():
+            break
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(count, repeat=3):
+    # Spread alarms over the next day so none of them is due right now
+    now = datetime.now()
+    times = [now + timedelta(minutes=2 + i % 1400) for i in range(count)]
+
+    legacy = [LegacyAlarm(t, "SamsungAlarm.mp3") for t in times]
+    legacy_seconds = best_of(lambda: legacy_check_alarms(legacy), repeat)
+    del legacy
+
+    engine = AlarmEngine(batch=True)
+    engine.add_many((int(t.timestamp()), "SamsungAlarm.mp3", 5, True, 100, DAILY_RULE, None)
+                    for t in times)
+    timestamp = now.timestamp()
+    batch_seconds = best_of(lambda: engine.scheduler.pop_due(timestamp), repeat)
+
+    return {
+        "alarms": count,
+        "legacy_loop_ms": legacy_seconds * 1000,
+        "batch_ms": batch_seconds * 1000,
+        "speedup": legacy_seconds / batch_seconds,
+    }
+
+
+def main(argv):
+    counts = [int(value) for value in argv] or DEFAULT_COUNTS
+    if load_numpy() is None:
+        print("numpy is not installed; the batch scan uses the pure Python fallback")
+    print(f"{'alarms':>10} {'legacy loop ms':>15} {'batch ms':>10} {'speedup':>8}")
+    for count in counts:
+        result = run(count)
+        print(f"{result['alarms']:>10} {result['legacy_loop_ms']:>15.2f} "
+              f"{result['batch_ms']:>10.2f} {result['speedup']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,95 @@
+# Cost to the window of many alarms falling due in the same second. The
+# batched path (FireDispatcher -> AlarmClock.trigger_alarms) is compared with
+# handling each alarm on its own as the window did before, one mixer voice
+# and one list update per alarm. Runs headless (offscreen Qt, dummy SDL audio).
+#
+#   python benchmarks/fire_burst.py [counts...] [--output fire-burst.json]
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from recurrence import ONCE_RULE
+from soundbank import BUILTIN_SOUNDS
+from suite import application, window
+
+DEFAULT_COUNTS = (100, 1000, 10000)
+
+
+def handle_each(win, alarms):
+    # The window before batching: a voice and a row update per alarm. Every
+    # voice past the mixer's channel count steals one.
+    for alarm in alarms:
+        sound = win.sound_bank.get(alarm.sound)
+        win.mixer.play(alarm.id, sound, alarm.volume / 100, loops=-1)
+        win.alarm_model.refresh_id(alarm.id)
+        win.ringing_alarms[alarm.id] = alarm
+    win.show_next_alarm()
+
+
+def burst(win, app, count, batched):
+    # Add count alarms due at one instant, tick the engine there and time
+    # until the window has dealt with every one of them
+    from PyQt5.QtCore import QEventLoop
+    due = int(time.time()) + 3600
+    alarms = win.engine.add_many([(due, BUILTIN_SOUNDS[i % len(BUILTIN_SOUNDS)], 5, True,
+                                   10 + i % 90, ONCE_RULE, None) for i in range(count)])
+    handled = []
+    if batched:
+        receiver = win.dispatcher.fired.connect(lambda alarms: handled.extend(alarms))
+    else:
+        win.dispatcher.fired.disconnect(win.trigger_alarms)
+        receiver = win.dispatcher.fired.connect(lambda alarms: (handle_each(win, alarms),
+                                                                handled.extend(alarms)))
+    try:
+        start = time.perf_counter()
+        win.engine.tick(datetime.fromtimestamp(due))
+        while len(handled) < count:
+            app.processEvents(QEventLoop.AllEvents, 50)
+        seconds = time.perf_counter() - start
+        voices = len(win.mixer)
+    finally:
+        win.dispatcher.fired.disconnect(receiver)
+        if not batched:
+            win.dispatcher.fired.connect(win.trigger_alarms)
+        win.mixer.stop_all()
+        win.ringing_alarms.clear()
+        win.show_next_alarm()
+        for alarm in alarms:
+            win.engine.remove(alarm.id)
+    return {"alarms": count, "mode": "batched" if batched else "per_alarm",
+            "seconds": seconds, "per_alarm_us": seconds / count * 1e6, "voices": voices}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Simultaneous alarm burst benchmark")
+    parser.add_argument("counts", nargs="*", type=int, default=DEFAULT_COUNTS)
+    parser.add_argument("--output", default="fire-burst.json")
+    args = parser.parse_args(argv)
+
+    app = application()
+    win = window(app)
+    win.init_audio()
+    for sound in BUILTIN_SOUNDS:
+        win.sound_bank.check(sound)
+    results = []
+    for count in args.counts:
+        for batched in (False, True):
+            result = burst(win, app, count, batched)
+            results.append(result)
+            print(f"{count:>7} alarms {result['mode']:>9}: {result['seconds'] * 1000:9.1f} ms "
+                  f"({result['per_alarm_us']:6.1f} µs per alarm), {result['voices']} voices")
+    win.close()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
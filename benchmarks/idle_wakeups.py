@@ -0,0 +1,85 @@
+# Timer wakeups and clock repaints of an idle window: shown, hidden, and
+# shown in low-refresh mode once the user has gone idle (minute updates, no
+# second hand). Each state is watched for the same stretch of wall time with
+# no alarms due. Runs headless (offscreen Qt, dummy SDL audio).
+#
+#   python benchmarks/idle_wakeups.py [seconds] [--output idle-wakeups.json]
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+# Low-refresh mode is chosen at start-up; the plain states below never go idle
+os.environ["ALARM_CLOCK_LOW_REFRESH"] = "1"
+
+from suite import application, window
+
+DEFAULT_SECONDS = 10
+
+
+def watch(win, app, seconds):
+    # Clock timer wakeups and analog clock paint events over seconds of wall time
+    from PyQt5.QtCore import QEventLoop, QObject
+
+    class PaintCounter(QObject):
+        paints = 0
+
+        def eventFilter(self, watched, event):
+            if event.type() == event.Paint:
+                self.paints += 1
+            return False
+
+    wakeups = 0
+
+    def woke():
+        nonlocal wakeups
+        wakeups += 1
+
+    counter = PaintCounter()
+    win.analog_clock.installEventFilter(counter)
+    win.clock.timer.timeout.connect(woke)
+    try:
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            app.processEvents(QEventLoop.AllEvents, 50)
+    finally:
+        win.clock.timer.timeout.disconnect(woke)
+        win.analog_clock.removeEventFilter(counter)
+    return {"seconds": seconds, "wakeups": wakeups, "paints": counter.paints,
+            "wakeups_per_minute": wakeups / seconds * 60}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Idle timer wakeups per display state")
+    parser.add_argument("seconds", nargs="?", type=float, default=DEFAULT_SECONDS)
+    parser.add_argument("--output", default="idle-wakeups.json")
+    args = parser.parse_args(argv)
+
+    app = application()
+    win = window(app)
+    results = {}
+    # As if the user stayed active throughout the first run
+    win.power.set_idle(False)
+    win.power.idle_timer.stop()
+    results["visible"] = watch(win, app, args.seconds)
+    win.hide()
+    results["hidden"] = watch(win, app, args.seconds)
+    win.show()
+    app.processEvents()  # coming back into view counts as activity
+    win.power.set_idle(True)
+    results["low_refresh_idle"] = watch(win, app, args.seconds)
+    for name, result in results.items():
+        print(f"{name:>16}: {result['wakeups']:4d} wakeups, {result['paints']:4d} clock repaints "
+              f"in {result['seconds']:g} s ({result['wakeups_per_minute']:.1f} wakeups/min)")
+    win.close()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
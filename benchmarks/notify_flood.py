@@ -0,0 +1,66 @@
+# Alarm firing latency with and without a flood of notifications. The same
+# trigger measurement as suite.py (due second to sound starting, through the
+# window's own timer and event loop) runs once on a quiet window and once
+# while a timer posts notifications every few milliseconds, a mix of new and
+# repeated messages. With the non-modal ToastArea the two should match.
+# Runs headless (offscreen Qt, dummy SDL audio).
+#
+#   python benchmarks/notify_flood.py [--quick] [--interval-ms N] [--output flood.json]
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from suite import application, bench_trigger, window
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Firing latency under a notification flood")
+    parser.add_argument("--quick", action="store_true", help="5 alarms per run instead of 20")
+    parser.add_argument("--interval-ms", type=int, default=2, help="time between notifications")
+    parser.add_argument("--output", default="notify-flood.json")
+    args = parser.parse_args(argv)
+
+    from PyQt5.QtCore import QTimer
+    app = application()
+    win = window(app)
+    win.init_audio()
+
+    quiet = bench_trigger(win, app, args.quick)
+
+    posted = 0
+
+    def post():
+        nonlocal posted
+        posted += 1
+        # Every other message repeats, to exercise the deduplication too
+        text = "Something happened" if posted % 2 else f"Event number {posted}"
+        win.toasts.notify("Flood", text, warning=posted % 3 == 0)
+
+    flood = QTimer()
+    flood.timeout.connect(post)
+    flood.start(args.interval_ms)
+    try:
+        flooded = bench_trigger(win, app, args.quick)
+    finally:
+        flood.stop()
+
+    results = {"quiet": quiet, "flooded": flooded, "notifications": posted,
+               "dropped": win.toasts.dropped, "shown_at_end": len(win.toasts.showing)}
+    for name in ("quiet", "flooded"):
+        latency = results[name]
+        print(f"{name:>8}: p50 {latency['p50_ms']:7.2f} ms, p90 {latency['p90_ms']:7.2f} ms, "
+              f"max {latency['max_ms']:7.2f} ms")
+    print(f"{posted} notifications posted, {win.toasts.dropped} dropped from the queue")
+    win.close()
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
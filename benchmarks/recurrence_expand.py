@@ -0,0 +1,62 @@
+# Expands a year of occurrences for a large set of recurring alarms and
+# measures next-occurrence lookups. Every alarm has its own start time, so
+# nothing is served from a cache of earlier expansions.
+#
+#   python benchmarks/recurrence_expand.py [alarms]
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from recurrence import DAILY, MINUTELY, WEEKDAYS, WEEKENDS, WEEKLY, RecurrenceRule
+from store import AlarmStore
+
+DEFAULT_ALARMS = 100_000
+
+RULES = (
+    RecurrenceRule(DAILY),
+    RecurrenceRule(DAILY, interval=2),
+    RecurrenceRule(WEEKLY, weekdays=WEEKDAYS),
+    RecurrenceRule(WEEKLY, weekdays=WEEKENDS),
+    RecurrenceRule(WEEKLY, interval=2, weekdays=0b0010101),
+    RecurrenceRule(MINUTELY, interval=240),
+)
+
+
+def main(argv):
+    count = int(argv[0]) if argv else DEFAULT_ALARMS
+    midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    # Alarms started on different days over the past month, each at its own second
+    store = AlarmStore()
+    first = int((midnight - timedelta(days=30)).timestamp())
+    starts = random.Random(0).sample(range(first, first + 30 * 86400), count)
+    for i, start in enumerate(starts):
+        store.add(start, "SamsungAlarm.mp3", rule=RULES[i % len(RULES)])
+
+    window_start = int(midnight.timestamp())
+    window_end = int((midnight + timedelta(days=365)).timestamp())
+
+    start = time.perf_counter()
+    occurrences = 0
+    for alarm_id in store:
+        occurrences += len(store.occurrences(alarm_id, window_start, window_end))
+    expand_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    now = window_start + 200 * 86400
+    for alarm_id in store:
+        store.rules[store.rule_id[alarm_id]].next_after(store.start_time[alarm_id], now)
+    next_seconds = time.perf_counter() - start
+
+    print(f"{count} alarms, {len(store.rules)} rules, {len(set(starts))} start times")
+    print(f"expanded {occurrences} occurrences over 365 days in {expand_seconds:.3f} s")
+    print(f"next occurrence for every alarm 200 days out in {next_seconds:.3f} s "
+          f"({next_seconds / count * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,161 @@
+# Load test of the alarm server (server.py). Starts a server without audio
+# or a database, connects thousands of simulated subscribers and a set of
+# clients issuing requests, all driven by asyncio in this process, and
+# measures request latency, request throughput and how long fire events take
+# to reach every subscriber.
+#
+#   python benchmarks/server_load.py [--subscribers N] [--clients N] [--requests N]
+#                                    [--alarms N] [--output server-load.json]
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from server import _raise_file_limit, encode
+from suite import percentiles
+
+# Connections opened at once while the subscribers connect
+CONNECT_BATCH = 100
+
+
+async def rpc(reader, writer, method, request_id, **params):
+    writer.write(encode({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+    await writer.drain()
+    while True:
+        message = json.loads(await reader.readline())
+        if message.get("id") == request_id:
+            return message
+
+
+class Subscriber:
+    def __init__(self):
+        self.delays = []  # receive time minus the alarm's fire time, seconds
+        self.publish_delays = []  # the server's send time minus the fire time
+        self.task = None
+
+    async def connect(self, path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        await rpc(reader, writer, "subscribe", 1, events=["fired"])
+        self.writer = writer
+        self.task = asyncio.ensure_future(self._listen(reader))
+
+    async def _listen(self, reader):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            params = json.loads(line)["params"]
+            self.delays.append(time.time() - params["alarm"]["fire_time"])
+            self.publish_delays.append(params["time"] - params["alarm"]["fire_time"])
+
+
+async def request_client(path, requests, latencies):
+    # add, get and remove one alarm an hour away, over and over
+    reader, writer = await asyncio.open_unix_connection(path)
+    due = int(time.time()) + 3600
+    for i in range(0, requests, 3):
+        start = time.perf_counter()
+        added = await rpc(reader, writer, "add", i, time=due, rule="FREQ=ONCE")
+        latencies.append(time.perf_counter() - start)
+        key = added["result"]["key"]
+        for method in ("get", "remove"):
+            start = time.perf_counter()
+            await rpc(reader, writer, method, i, key=key)
+            latencies.append(time.perf_counter() - start)
+    writer.close()
+
+
+async def load_test(path, args):
+    subscribers = [Subscriber() for _ in range(args.subscribers)]
+    start = time.perf_counter()
+    for i in range(0, len(subscribers), CONNECT_BATCH):
+        await asyncio.gather(*(s.connect(path) for s in subscribers[i:i + CONNECT_BATCH]))
+    connect_seconds = time.perf_counter() - start
+
+    latencies = []
+    start = time.perf_counter()
+    await asyncio.gather(*(request_client(path, args.requests, latencies)
+                           for _ in range(args.clients)))
+    request_seconds = time.perf_counter() - start
+
+    # Alarms due together at the next whole second but one
+    reader, writer = await asyncio.open_unix_connection(path)
+    due = int(time.time()) + 2
+    await rpc(reader, writer, "add_many", 1,
+              alarms=[{"time": due, "rule": "FREQ=ONCE"} for _ in range(args.alarms)])
+    expected = args.alarms
+    deadline = time.time() + 30
+    while time.time() < deadline and any(len(s.delays) < expected for s in subscribers):
+        await asyncio.sleep(0.05)
+    delays = [delay for s in subscribers for delay in s.delays]
+    published = [delay for s in subscribers for delay in s.publish_delays]
+    for s in subscribers:
+        s.task.cancel()
+        s.writer.close()
+    writer.close()
+
+    return {
+        "subscribers": args.subscribers,
+        "connect_seconds": connect_seconds,
+        "requests": {
+            "clients": args.clients,
+            "count": len(latencies),
+            "per_second": len(latencies) / request_seconds,
+            "latency": percentiles(latencies),
+        },
+        "fan_out": {
+            "alarms": args.alarms,
+            "delivered": len(delays),
+            "expected": expected * args.subscribers,
+            "delay": percentiles(delays) if delays else None,
+            "publish_delay": percentiles(published) if published else None,
+        },
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Alarm server load test")
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=300, help="per client")
+    parser.add_argument("--alarms", type=int, default=10, help="alarms fired at once")
+    parser.add_argument("--output", default="server-load.json")
+    args = parser.parse_args(argv)
+
+    _raise_file_limit()
+    path = os.path.join(tempfile.mkdtemp(), "alarms.sock")
+    server = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py"), "--socket", path,
+                               "--memory", "--no-audio"], stdout=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(path):
+            if server.poll() is not None:
+                raise SystemExit("The alarm server did not start")
+            time.sleep(0.05)
+        results = asyncio.run(load_test(path, args))
+    finally:
+        server.terminate()
+        server.wait()
+
+    requests, fan_out = results["requests"], results["fan_out"]
+    print(f"{results['subscribers']} subscribers connected in {results['connect_seconds']:.2f}s")
+    print(f"{requests['count']} requests from {requests['clients']} clients: "
+          f"{requests['per_second']:.0f}/s, p50 {requests['latency']['p50_ms']:.2f} ms, "
+          f"p99 {requests['latency']['p99_ms']:.2f} ms")
+    if fan_out["delay"]:
+        print(f"fan-out: {fan_out['delivered']}/{fan_out['expected']} events, "
+              f"p50 {fan_out['delay']['p50_ms']:.1f} ms, p99 {fan_out['delay']['p99_ms']:.1f} ms, "
+              f"max {fan_out['delay']['max_ms']:.1f} ms after the due second "
+              f"(published after p50 {fan_out['publish_delay']['p50_ms']:.1f} ms)")
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
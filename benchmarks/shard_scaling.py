@@ -0,0 +1,102 @@
+# Throughput of sharded scheduling (shards.py) against the number of worker
+# processes. Every run loads the same number of alarms, all due at one
+# instant, and measures how long it takes from that instant until the
+# dispatcher has received every fire event. On a machine with fewer cores
+# than shards the extra shards only add overhead.
+#
+#   python benchmarks/shard_scaling.py [alarms] [--shards 1,2,4,8] [--output shards.json]
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import AlarmEngine
+from recurrence import ONCE_RULE
+from shards import ShardedScheduler
+
+DEFAULT_ALARMS = 1_000_000
+
+# Time allowed for loading before the alarms fall due
+LEAD_SECONDS = 3
+
+
+def records(count, due):
+    return [(due, None, 5, True, 100, ONCE_RULE, None)] * count
+
+
+def run_single(count):
+    # Baseline: one engine in this process
+    engine = AlarmEngine()
+    due = int(time.time()) + 1
+    start = time.perf_counter()
+    engine.add_many(records(count, due))
+    load_seconds = time.perf_counter() - start
+    time.sleep(max(0.0, due - time.time()))
+    start = time.perf_counter()
+    fired = len(engine.tick())
+    fire_seconds = time.perf_counter() - start
+    return {"shards": 0, "fired": fired, "load_seconds": load_seconds,
+            "fire_seconds": fire_seconds, "fired_per_second": fired / fire_seconds}
+
+
+def run_sharded(count, shards):
+    received = 0
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_fired(rows):
+        nonlocal received
+        with lock:
+            received += len(rows)
+            if received >= count:
+                done.set()
+
+    scheduler = ShardedScheduler(shards, on_fired)
+    try:
+        len(scheduler)  # wait for every worker to be up
+        due = int(time.time()) + LEAD_SECONDS
+        start = time.perf_counter()
+        scheduler.add_many(records(count, due))
+        len(scheduler)  # returns once every shard has inserted its share
+        load_seconds = time.perf_counter() - start
+        if time.time() >= due:
+            print(f"warning: loading took longer than {LEAD_SECONDS}s, raise LEAD_SECONDS")
+        time.sleep(max(0.0, due - time.time()))
+        start = time.perf_counter()
+        done.wait(600)
+        fire_seconds = time.perf_counter() - start
+    finally:
+        scheduler.close()
+    return {"shards": shards, "fired": received, "load_seconds": load_seconds,
+            "fire_seconds": fire_seconds, "fired_per_second": received / fire_seconds}
+
+
+def main(argv):
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="Sharded scheduling scaling benchmark")
+    parser.add_argument("alarms", nargs="?", type=int, default=DEFAULT_ALARMS)
+    parser.add_argument("--shards", help="comma-separated shard counts "
+                        "(default: powers of two up to the core count)",
+                        default=",".join(str(1 << i) for i in range(cores.bit_length())))
+    parser.add_argument("--output", default="shard-scaling.json")
+    args = parser.parse_args(argv)
+
+    results = [run_single(args.alarms)]
+    results += [run_sharded(args.alarms, int(n)) for n in args.shards.split(",")]
+    baseline = results[0]["fired_per_second"]
+    for result in results:
+        result["speedup"] = result["fired_per_second"] / baseline
+        name = f"{result['shards']} shards" if result["shards"] else "in-process"
+        print(f"{name:>12}: {result['fired_per_second']:12,.0f} alarms/s fired "
+              f"({result['speedup']:.2f}x), load {result['load_seconds']:.2f}s")
+    with open(args.output, "w") as f:
+        json.dump({"cores": cores, "alarms": args.alarms, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,88 @@
+# Cold-start time of the Qt window: from launching a fresh interpreter to
+# the first frame of the main window being painted, plus the time until
+# audio is ready to play an alarm.
+#
+#   python benchmarks/startup.py [runs] [--output startup.json]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_RUNS = 5
+
+# Runs inside the child interpreter; prints the milestones as JSON
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, ROOT)
+from PyQt5.QtCore import QEvent, QObject, QTimer
+from PyQt5.QtWidgets import QApplication
+marks = {}
+
+class FirstPaint(QObject):
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint and "first_frame" not in marks:
+            marks["first_frame"] = time.time()
+        return False
+
+app = QApplication(sys.argv)
+spy = FirstPaint()
+app.installEventFilter(spy)
+import main
+marks["imported"] = time.time()
+window = main.AlarmClock()
+window.show()
+
+def check():
+    if "first_frame" in marks and window.mixer is not None and "audio_ready" not in marks:
+        marks["audio_ready"] = time.time()
+    if "audio_ready" in marks:
+        print(json.dumps(marks), flush=True)
+        window.close()
+        app.quit()
+
+poll = QTimer()
+poll.timeout.connect(check)
+poll.start(1)
+app.exec_()
+"""
+
+
+def run_once():
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env.setdefault("SDL_AUDIODRIVER", "dummy")
+    env.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    env["ALARM_CLOCK_DB"] = os.path.join(tempfile.mkdtemp(), "startup.db")
+    # The child reports wall-clock times, so interpreter start-up is included
+    launched = time.time()
+    result = subprocess.run([sys.executable, "-c", f"ROOT = {ROOT!r}\n" + CHILD], cwd=ROOT,
+                            env=env, capture_output=True, text=True, check=True)
+    marks = json.loads(result.stdout.strip().splitlines()[-1])
+    return {name: value - launched for name, value in marks.items()}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("runs", nargs="?", type=int, default=DEFAULT_RUNS)
+    parser.add_argument("--output")
+    args = parser.parse_args(argv)
+
+    runs = [run_once() for _ in range(args.runs)]
+    summary = {name: {"median_ms": statistics.median(run[name] for run in runs) * 1000,
+                      "min_ms": min(run[name] for run in runs) * 1000}
+               for name in ("imported", "first_frame", "audio_ready")}
+    for name, values in summary.items():
+        print(f"{name:>12}: median {values['median_ms']:7.1f} ms, min {values['min_ms']:7.1f} ms")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": runs, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+# Start-up time and resident memory of playing a large WAV file, decoded
+# whole into a pygame Sound (as SoundBank does for small files) against
+# streamed from a memory map (streaming.py). Several copies play at once to
+# show the per-alarm cost. Runs headless with SDL's dummy audio driver.
+#
+#   python benchmarks/streaming.py [minutes] [--voices N] [--output streaming.json]
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+DEFAULT_MINUTES = 10
+DEFAULT_VOICES = 4
+
+# How long each mode plays before its memory is read
+PLAY_SECONDS = 3
+
+
+def resident_bytes():
+    # Current resident set size (Linux); peak size elsewhere
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def write_wav(path, minutes, frequency, channels):
+    second = os.urandom(frequency * channels * 2)  # noise does not compress or repeat
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(frequency)
+        for _ in range(int(minutes * 60)):
+            f.writeframes(second)
+
+
+def run(name, load, mixer, voices):
+    before = resident_bytes()
+    start = time.perf_counter()
+    sources = []
+    for voice in range(voices):
+        source = load()
+        mixer.play(voice, source, loops=-1)
+        if voice == 0:
+            first_seconds = time.perf_counter() - start
+        sources.append(source)
+    all_seconds = time.perf_counter() - start
+    time.sleep(PLAY_SECONDS)
+    resident = resident_bytes() - before
+    playing = sum(mixer.is_playing(voice) for voice in range(voices))
+    mixer.stop_all()
+    return {"mode": name, "voices": voices, "playing": playing,
+            "first_audio_seconds": first_seconds, "all_started_seconds": all_seconds,
+            "resident_bytes": resident, "resident_bytes_per_voice": resident / voices}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Streamed against decoded playback")
+    parser.add_argument("minutes", nargs="?", type=float, default=DEFAULT_MINUTES)
+    parser.add_argument("--voices", type=int, default=DEFAULT_VOICES)
+    parser.add_argument("--output", default="streaming.json")
+    args = parser.parse_args(argv)
+
+    import pygame
+    from mixer import AlarmMixer
+    from streaming import open_stream
+    pygame.mixer.init()
+    frequency, _, channels = pygame.mixer.get_init()
+    mixer = AlarmMixer()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "long.wav")
+        write_wav(path, args.minutes, frequency, channels)
+        size = os.path.getsize(path)
+        # Streaming first, so the decoded run cannot leave it a warmed-up heap
+        results = [run("streamed", lambda: open_stream(path), mixer, args.voices),
+                   run("decoded", lambda: pygame.mixer.Sound(path), mixer, args.voices)]
+    for result in results:
+        print(f"{result['mode']:>9}: first audio {result['first_audio_seconds'] * 1000:8.1f} ms, "
+              f"{result['voices']} voices {result['all_started_seconds'] * 1000:8.1f} ms, "
+              f"+{result['resident_bytes'] / 2**20:7.1f} MiB resident "
+              f"({result['resident_bytes_per_voice'] / 2**20:.1f} MiB per voice)")
+    with open(args.output, "w") as f:
+        json.dump({"file_bytes": size, "minutes": args.minutes, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
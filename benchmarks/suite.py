@@ -0,0 +1,252 @@
+# Headless benchmark suite. Runs the alarm core, the Qt window and the audio
+# path with an offscreen Qt platform and a dummy SDL audio driver, and writes
+# every measurement to a JSON file so releases can be compared.
+#
+#   python benchmarks/suite.py [--quick] [--output results.json] [section ...]
+#
+# Sections: tick, add_remove, trigger, paint, sounds (default: all)
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import AlarmEngine
+from recurrence import ONCE_RULE
+from store import load_numpy
+
+TICK_COUNTS = (1_000, 10_000, 100_000, 1_000_000)
+QUICK_TICK_COUNTS = (1_000, 10_000, 100_000)
+
+
+def percentiles(samples):
+    # Summary of a list of durations in seconds, reported in milliseconds
+    ms = sorted(sample * 1000 for sample in samples)
+    cuts = statistics.quantiles(ms, n=100, method="inclusive") if len(ms) > 1 else ms * 99
+    return {
+        "n": len(ms),
+        "min_ms": ms[0],
+        "p50_ms": cuts[49],
+        "p90_ms": cuts[89],
+        "p99_ms": cuts[98],
+        "max_ms": ms[-1],
+        "mean_ms": statistics.fmean(ms),
+    }
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def populated_engine(count, batch=False):
+    # Alarms spread over the next day, none of them due right now
+    engine = AlarmEngine(batch=batch)
+    start = int(time.time()) + 120
+    engine.add_many((start + 60 * (i % 1400), "SamsungAlarm.mp3", 5, True, 100, ONCE_RULE,
+                     None) for i in range(count))
+    return engine
+
+
+def bench_tick(quick):
+    # Cost of one scheduler tick with nothing due, and of a tick that fires
+    # one alarm, for each scheduler implementation
+    results = []
+    for count in QUICK_TICK_COUNTS if quick else TICK_COUNTS:
+        for batch in (False, True):
+            engine = populated_engine(count, batch)
+            now = datetime.now()
+            idle = timed(lambda: engine.tick(now), 200)
+            firing = []
+            for _ in range(20):
+                alarm = engine.add(now, "SamsungAlarm.mp3", rule=ONCE_RULE)
+                start = time.perf_counter()
+                engine.tick(now)
+                firing.append(time.perf_counter() - start)
+                engine.remove(alarm.id)
+            results.append({
+                "alarms": count,
+                "scheduler": "batch" if batch else "heap",
+                "idle_tick": percentiles(idle),
+                "firing_tick": percentiles(firing),
+            })
+    return results
+
+
+def bench_add_remove(quick):
+    count = 20_000 if quick else 100_000
+    engine = AlarmEngine()
+    when = datetime.now() + timedelta(hours=1)
+    start = time.perf_counter()
+    alarms = [engine.add(when, "SamsungAlarm.mp3") for _ in range(count)]
+    add_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for alarm in alarms:
+        engine.remove(alarm.id)
+    remove_seconds = time.perf_counter() - start
+
+    epoch = int(when.timestamp())
+    start = time.perf_counter()
+    engine.add_many((epoch, "SamsungAlarm.mp3", 5, True, 100, ONCE_RULE, None) for _ in range(count))
+    bulk_seconds = time.perf_counter() - start
+    return {
+        "alarms": count,
+        "add_per_second": count / add_seconds,
+        "remove_per_second": count / remove_seconds,
+        "bulk_add_per_second": count / bulk_seconds,
+    }
+
+
+def application():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def window(app):
+    # A throwaway database and sound cache, so runs neither touch the user's
+    # files nor time decodes against a cache warmed by an earlier run
+    import tempfile
+    directory = tempfile.mkdtemp()
+    os.environ["ALARM_CLOCK_DB"] = os.path.join(directory, "bench.db")
+    os.environ["ALARM_CLOCK_SOUND_CACHE"] = os.path.join(directory, "sounds")
+    import main
+    win = main.AlarmClock()
+    win.show()
+    app.processEvents()
+    return win
+
+
+def bench_trigger(win, app, quick):
+    # Wall-clock delay from an alarm's due second to its sound starting on a
+    # mixer voice, going through the window's own timer and event loop
+    from PyQt5.QtCore import QEventLoop, QTimer
+    samples = []
+    fired = []
+    win.dispatcher.fired.connect(lambda alarms: fired.append(time.time()))
+    for _ in range(5 if quick else 20):
+        due = int(time.time()) + 1
+        alarm = win.engine.add(datetime.fromtimestamp(due), "SamsungAlarm.mp3", rule=ONCE_RULE)
+        loop = QEventLoop()
+        poll = QTimer()
+        poll.timeout.connect(lambda: loop.quit() if fired else None)
+        poll.start(1)
+        QTimer.singleShot(5000, loop.quit)
+        loop.exec_()
+        poll.stop()
+        if fired and win.mixer.is_playing(alarm.id):
+            samples.append(fired.pop() - due)
+        fired.clear()
+        win.stop_alarm()
+        win.engine.remove(alarm.id)
+    return percentiles(samples) if samples else None
+
+
+def bench_paint(win, app, quick):
+    # Time per frame of the analog clock: with the cached face, and when the
+    # face has to be rendered again (resize or theme change)
+    clock = win.analog_clock
+    frames = 50 if quick else 300
+
+    def frame():
+        clock.repaint()
+
+    def cold_frame():
+        clock.invalidate_face()
+        clock.repaint()
+
+    timed(frame, 5)
+    return {
+        "size": [clock.width(), clock.height()],
+        "cached_face": percentiles(timed(frame, frames)),
+        "face_rerender": percentiles(timed(cold_frame, frames // 5)),
+    }
+
+
+def bench_sounds(win):
+    # Load and decode time of each bundled sound, from disk to PCM
+    import pygame
+    from soundbank import BUILTIN_SOUNDS
+    results = {}
+    for name in BUILTIN_SOUNDS:
+        path = os.path.join(ROOT, name)
+        samples = timed(lambda: pygame.mixer.Sound(path), 3)
+        sound = pygame.mixer.Sound(path)
+        results[name] = {
+            "bytes": os.path.getsize(path),
+            "duration_s": sound.get_length(),
+            "decode": percentiles(samples),
+        }
+    return results
+
+
+def metadata():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": load_numpy() and load_numpy().__version__,
+    }
+
+
+SECTIONS = ("tick", "add_remove", "trigger", "paint", "sounds")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Headless alarm clock benchmarks")
+    parser.add_argument("sections", nargs="*", metavar="section",
+                        help="any of " + ", ".join(SECTIONS))
+    parser.add_argument("--quick", action="store_true", help="smaller sizes, fewer samples")
+    parser.add_argument("--output", default="benchmark-results.json")
+    args = parser.parse_args(argv)
+    sections = args.sections or SECTIONS
+    for section in sections:
+        if section not in SECTIONS:
+            parser.error(f"unknown section: {section}")
+
+    output = os.path.abspath(args.output)
+    os.chdir(ROOT)  # the bundled sounds are referenced by relative path
+    results = {"meta": metadata()}
+    if "tick" in sections:
+        results["tick"] = bench_tick(args.quick)
+    if "add_remove" in sections:
+        results["add_remove"] = bench_add_remove(args.quick)
+    if {"trigger", "paint", "sounds"} & set(sections):
+        app = application()
+        win = window(app)
+        if "trigger" in sections:
+            results["trigger_latency"] = bench_trigger(win, app, args.quick)
+        if "paint" in sections:
+            results["paint"] = bench_paint(win, app, args.quick)
+        if "sounds" in sections:
+            results["sounds"] = bench_sounds(win)
+        win.close()
+
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {output}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,119 @@
+# Compares the heap scheduler (AlarmScheduler) with the timing wheel
+# (TimingWheelScheduler) on the workloads the wheel is meant for. Both
+# schedulers get the same alarms, spread over the next day, and a simulated
+# clock, so the runs do not depend on the wall clock.
+#
+#   schedule     insert every alarm
+#   snooze storm a burst of alarms falls due in one second, is popped and
+#                every one of them is snoozed 5 minutes at once; the clock
+#                then runs to the end of the snooze
+#   mass cancel  cancel half of the alarms, then find the next deadline
+#
+#   python benchmarks/wheel_vs_heap.py [alarms] [--storm N] [--output wheel.json]
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import AlarmScheduler, TimingWheelScheduler
+
+DEFAULT_ALARMS = 200_000
+DEFAULT_STORM = 20_000
+SNOOZE_SECONDS = 300
+DAY_SECONDS = 86400
+
+# Simulated clock start, on a whole day so the cascades line up as in use
+CLOCK = 1_767_225_600
+
+SCHEDULERS = {
+    "heap": AlarmScheduler,
+    "wheel": lambda: TimingWheelScheduler(now=CLOCK),
+}
+
+
+def workload(alarms, storm, seed=1):
+    # (alarm id, deadline) pairs: the storm all due one minute in, the rest
+    # spread over the day
+    rng = random.Random(seed)
+    due = CLOCK + 60
+    entries = [(i, due) for i in range(storm)]
+    entries += [(i, CLOCK + 120 + rng.randrange(DAY_SECONDS)) for i in range(storm, alarms)]
+    rng.shuffle(entries)
+    return entries
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def advance(scheduler, start, end):
+    # Pop second by second, as the engine's timer does while alarms are due
+    fired = 0
+    for now in range(start, end + 1):
+        fired += len(scheduler.pop_due(now))
+    return fired
+
+
+def run(name, entries, storm):
+    scheduler = SCHEDULERS[name]()
+    result = {"scheduler": name}
+
+    _, result["schedule_seconds"] = timed(
+        lambda: [scheduler.schedule(alarm_id, when) for alarm_id, when in entries])
+
+    # Snooze storm
+    _, result["advance_seconds"] = timed(advance, scheduler, CLOCK, CLOCK + 59)
+    due_at = CLOCK + 60
+    ringing, result["storm_pop_seconds"] = timed(scheduler.pop_due, due_at)
+    snoozed = due_at + SNOOZE_SECONDS
+    _, result["storm_snooze_seconds"] = timed(
+        lambda: [scheduler.schedule(alarm_id, snoozed) for alarm_id in ringing])
+    fired, result["storm_refire_seconds"] = timed(advance, scheduler, due_at + 1, snoozed)
+    result["storm_alarms"] = len(ringing)
+    result["storm_fired"] = fired
+
+    # Mass cancel: every other remaining alarm, then the next deadline
+    remaining = [alarm_id for alarm_id, when in entries if when > snoozed]
+    cancelled = remaining[::2]
+    _, result["cancel_seconds"] = timed(lambda: [scheduler.cancel(i) for i in cancelled])
+    _, result["next_deadline_seconds"] = timed(scheduler.next_deadline)
+    result["cancelled"] = len(cancelled)
+    result["left"] = len(scheduler)
+
+    # Everything still scheduled is due within the day
+    fired, result["drain_seconds"] = timed(scheduler.pop_due, CLOCK + 2 * DAY_SECONDS)
+    result["drained"] = len(fired)
+    if len(ringing) != storm or result["drained"] != result["left"]:
+        raise SystemExit(f"{name}: wrong alarms fired")
+    return result
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Timing wheel against heap benchmark")
+    parser.add_argument("alarms", nargs="?", type=int, default=DEFAULT_ALARMS)
+    parser.add_argument("--storm", type=int, default=DEFAULT_STORM,
+                        help="alarms ringing and snoozed at once")
+    parser.add_argument("--output", default="wheel-vs-heap.json")
+    args = parser.parse_args(argv)
+
+    entries = workload(args.alarms, min(args.storm, args.alarms))
+    results = [run(name, entries, min(args.storm, args.alarms)) for name in SCHEDULERS]
+    for result in results:
+        print(f"{result['scheduler']:>6}: schedule {result['schedule_seconds'] * 1000:8.1f} ms, "
+              f"storm pop {result['storm_pop_seconds'] * 1000:6.1f} ms, "
+              f"snooze {result['storm_snooze_seconds'] * 1000:6.1f} ms, "
+              f"refire {result['storm_refire_seconds'] * 1000:6.1f} ms, "
+              f"cancel {result['cancel_seconds'] * 1000:6.1f} ms, "
+              f"next {result['next_deadline_seconds'] * 1000:6.1f} ms")
+    with open(args.output, "w") as f:
+        json.dump({"alarms": args.alarms, "storm": args.storm, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,249 @@
+import itertools
+import json
+import os
+import socket
+
+from engine import AlarmEngine, epoch_of
+from recurrence import DAILY_RULE, RecurrenceRule
+from server import DEFAULT_SOCKET, INVALID_PARAMS, SUBSCRIBABLE, encode
+from store import ENABLED, EXPIRED, NOT_SET, PLAYING, Alarm
+from transfer import batches
+
+# Seconds to wait for the server to answer a request
+DEFAULT_TIMEOUT = 10.0
+
+# Alarms sent per add_many request
+ADD_MANY_BATCH = 5000
+
+
+class RemoteError(RuntimeError):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class AlarmClient:
+    # Blocking JSON-RPC connection to an AlarmServer, one request at a time
+    def __init__(self, path=DEFAULT_SOCKET, timeout=DEFAULT_TIMEOUT):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self._file = self.sock.makefile("rb")
+        self._ids = itertools.count(1)
+
+    def call(self, method, **params):
+        request_id = next(self._ids)
+        self.sock.sendall(encode({"jsonrpc": "2.0", "id": request_id, "method": method,
+                                  "params": params}))
+        while True:
+            line = self._file.readline()
+            if not line:
+                raise ConnectionError("The alarm server closed the connection")
+            message = json.loads(line)
+            if message.get("id") == request_id:
+                break
+        error = message.get("error")
+        if error is not None:
+            if error["code"] == INVALID_PARAMS:
+                raise ValueError(error["message"])
+            raise RemoteError(error["code"], error["message"])
+        return message["result"]
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+
+class EventStream:
+    # Subscribed connection that is read without blocking: hand fileno() to
+    # a poller (QSocketNotifier, selectors) and call read() when it is ready
+    def __init__(self, path=DEFAULT_SOCKET, events=SUBSCRIBABLE, timeout=DEFAULT_TIMEOUT):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.sock.sendall(encode({"jsonrpc": "2.0", "id": 1, "method": "subscribe",
+                                  "params": {"events": list(events)}}))
+        # Nothing is sent to the connection before the subscribe response
+        self._buffer = b""
+        while b"\n" not in self._buffer:
+            data = self.sock.recv(65536)
+            if not data:
+                raise ConnectionError("The alarm server closed the connection")
+            self._buffer += data
+        line, _, self._buffer = self._buffer.partition(b"\n")
+        error = json.loads(line).get("error")
+        if error is not None:
+            raise ValueError(error["message"])
+        self.sock.setblocking(False)
+        self.closed = False
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def read(self):
+        # Params of every complete notification received so far
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                data = b""
+            if not data:
+                self.closed = True
+                break
+            self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        return [message["params"] for message in map(json.loads, lines)
+                if message.get("method") == "event"]
+
+    def close(self):
+        self.sock.close()
+
+
+class RemoteEngine(AlarmEngine):
+    # Engine for a window whose alarms live in an AlarmServer. The store is a
+    # replica kept current from the server's events, changes are sent to the
+    # server, and the server does the scheduling and plays the sounds; tick()
+    # does nothing and next_deadline() is always None.
+    #
+    # Events are emitted from poll(), which the owner calls whenever
+    # fileno() is readable. add() and add_many() emit "added" and
+    # "imported" straight away so the caller sees its alarms immediately.
+    def __init__(self, path=DEFAULT_SOCKET):
+        super().__init__()
+        self.client = AlarmClient(path)
+        self.stream = EventStream(path)
+        self._ids = {}  # persistent key -> replica alarm id
+        self._rules = {}  # rule text -> RecurrenceRule
+        for record in self.client.call("list"):
+            self._apply(record)
+
+    def fileno(self):
+        return self.stream.fileno()
+
+    def _apply(self, record):
+        # Create or update the replica of one alarm; returns (alarm, is new)
+        store = self.store
+        alarm_id = self._ids.get(record["key"])
+        new = alarm_id is None
+        if new:
+            rule = self._rules.get(record["rule"])
+            if rule is None:
+                rule = self._rules[record["rule"]] = RecurrenceRule.parse(record["rule"])
+            alarm_id = self._ids[record["key"]] = store.add(
+                record["start_time"], record["sound"], record["snooze"], record["enabled"],
+                record["volume"], record["key"], rule, record["zone"])
+        store.fire_time[alarm_id] = record["fire_time"]
+        store.snoozed_until[alarm_id] = record["snoozed_until"] or NOT_SET
+        store.last_triggered[alarm_id] = record["last_triggered"]
+        store.flags[alarm_id] = ((ENABLED if record["enabled"] else 0)
+                                 | (PLAYING if record["playing"] else 0)
+                                 | (EXPIRED if record["expired"] else 0))
+        return Alarm(store, alarm_id), new
+
+    def _forget(self, key):
+        alarm_id = self._ids.pop(key, None)
+        if alarm_id is not None and self.store.remove(alarm_id):
+            return Alarm(self.store, alarm_id)
+        return None
+
+    def poll(self):
+        # Apply and emit every event the server has sent; returns False once
+        # the connection to the server is lost. Alarms fired in one read
+        # are also emitted together as "fired_batch".
+        fired = []
+        for params in self.stream.read():
+            event = params["event"]
+            if event == "imported":
+                alarms = [alarm for alarm, new in map(self._apply, params["alarms"]) if new]
+                if alarms:
+                    self._emit("imported", alarms)
+            elif event == "removed":
+                alarm = self._forget(params["alarm"]["key"])
+                if alarm is not None:
+                    self._emit("removed", alarm)
+            else:
+                alarm, new = self._apply(params["alarm"])
+                if event != "added" or new:
+                    self._emit(event, alarm)
+                if event == "fired":
+                    fired.append(alarm)
+        if fired:
+            self._emit("fired_batch", fired)
+        return not self.stream.closed
+
+    def add(self, time, sound, snooze_duration=5, enabled=True, volume=100, rule=DAILY_RULE,
+            zone=None):
+        # Sound paths are made absolute; the server has its own working directory
+        record = self.client.call(
+            "add", time=epoch_of(time, zone), sound=sound and os.path.abspath(sound),
+            snooze=snooze_duration, enabled=enabled, volume=volume, rule=str(rule), zone=zone)
+        alarm, new = self._apply(record)
+        self._emit("added", alarm)
+        return alarm
+
+    def add_many(self, records):
+        alarms = []
+        rules = {}
+        for batch in batches(records, ADD_MANY_BATCH):
+            fields = []
+            for start, sound, snooze, enabled, volume, rule, zone in batch:
+                if rule not in rules:
+                    rules[rule] = str(rule)
+                fields.append({"time": start, "sound": sound and os.path.abspath(sound),
+                               "snooze": snooze, "enabled": enabled, "volume": volume,
+                               "rule": rules[rule], "zone": zone})
+            saved = self.client.call("add_many", alarms=fields)
+            added = [self._apply(record)[0] for record in saved]
+            if added:
+                self._emit("imported", added)
+            alarms += added
+        return alarms
+
+    def _call_alarm(self, method, alarm_id):
+        # Result of method for one alarm, or None where AlarmEngine returns
+        # False: the replica has no such alarm or the server no longer has it
+        if alarm_id not in self.store:
+            return None
+        try:
+            return self.client.call(method, key=self.store.key[alarm_id])
+        except ValueError:
+            return None
+
+    def remove(self, alarm_id):
+        if not self._call_alarm("remove", alarm_id):
+            return False
+        alarm = self._forget(self.store.key[alarm_id])
+        if alarm is not None:
+            self._emit("removed", alarm)
+        return True
+
+    def snooze(self, alarm_id, now=None):
+        record = self._call_alarm("snooze", alarm_id)
+        if record is None:
+            return False
+        self._apply(record)
+        return True
+
+    def stop(self, alarm_id, now=None):
+        record = self._call_alarm("stop", alarm_id)
+        if record is None:
+            return False
+        self._apply(record)
+        return True
+
+    def restore(self, rows, now=None, until=None):
+        # The server restores saved alarms itself and the replica already
+        # holds them; rows are ignored and the replica's alarms returned
+        return list(self)
+
+    def next_deadline(self):
+        return None
+
+    def tick(self, now=None):
+        return []
+
+    def close(self):
+        self.stream.close()
+        self.client.close()
@@ -0,0 +1,335 @@
+import itertools
+import sys
+from datetime import datetime, timedelta
+
+import metrics
+from recurrence import DAILY_RULE, RecurrenceRule
+from scheduler import AlarmScheduler, BatchScheduler, TimingWheelScheduler
+from store import Alarm, AlarmStore
+from zones import get_zone, local_timestamp
+
+# Longest single sleep of the asyncio runner. Its sleeps run on the
+# monotonic clock, which stands still while the machine is suspended, so it
+# looks at the wall clock at least this often to notice missed alarms.
+MAX_WAIT_SECONDS = 60
+
+# What tick() does with alarms that became due more than late_tolerance
+# seconds ago (the machine was asleep, the clock was stepped forward, or the
+# process was stalled). An alarm rings at most once for a gap, however many
+# of its occurrences passed, and then moves on to its next occurrence.
+FIRE_LATE = "fire_late"  # every missed alarm rings now
+COALESCE = "coalesce"  # one ring for the whole gap: the most recently missed alarm
+SKIP = "skip"  # no missed alarm rings
+# Missed alarms that do not ring are reported through the "missed" event.
+CATCH_UP_POLICIES = (FIRE_LATE, COALESCE, SKIP)
+
+LATE_TOLERANCE_SECONDS = 60
+
+# "imported" is emitted once per add_many() call with the list of new
+# alarms; "missed" for each alarm the catch-up policy did not let ring;
+# "fired_batch" once per tick() with every alarm that fired in it, after
+# their individual "fired" events
+EVENTS = ("added", "imported", "removed", "fired", "fired_batch", "missed", "snoozed", "stopped",
+          "rescheduled")
+
+
+def epoch_of(time, zone=None):
+    # Epoch seconds of a datetime; a naive time is read in zone
+    if zone and time.tzinfo is None:
+        return local_timestamp(time, get_zone(zone))
+    return int(time.timestamp())
+
+
+class AlarmEngine:
+    # GUI-independent alarm core. Clients either drive it themselves by
+    # calling tick() at next_deadline() (the Qt window does this with a
+    # QTimer), or let run() drive it from an asyncio event loop.
+    # With batch=True due alarms are found by a vectorized scan of the
+    # store (BatchScheduler) instead of a heap; with wheel=True they are kept
+    # in a timing wheel (TimingWheelScheduler), which suits heavy
+    # rescheduling such as mass snoozes.
+    def __init__(self, batch=False, catch_up=FIRE_LATE, wheel=False):
+        if catch_up not in CATCH_UP_POLICIES:
+            raise ValueError(f"Unknown catch-up policy: {catch_up}")
+        if batch and wheel:
+            raise ValueError("Choose either the batch or the wheel scheduler")
+        self.catch_up = catch_up
+        self.late_tolerance = LATE_TOLERANCE_SECONDS
+        self.store = AlarmStore()
+        self.pending = set()  # restored alarms held back from the scheduler
+        if batch:
+            self.scheduler = BatchScheduler(self.store, self.pending)
+        elif wheel:
+            self.scheduler = TimingWheelScheduler()
+        else:
+            self.scheduler = AlarmScheduler()
+        self._listeners = {event: [] for event in EVENTS}
+        self.next_key = 1  # persistent key handed to the next new alarm
+
+    def __len__(self):
+        return len(self.store)
+
+    def __iter__(self):
+        store = self.store
+        return (Alarm(store, alarm_id) for alarm_id in store)
+
+    def on(self, event, callback):
+        self._listeners[event].append(callback)
+        return callback
+
+    def off(self, event, callback):
+        if callback in self._listeners[event]:
+            self._listeners[event].remove(callback)
+
+    def _emit(self, event, alarm=None):
+        for callback in list(self._listeners[event]):
+            callback(alarm)
+
+    def add(self, time, sound, snooze_duration=5, enabled=True, volume=100, rule=DAILY_RULE,
+            zone=None):
+        # zone is an IANA name such as "Europe/Berlin"; the alarm repeats at
+        # the same wall-clock time there
+        key = self.next_key
+        alarm_id = self.store.add(epoch_of(time, zone), sound, snooze_duration, enabled, volume,
+                                  key, rule, zone)
+        self.next_key = key + 1
+        self._schedule(alarm_id)
+        alarm = Alarm(self.store, alarm_id)
+        self._emit("added", alarm)
+        self._emit("rescheduled")
+        return alarm
+
+    def add_many(self, records, keys=None):
+        # Bulk add of (start_time, sound, snooze_duration, enabled, volume,
+        # rule, zone) records, start_time in epoch seconds. Listeners hear
+        # about the whole batch through a single "imported" event. keys, if
+        # given, are the persistent keys of the records, for callers that
+        # hand out keys themselves (see shards.py).
+        store = self.store
+        keys = itertools.count(self.next_key) if keys is None else iter(keys)
+        ids = store.add_many((start, sound, snooze, enabled, volume, next(keys), rule, zone)
+                             for start, sound, snooze, enabled, volume, rule, zone in records)
+        if ids:
+            self.next_key = max(self.next_key, max(store.key[ids.start:ids.stop]) + 1)
+        wake = map(store.next_fire_time, ids)
+        self.scheduler.schedule_many((alarm_id, when) for alarm_id, when in zip(ids, wake)
+                                     if when is not None)
+        alarms = [Alarm(store, alarm_id) for alarm_id in ids]
+        if alarms:
+            self._emit("imported", alarms)
+            self._emit("rescheduled")
+        return alarms
+
+    def restore(self, rows, now=None, until=None):
+        # Bring back alarms saved by an earlier run (see AlarmStore.row()).
+        # Occurrences missed while the program was not running are skipped.
+        # Alarms that wake at or after until (a datetime) are listed but kept
+        # off the scheduler until schedule_pending() is called for them.
+        if until is not None:
+            until = until.timestamp()
+        if now is None:
+            now = datetime.now()
+        now = now.timestamp()
+        store = self.store
+        alarms = []
+        rules = {}
+        for (key, fire_time, snoozed_until, last_triggered, sound, snooze_minutes, volume, enabled,
+             start_time, rule, zone) in rows:
+            if rule not in rules:
+                rules[rule] = RecurrenceRule.parse(rule)
+            alarm_id = store.add(start_time, sound, snooze_minutes, enabled, volume, key, rules[rule],
+                                 zone)
+            if snoozed_until > now:
+                store.snoozed_until[alarm_id] = snoozed_until
+            store.last_triggered[alarm_id] = last_triggered
+            store.roll_forward(alarm_id, now)
+            when = store.next_fire_time(alarm_id)
+            if until is not None and when is not None and when >= until:
+                self.pending.add(alarm_id)
+            else:
+                self._schedule(alarm_id)
+            self.next_key = max(self.next_key, key + 1)
+            alarms.append(Alarm(store, alarm_id))
+        if alarms:
+            self._emit("rescheduled")
+        return alarms
+
+    def schedule_pending(self, until):
+        # Hand restored alarms that now wake before until (a datetime) to the
+        # scheduler; returns them
+        store = self.store
+        until = until.timestamp()
+        ready = [alarm_id for alarm_id in self.pending
+                 if (store.next_fire_time(alarm_id) or until) < until]
+        for alarm_id in ready:
+            self._schedule(alarm_id)
+        if ready:
+            self._emit("rescheduled")
+        return [Alarm(store, alarm_id) for alarm_id in ready]
+
+    def remove(self, alarm_id):
+        if not self.store.remove(alarm_id):
+            return False
+        self.pending.discard(alarm_id)
+        self.scheduler.cancel(alarm_id)
+        self._emit("removed", Alarm(self.store, alarm_id))
+        self._emit("rescheduled")
+        return True
+
+    def get(self, alarm_id):
+        return self.store.view(alarm_id)
+
+    def snooze(self, alarm_id, now=None):
+        if now is None:
+            now = datetime.now()
+        if alarm_id not in self.store or not self.store.snooze(alarm_id, now.timestamp()):
+            return False
+        self._schedule(alarm_id)
+        if metrics.enabled:
+            metrics.ALARMS_SNOOZED.inc()
+        self._emit("snoozed", Alarm(self.store, alarm_id))
+        self._emit("rescheduled")
+        return True
+
+    def stop(self, alarm_id, now=None):
+        if now is None:
+            now = datetime.now()
+        if alarm_id not in self.store:
+            return False
+        self.store.stop(alarm_id, now.timestamp())
+        self._schedule(alarm_id)
+        if metrics.enabled:
+            metrics.ALARMS_STOPPED.inc()
+        self._emit("stopped", Alarm(self.store, alarm_id))
+        self._emit("rescheduled")
+        return True
+
+    def next_deadline(self):
+        deadline = self.scheduler.next_deadline()
+        return None if deadline is None else datetime.fromtimestamp(deadline)
+
+    def tick(self, now=None):
+        # Fire every alarm that is due and put it back on the heap
+        if now is None:
+            now = datetime.now()
+        now = now.timestamp()
+        store = self.store
+        fired = []
+        due_ids = self.scheduler.pop_due(now)
+        if self.catch_up != FIRE_LATE and due_ids:
+            due_ids = self._catch_up(due_ids, now)
+        for alarm_id in due_ids:
+            due = store.next_fire_time(alarm_id) if metrics.enabled else None
+            if store.check_and_trigger(alarm_id, now):
+                fired.append(Alarm(store, alarm_id))
+                if due is not None:
+                    metrics.FIRE_LATENESS.observe(max(0, now - due))
+                    metrics.ALARMS_FIRED.inc()
+            self._schedule(alarm_id)
+        for alarm in fired:
+            self._emit("fired", alarm)
+        if fired:
+            self._emit("fired_batch", fired)
+        return fired
+
+    def _catch_up(self, due_ids, now):
+        # Apply the catch-up policy to alarms that are overdue; returns the
+        # ids that may still ring
+        store = self.store
+        cutoff = now - self.late_tolerance
+        missed = [alarm_id for alarm_id in due_ids
+                  if (store.next_fire_time(alarm_id) or now) < cutoff]
+        if not missed:
+            return due_ids
+        ringing = set(due_ids) - set(missed)
+        if self.catch_up == COALESCE:
+            ringing.add(max(missed, key=store.next_fire_time))
+        for alarm_id in missed:
+            if alarm_id not in ringing:
+                store.skip(alarm_id, now)
+                self._schedule(alarm_id)
+                self._emit("missed", Alarm(store, alarm_id))
+        return [alarm_id for alarm_id in due_ids if alarm_id in ringing]
+
+    def _schedule(self, alarm_id):
+        self.pending.discard(alarm_id)
+        when = self.store.next_fire_time(alarm_id)
+        if when is None:
+            self.scheduler.cancel(alarm_id)
+        else:
+            self.scheduler.schedule(alarm_id, when)
+
+    async def run(self):
+        # Sleep until the earliest deadline, waking early whenever the
+        # schedule changes (possibly from another thread)
+        import asyncio  # only asyncio clients pay for importing it
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        wake = self.on("rescheduled", lambda alarm: loop.call_soon_threadsafe(changed.set))
+        try:
+            while True:
+                deadline = self.next_deadline()
+                timeout = MAX_WAIT_SECONDS
+                if deadline is not None:
+                    delay = (deadline - datetime.now()).total_seconds()
+                    timeout = min(max(0, delay), MAX_WAIT_SECONDS)
+                try:
+                    await asyncio.wait_for(changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                changed.clear()
+                self.tick()
+        finally:
+            self.off("rescheduled", wake)
+
+    async def events(self, *events):
+        # Async iterator over (event, alarm) pairs, e.g.
+        #   async for event, alarm in engine.events("fired"): ...
+        import asyncio
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        callbacks = []
+        for event in events or ("fired", "snoozed", "stopped"):
+            def push(alarm, event=event):
+                loop.call_soon_threadsafe(queue.put_nowait, (event, alarm))
+            callbacks.append((event, self.on(event, push)))
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            for event, callback in callbacks:
+                self.off(event, callback)
+
+
+async def _serve(engine):
+    import asyncio
+    runner = asyncio.ensure_future(engine.run())
+    try:
+        async for event, alarm in engine.events():
+            print(f"{datetime.now().strftime('%H:%M:%S')} {event}: {alarm}", flush=True)
+            if event == "fired":
+                # Nobody is there to press stop in headless mode
+                engine.stop(alarm.id)
+    finally:
+        runner.cancel()
+
+
+def main(argv):
+    # Headless mode: python engine.py HH:MM [HH:MM ...]
+    engine = AlarmEngine()
+    now = datetime.now()
+    for value in argv:
+        hour, minute = map(int, value.split(":"))
+        alarm_time = datetime(now.year, now.month, now.day, hour, minute)
+        if alarm_time < now:
+            alarm_time += timedelta(days=1)
+        engine.add(alarm_time, None)
+    import asyncio
+    try:
+        asyncio.run(_serve(engine))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,65 +1,761 @@
+import os
 import sys
-import time
+import bisect
 import random
-from datetime import datetime, timedelta
 import threading
-import simpleaudio as sa
+import time
+from datetime import datetime, timedelta
 import math
-import pygame
+from array import array
+import metrics
+from engine import CATCH_UP_POLICIES, FIRE_LATE, AlarmEngine
+from persistence import DEFAULT_PATH, AlarmDatabase
+from recurrence import DAILY_RULE, ONCE_RULE, WEEKDAYS, WEEKENDS, WEEKLY, RecurrenceRule
+from mixer import ALARM_PRIORITY, TEST_PRIORITY, AlarmMixer
+from soundbank import BUILTIN_SOUNDS, SoundBank
+from transcode import DEFAULT_DIRECTORY as SOUND_CACHE_DIRECTORY, SoundCache
+from transfer import engine_rows, export_alarms, import_alarms
+from zones import get_zone, local_datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                             QLabel, QPushButton, QTimeEdit, QComboBox, QSpinBox, 
-                            QListWidget, QListWidgetItem, QMessageBox, QFileDialog)
-from PyQt5.QtCore import Qt, QTime, QTimer, pyqtSignal, QObject, QPoint, QRect
-from PyQt5.QtGui import QPainter, QColor, QPen, QBrush, QPainterPath, QLinearGradient
+                            QListView, QLineEdit, QFileDialog)
+from PyQt5.QtCore import (Qt, QTime, QTimer, pyqtSignal, QObject, QPoint, QRect,
+                          QAbstractListModel, QModelIndex, QSortFilterProxyModel,
+                          QSocketNotifier, QEvent)
+from PyQt5.QtGui import (QPainter, QColor, QPen, QBrush, QPainterPath, QLinearGradient,
+                         QPixmap, QRegion)
 
-# Initialize pygame mixer
-pygame.mixer.init()
+# Longest the clock timer sleeps while nothing shows the time. Qt timers run
+# on the monotonic clock, which stands still during a suspend, so the wall
+# clock is looked at again at least this often.
+CLOCK_CHECK_SECONDS = 60
 
-class AlarmSignals(QObject):
-    alarm_triggered = pyqtSignal(str)
+# Disagreement between wall-clock and monotonic time that counts as a jump
+JUMP_THRESHOLD_SECONDS = 2.0
 
-class Alarm:
-    def __init__(self, time, sound, snooze_duration=5, enabled=True):
-        self.time = time  # datetime object
-        self.sound = sound
-        self.snooze_duration = snooze_duration  # in minutes
-        self.enabled = enabled
-        self.snoozed_until = None
-        self.is_playing = False
-        self.signals = AlarmSignals()
-        self.last_triggered_minute = None
-        
-    def snooze(self):
-        if self.is_playing:
-            self.is_playing = False
-            self.snoozed_until = datetime.now() + timedelta(minutes=self.snooze_duration)
-            return True
-        return False
+# In low-refresh mode (ALARM_CLOCK_LOW_REFRESH=1) the displays fall back to
+# once a minute, without seconds, after this long without input
+IDLE_SECONDS = 30
+
+# Repeat choices offered when adding an alarm
+REPEAT_OPTIONS = {
+    "Once": ONCE_RULE,
+    "Daily": DAILY_RULE,
+    "Weekdays": RecurrenceRule(WEEKLY, weekdays=WEEKDAYS),
+    "Weekends": RecurrenceRule(WEEKLY, weekdays=WEEKENDS),
+}
+
+# Saved alarms are all listed, but scheduled lazily, a window of upcoming
+# alarms at a time
+LOAD_WINDOW = timedelta(hours=24)
+LOAD_INTERVAL_MS = 60 * 60 * 1000
+
+# Refresh interval of the in-app stats panel (ALARM_CLOCK_METRICS=panel)
+STATS_INTERVAL_MS = 1000
+
+# File types accepted by alarm import and export
+ALARM_FILE_FILTER = "CSV (*.csv);;JSON Lines (*.jsonl *.ndjson);;iCalendar (*.ics)"
+
+# Pause in typing before the alarm list filter is applied
+FILTER_DELAY_MS = 250
+
+# Most fired alarms held before the window handles them; a larger burst is
+# handed over in batches of this size
+MAX_PENDING_FIRES = 10000
+
+# Sine/cosine of every hand angle in half-degree steps, the finest step a
+# hand can take (the hour hand moves half a degree per minute)
+HAND_STEPS = 720
+SIN_TABLE = tuple(math.sin(math.radians(step / 2)) for step in range(HAND_STEPS))
+COS_TABLE = tuple(math.cos(math.radians(step / 2)) for step in range(HAND_STEPS))
+
+# Extra pixels around a hand's bounding box covering pen width and antialiasing
+HAND_MARGIN = 6
+
+# Notifications: how many show at once, how many may wait behind them, how
+# long each stays up and the least time between two appearing
+TOAST_VISIBLE = 3
+TOAST_QUEUE = 20
+TOAST_MS = 4000
+TOAST_INTERVAL_MS = 400
+TOAST_WIDTH = 320
+TOAST_STYLES = {
+    False: "background: rgba(30, 58, 95, 230); color: #e0fbfc; border-radius: 8px; padding: 8px;",
+    True: "background: rgba(150, 40, 40, 235); color: white; border-radius: 8px; padding: 8px;",
+}
+
+# Window stylesheets per theme, built once at import
+THEME_STYLESHEETS = {
+    "sunrise": """
+                QMainWindow, QWidget {
+                    background-color: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+                                      stop:0 #ffecd1, stop:0.5 #ffcad4, stop:1 #f7d6e0);
+                    color: #5e4c5a;
+                }
+                QLabel {
+                    color: #5e4c5a;
+                    background-color: transparent;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                }
+                QPushButton {
+                    background-color: #f8a978;
+                    color: #5e4c5a;
+                    border: none;
+                    border-radius: 12px;
+                    padding: 10px 18px;
+                    font-weight: bold;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+                }
+                QPushButton:hover {
+                    background-color: #f9c784;
+                    transform: translateY(-2px);
+                }
+                QPushButton:pressed {
+                    background-color: #e88a54;
+                    transform: translateY(1px);
+                }
+                QTimeEdit, QSpinBox {
+                    background-color: #fff1e6;
+                    border: 2px solid #f8a978;
+                    border-radius: 10px;
+                    padding: 6px;
+                    color: #5e4c5a;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    selection-background-color: #f8a978;
+                }
+                QComboBox {
+                    background-color: #fff1e6;
+                    border: 2px solid #f8a978;
+                    border-radius: 10px;
+                    padding: 6px;
+                    color: #5e4c5a;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    selection-background-color: #f8a978;
+                    min-height: 25px;
+                }
+                QComboBox::drop-down {
+                    subcontrol-origin: padding;
+                    subcontrol-position: right center;
+                    width: 25px;
+                    border-left: none;
+                    border-top-right-radius: 10px;
+                    border-bottom-right-radius: 10px;
+                }
+                QComboBox::down-arrow {
+                    image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTQiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDE0IDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+PHBhdGggZD0iTTEgMUw3IDdMMTMgMSIgc3Ryb2tlPSIjZjhhOTc4IiBzdHJva2Utd2lkdGg9IjIiIHN0cm9rZS1saW5lY2FwPSJyb3VuZCIgc3Ryb2tlLWxpbmVqb2luPSJyb3VuZCIvPjwvc3ZnPg==);
+                    width: 14px;
+                    height: 8px;
+                }
+                QComboBox QAbstractItemView {
+                    background-color: #fff1e6;
+                    border: 2px solid #f8a978;
+                    border-radius: 10px;
+                    selection-background-color: #f9c784;
+                    selection-color: #5e4c5a;
+                    outline: none;
+                }
+                QListView {
+                    background-color: rgba(255, 241, 230, 0.7);
+                    border: 2px solid #f8a978;
+                    border-radius: 12px;
+                    padding: 5px;
+                    alternate-background-color: rgba(255, 202, 212, 0.3);
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                }
+                QListView::item {
+                    border-radius: 8px;
+                    padding: 5px;
+                    margin: 2px;
+                }
+                QListView::item:selected {
+                    background-color: #f8a978;
+                    color: #5e4c5a;
+                }
+                #time_label {
+                    color: #e88a54;
+                    font-size: 48px;
+                    font-weight: bold;
+                    background-color: transparent;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.1);
+                }
+            """,
+    "midnight": """
+                QMainWindow, QWidget {
+                    background-color: qlineargradient(x1:0, y1:0, x2:1, y2:1,
+                                      stop:0 #0f1c2e, stop:0.5 #1a2a43, stop:1 #0f1c2e);
+                    color: #e0fbfc;
+                }
+                QLabel {
+                    color: #e0fbfc;
+                    background-color: transparent;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                }
+                QPushButton {
+                    background-color: #1e3a5f;
+                    color: #5edfff;
+                    border: 2px solid #5edfff;
+                    border-radius: 12px;
+                    padding: 10px 18px;
+                    font-weight: bold;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    box-shadow: 0 0 10px rgba(94, 223, 255, 0.5);
+                }
+                QPushButton:hover {
+                    background-color: #2a4a7f;
+                    border: 2px solid #98f5ff;
+                    box-shadow: 0 0 15px rgba(94, 223, 255, 0.7);
+                }
+                QPushButton:pressed {
+                    background-color: #0c2c54;
+                    box-shadow: 0 0 5px rgba(94, 223, 255, 0.3);
+                }
+                QTimeEdit, QSpinBox {
+                    background-color: #1e3a5f;
+                    border: 2px solid #5edfff;
+                    border-radius: 10px;
+                    padding: 6px;
+                    color: #e0fbfc;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    selection-background-color: #5edfff;
+                    selection-color: #0f1c2e;
+                }
+                QComboBox {
+                    background-color: #1e3a5f;
+                    border: 2px solid #5edfff;
+                    border-radius: 10px;
+                    padding: 6px;
+                    color: #e0fbfc;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    selection-background-color: #5edfff;
+                    min-height: 25px;
+                }
+                QComboBox::drop-down {
+                    subcontrol-origin: padding;
+                    subcontrol-position: right center;
+                    width: 25px;
+                    border-left: none;
+                    border-top-right-radius: 10px;
+                    border-bottom-right-radius: 10px;
+                }
+                QComboBox::down-arrow {
+                    image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTQiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDE0IDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+PHBhdGggZD0iTTEgMUw3IDdMMTMgMSIgc3Ryb2tlPSIjNWVkZmZmIiBzdHJva2Utd2lkdGg9IjIiIHN0cm9rZS1saW5lY2FwPSJyb3VuZCIgc3Ryb2tlLWxpbmVqb2luPSJyb3VuZCIvPjwvc3ZnPg==);
+                    width: 14px;
+                    height: 8px;
+                }
+                QComboBox QAbstractItemView {
+                    background-color: #1e3a5f;
+                    border: 2px solid #5edfff;
+                    border-radius: 10px;
+                    selection-background-color: #5edfff;
+                    selection-color: #0f1c2e;
+                    outline: none;
+                }
+                QListView {
+                    background-color: #1e3a5f;
+                    border: 2px solid #5edfff;
+                    border-radius: 12px;
+                    padding: 5px;
+                    color: #e0fbfc;
+                    alternate-background-color: #2a4a7f;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                }
+                QListView::item {
+                    border-radius: 8px;
+                    padding: 5px;
+                    margin: 2px;
+                }
+                QListView::item:selected {
+                    background-color: #5edfff;
+                    color: #0f1c2e;
+                }
+                #time_label {
+                    color: #5edfff;
+                    font-size: 48px;
+                    font-weight: bold;
+                    background-color: transparent;
+                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
+                    text-shadow: 0 0 10px rgba(94, 223, 255, 0.7);
+                }
+            """,
+}
+
+
+class FireDispatcher(QObject):
+    # Hands fired alarms over to the Qt event loop in batches. Alarms fired
+    # together, in one tick or in several before the event loop gets round
+    # to them, are coalesced by id into a single fired(list) emission, so a
+    # burst of thousands costs the window one pass. The pending queue is
+    # bounded by limit; reaching it hands the batch over at once.
+    fired = pyqtSignal(list)
+    _wake = pyqtSignal()
+    
+    def __init__(self, engine, limit=MAX_PENDING_FIRES, parent=None):
+        super().__init__(parent)
+        self.limit = limit
+        self.pending = {}  # alarm id -> Alarm, in firing order
+        self.scheduled = False
+        self.lock = threading.Lock()  # push() may be called from any thread
+        self._wake.connect(self.flush, Qt.QueuedConnection)
+        engine.on("fired_batch", self.push)
+    
+    def push(self, alarms):
+        for alarm in alarms:
+            with self.lock:
+                self.pending[alarm.id] = alarm
+                full = len(self.pending) >= self.limit
+                wake = not full and not self.scheduled
+                self.scheduled = self.scheduled or wake
+            if full:
+                self.flush()
+            elif wake:
+                self._wake.emit()
+    
+    def flush(self):
+        with self.lock:
+            alarms = list(self.pending.values())
+            self.pending = {}
+            self.scheduled = False
+        if alarms:
+            self.fired.emit(alarms)
+
+class ClockService(QObject):
+    # The window's one periodic timer. It wakes on each wall-clock second
+    # boundary while something displays the time (every CLOCK_CHECK_SECONDS
+    # otherwise) and at the engine's next deadline, whichever comes first,
+    # and ticks the engine when an alarm is due. Comparing wall-clock and
+    # monotonic time between wakeups reveals a suspend/resume or a clock
+    # step; overdue alarms are then handled by the engine's catch-up policy.
+    # While ticking, the displays are updated every `resolution` seconds (1,
+    # or 60 for displays without seconds), on the wall-clock boundary.
+    second = pyqtSignal(object)  # datetime of the second that just began
+    jumped = pyqtSignal(float)  # seconds the wall clock moved past the monotonic clock
+    
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.ticking = True
+        self.resolution = 1
+        self.deadline = None  # wall-clock time the timer is armed for
+        self.woken_for = None  # deadline of the wakeup being handled
+        self.last_wall = None
+        self.last_monotonic = None
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.wake)
+        engine.on("rescheduled", lambda alarm: self.arm())
+    
+    def set_ticking(self, ticking, resolution=1):
+        self.ticking = ticking
+        self.resolution = resolution
+        self.arm()
+    
+    def refresh(self):
+        # Update the displays now, e.g. when they come back into view
+        self.second.emit(datetime.now())
+    
+    def arm(self):
+        now = time.time()
+        if self.ticking:
+            target = (math.floor(now / self.resolution) + 1) * self.resolution
+        else:
+            target = now + CLOCK_CHECK_SECONDS
+        deadline = self.engine.next_deadline()
+        if deadline is not None:
+            target = min(target, max(deadline.timestamp(), now))
+        self.deadline = target
+        self.timer.start(math.ceil((target - now) * 1000))
     
     def stop(self):
-        self.is_playing = False
-        self.snoozed_until = None
-        self.last_triggered_minute = datetime.now().strftime("%H:%M")
-        
-    def check_and_trigger(self):
-        now = datetime.now()
-        current_time = now.strftime("%H:%M")
-        alarm_time = self.time.strftime("%H:%M")
-        current_minute = now.strftime("%H:%M")
-        
-        # Check if alarm should trigger
-        if self.enabled and current_time == alarm_time and not self.is_playing:
-            # Don't trigger again in the same minute
-            if self.last_triggered_minute != current_minute:
-                if self.snoozed_until is None or now >= self.snoozed_until:
-                    self.is_playing = True
-                    self.last_triggered_minute = current_minute
-                    self.signals.alarm_triggered.emit(self.sound)
-                    return True
+        self.timer.stop()
+    
+    def wake(self):
+        wall, monotonic = time.time(), time.monotonic()
+        if wall < self.deadline:
+            self.arm()  # a millisecond early; wait for the boundary itself
+            return
+        self.woken_for = self.deadline
+        if metrics.enabled:
+            metrics.TIMER_DRIFT.observe(wall - self.deadline)
+        if self.last_wall is not None:
+            skew = (wall - self.last_wall) - (monotonic - self.last_monotonic)
+            if abs(skew) > JUMP_THRESHOLD_SECONDS:
+                if metrics.enabled:
+                    metrics.CLOCK_JUMPS.inc()
+                self.jumped.emit(skew)
+        self.last_wall, self.last_monotonic = wall, monotonic
+        
+        now = datetime.fromtimestamp(wall)
+        deadline = self.engine.next_deadline()
+        if deadline is not None and deadline <= now:
+            self.engine.tick(now)
+        if self.ticking:
+            self.second.emit(now)
+        self.arm()
+
+class PowerManager(QObject):
+    # Keeps display work to what someone can see. While the window is hidden,
+    # minimized or fully covered, the ClockService stops ticking (only the
+    # engine's next deadline, or a check every CLOCK_CHECK_SECONDS, wakes it)
+    # and the statistics timer is stopped; on the way back the displays are
+    # repainted once to catch up. In low-refresh mode the displays also drop
+    # the seconds, and with them all but one wakeup a minute, after
+    # IDLE_SECONDS without input, until the next key press or mouse click.
+    INPUT_EVENTS = (QEvent.KeyPress, QEvent.MouseButtonPress, QEvent.Wheel, QEvent.TouchBegin)
+    
+    def __init__(self, window, low_refresh=False):
+        super().__init__(window)
+        self.window = window
+        self.low_refresh = low_refresh
+        self.visible = False
+        self.idle = False
+        self.watched_handle = None
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(IDLE_SECONDS * 1000)
+        self.idle_timer.timeout.connect(lambda: self.set_idle(True))
+        window.installEventFilter(self)
+        if low_refresh:
+            QApplication.instance().installEventFilter(self)
+        self.apply(refresh=False)
+    
+    def eventFilter(self, watched, event):
+        kind = event.type()
+        if watched is self.window and kind in (QEvent.Show, QEvent.Hide,
+                                                QEvent.WindowStateChange):
+            if kind == QEvent.Show and self.watched_handle is None:
+                # Exposure (covered by other windows, screen off) is only
+                # reported to the native window, which exists once shown
+                self.watched_handle = self.window.windowHandle()
+                if self.watched_handle is not None:
+                    self.watched_handle.installEventFilter(self)
+            self.update_visible()
+        elif watched is self.watched_handle and kind == QEvent.Expose:
+            self.update_visible()
+        elif kind in self.INPUT_EVENTS and self.visible:
+            self.set_idle(False)
         return False
     
-    def __str__(self):
-        return f"{self.time.strftime('%H:%M')} - {self.sound} (Snooze: {self.snooze_duration}m)"
+    def update_visible(self):
+        handle = self.watched_handle
+        visible = (self.window.isVisible() and not self.window.isMinimized()
+                   and (handle is None or handle.isExposed()))
+        if visible != self.visible:
+            self.visible = visible
+            if visible and self.low_refresh:
+                self.idle = False  # coming back counts as activity
+            self.apply(refresh=visible)
+    
+    def set_idle(self, idle):
+        if self.low_refresh and not idle:
+            self.idle_timer.start()
+        if idle != self.idle:
+            self.idle = idle
+            self.apply(refresh=True)
+    
+    def apply(self, refresh):
+        seconds = not (self.low_refresh and self.idle)
+        self.window.set_display_seconds(seconds)
+        self.window.set_display_active(self.visible)
+        self.window.clock.set_ticking(self.visible, 1 if seconds else 60)
+        if self.visible and self.low_refresh and not self.idle:
+            self.idle_timer.start()
+        else:
+            self.idle_timer.stop()
+        if refresh:
+            self.window.clock.refresh()
+
+class AlarmListModel(QAbstractListModel):
+    # List model over the engine's alarm store. Rows hold only alarm ids and
+    # the display text is formatted (and cached) only for rows the view or the
+    # filter asks for. Rows are kept in the order alarms were added, so a row
+    # is found by bisection, or by next fire time after sort_by_next_fire().
+    AlarmIdRole = Qt.UserRole
+    FireTimeRole = Qt.UserRole + 1
+    
+    def __init__(self, engine, parent=None):
+        super().__init__(parent)
+        self.engine = engine
+        self.ids = array("q")
+        self.by_next_fire = False
+        self._text = {}  # alarm id -> display text
+        engine.on("added", lambda alarm: self.append([alarm]))
+        engine.on("imported", self.append)
+        engine.on("removed", lambda alarm: self.remove_id(alarm.id))
+        for event in ("missed", "snoozed", "stopped"):
+            engine.on(event, lambda alarm: self.refresh_id(alarm.id))
+        engine.on("fired_batch", self.refresh_ids)
+    
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+    
+    def text(self, alarm_id):
+        text = self._text.get(alarm_id)
+        if text is None:
+            text = self._text[alarm_id] = str(self.engine.store.view(alarm_id))
+        return text
+    
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        alarm_id = self.ids[index.row()]
+        if role == Qt.DisplayRole:
+            return self.text(alarm_id)
+        if role == self.AlarmIdRole:
+            return alarm_id
+        if role == self.FireTimeRole:
+            return self.fire_time(alarm_id)
+        return None
+    
+    def fire_time(self, alarm_id):
+        # Disabled and finished alarms sort last
+        when = self.engine.store.next_fire_time(alarm_id)
+        return when if when is not None else 2 ** 62
+    
+    def row_of(self, alarm_id):
+        if self.by_next_fire:
+            try:
+                return self.ids.index(alarm_id)
+            except ValueError:
+                return None
+        row = bisect.bisect_left(self.ids, alarm_id)
+        return row if row < len(self.ids) and self.ids[row] == alarm_id else None
+    
+    def fire_row(self, when):
+        # Row after the last alarm firing no later than when, while sorted by
+        # next fire time (bisect's key argument needs Python 3.10)
+        low, high = 0, len(self.ids)
+        while low < high:
+            middle = (low + high) // 2
+            if when < self.fire_time(self.ids[middle]):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+    
+    def append(self, alarms):
+        # One insert notification for the whole batch
+        if not alarms:
+            return
+        if self.by_next_fire:
+            if len(alarms) > 1:
+                self.ids.extend(alarm.id for alarm in alarms)
+                self.sort_by_next_fire(True)
+                return
+            row = self.fire_row(self.fire_time(alarms[0].id))
+        else:
+            row = len(self.ids)
+        self.beginInsertRows(QModelIndex(), row, row + len(alarms) - 1)
+        self.ids[row:row] = array("q", (alarm.id for alarm in alarms))
+        self.endInsertRows()
+    
+    def remove_id(self, alarm_id):
+        row = self.row_of(alarm_id)
+        if row is not None:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.ids[row]
+            self.endRemoveRows()
+        self._text.pop(alarm_id, None)
+    
+    def refresh_id(self, alarm_id):
+        self._text.pop(alarm_id, None)
+        if self.by_next_fire:
+            self.reposition({alarm_id})
+            return
+        row = self.row_of(alarm_id)
+        if row is not None:
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+    
+    def refresh_ids(self, alarms):
+        # One change notification spanning every row of the batch
+        for alarm in alarms:
+            self._text.pop(alarm.id, None)
+        if self.by_next_fire:
+            self.reposition({alarm.id for alarm in alarms})
+            return
+        rows = [row for row in map(self.row_of, (alarm.id for alarm in alarms))
+                if row is not None]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)))
+    
+    def reposition(self, changed):
+        # Put the rows of alarms whose next fire time moved back in order:
+        # all of them are taken out first, so that fire_row() bisects over
+        # rows that are still sorted, then each goes back in at its place.
+        # A batch that touches much of the list is cheaper to sort whole.
+        if len(changed) * 8 > len(self.ids):
+            self.sort_by_next_fire(True)
+            return
+        rows = [row for row, alarm_id in enumerate(self.ids) if alarm_id in changed]
+        moved = [self.ids[row] for row in rows]
+        for row in reversed(rows):
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.ids[row]
+            self.endRemoveRows()
+        for alarm_id in moved:
+            row = self.fire_row(self.fire_time(alarm_id))
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.ids.insert(row, alarm_id)
+            self.endInsertRows()
+    
+    def sort_by_next_fire(self, enabled):
+        # Reorder the rows once, in Python, rather than letting a proxy call
+        # back into data() for every comparison
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        kept = [self.ids[index.row()] for index in persistent]
+        self.by_next_fire = enabled
+        self.ids = array("q", sorted(self.ids, key=self.fire_time if enabled else None))
+        self.changePersistentIndexList(persistent, [self.index(self.row_of(alarm_id))
+                                                    for alarm_id in kept])
+        self.layoutChanged.emit()
+
+class AlarmFilterProxy(QSortFilterProxyModel):
+    # Case-insensitive substring filter over an AlarmListModel. The matching
+    # ids are worked out in one pass when the pattern changes, so the per-row
+    # check Qt makes is a set lookup instead of a round trip through data().
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pattern = ""
+        self.matches = set()
+    
+    def set_pattern(self, pattern):
+        self.pattern = pattern.casefold()
+        self.update_matches()
+        self.invalidateFilter()
+    
+    def update_matches(self):
+        model = self.sourceModel()
+        if self.pattern and model is not None:
+            self.matches = {alarm_id for alarm_id in model.ids
+                            if self.pattern in model.text(alarm_id).casefold()}
+    
+    def filterAcceptsRow(self, row, parent):
+        if not self.pattern:
+            return True
+        model = self.sourceModel()
+        alarm_id = model.ids[row]
+        if alarm_id not in self.matches and self.pattern in model.text(alarm_id).casefold():
+            self.matches.add(alarm_id)  # added or changed since the last pass
+        return alarm_id in self.matches
+
+class Toast(QLabel):
+    # One notification; a click dismisses it
+    clicked = pyqtSignal()
+    
+    def __init__(self, title, text, warning, parent=None):
+        super().__init__(parent)
+        self.title = title
+        self.text_body = text
+        self.count = 1
+        self.setWordWrap(True)
+        self.setStyleSheet(TOAST_STYLES[warning])
+        self.expiry = QTimer(self)
+        self.expiry.setSingleShot(True)
+        self.render()
+    
+    def render(self):
+        repeat = f" (×{self.count})" if self.count > 1 else ""
+        self.setText(f"<b>{self.title}</b>{repeat}<br>{self.text_body}")
+    
+    def mousePressEvent(self, event):
+        self.clicked.emit()
+
+class ToastArea(QWidget):
+    # Non-modal notifications stacked in the bottom corner of the window. A
+    # message box runs a nested event loop until it is clicked away; notify()
+    # only queues the message and returns, so the clock timer, alarm dispatch
+    # and audio never wait on the user. A message equal to one already
+    # showing or waiting is counted on that one instead of repeated. At most
+    # TOAST_VISIBLE show at once and a new one appears at most every
+    # TOAST_INTERVAL_MS; past TOAST_QUEUE waiting, the oldest waiting one is
+    # dropped.
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.stack = QVBoxLayout(self)
+        self.stack.setContentsMargins(0, 0, 0, 0)
+        self.waiting = {}  # (title, text) -> [warning, count], oldest first
+        self.showing = {}  # (title, text) -> Toast
+        self.dropped = 0
+        self.last_shown = None  # monotonic time the newest toast appeared
+        self.pump_timer = QTimer(self)
+        self.pump_timer.setSingleShot(True)
+        self.pump_timer.timeout.connect(self.pump)
+        parent.installEventFilter(self)
+        self.hide()
+    
+    def notify(self, title, text, warning=False):
+        key = (title, text)
+        toast = self.showing.get(key)
+        if toast is not None:
+            toast.count += 1
+            toast.render()
+            toast.expiry.start(TOAST_MS)
+            return
+        if key in self.waiting:
+            self.waiting[key][1] += 1
+            return
+        if len(self.waiting) >= TOAST_QUEUE:
+            del self.waiting[next(iter(self.waiting))]
+            self.dropped += 1
+        self.waiting[key] = [warning, 1]
+        if not self.pump_timer.isActive():
+            self.pump_timer.start(0)
+    
+    def pump(self):
+        # Show the oldest waiting message if there is room and it is time
+        if not self.waiting or len(self.showing) >= TOAST_VISIBLE:
+            return
+        now = time.monotonic()
+        if self.last_shown is not None:
+            wait_ms = TOAST_INTERVAL_MS - (now - self.last_shown) * 1000
+            if wait_ms > 0:
+                self.pump_timer.start(math.ceil(wait_ms))
+                return
+        key = next(iter(self.waiting))
+        warning, count = self.waiting.pop(key)
+        toast = self.showing[key] = Toast(*key, warning, self)
+        toast.count = count
+        toast.render()
+        toast.clicked.connect(lambda: self.dismiss(key))
+        toast.expiry.timeout.connect(lambda: self.dismiss(key))
+        toast.expiry.start(TOAST_MS)
+        self.stack.addWidget(toast)
+        self.last_shown = now
+        self.relayout()
+        if self.waiting:
+            self.pump_timer.start(TOAST_INTERVAL_MS)
+    
+    def dismiss(self, key):
+        toast = self.showing.pop(key, None)
+        if toast is not None:
+            self.stack.removeWidget(toast)
+            toast.deleteLater()
+            self.relayout()
+        if self.waiting and not self.pump_timer.isActive():
+            self.pump_timer.start(0)
+    
+    def relayout(self):
+        # Bottom right of the parent, as tall as the toasts need
+        if not self.showing:
+            self.hide()
+            return
+        parent = self.parentWidget().rect()
+        width = min(TOAST_WIDTH, parent.width() - 20)
+        height = self.stack.heightForWidth(width)
+        if height < 0:
+            height = self.stack.sizeHint().height()
+        self.setGeometry(parent.right() - width - 10, parent.bottom() - height - 10, width, height)
+        self.show()
+        self.raise_()
+    
+    def eventFilter(self, watched, event):
+        if event.type() == event.Resize and self.showing:
+            self.relayout()
+        return False
 
 class AnalogClock(QWidget):
     def __init__(self, parent=None):
@@ -73,74 +769,142 @@ class AnalogClock(QWidget):
         self.second_hand_color = QColor(255, 0, 0)
         self.marker_color = QColor(0, 0, 0)
         
-        # Start timer to update clock every second
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update)
-        self.timer.start(1000)
+        # Pre-rendered face and markers, rebuilt on resize or theme change
+        self.face_cache = None
         
-    def paintEvent(self, event):
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.Antialiasing)
+        # Time shown by the hands and the hand tips as last painted
+        self.shown_time = QTime.currentTime()
+        self.hand_tips = None
+        self.show_seconds = True
         
+    
+    def invalidate_face(self):
+        self.face_cache = None
+        self.update()
+    
+    def set_show_seconds(self, show):
+        if show != self.show_seconds:
+            self.show_seconds = show
+            self.update()
+    
+    def resizeEvent(self, event):
+        self.face_cache = None
+        super().resizeEvent(event)
+    
+    def clock_geometry(self):
         # Calculate clock center and radius
         rect = self.rect()
-        center = rect.center()
-        radius = min(rect.width(), rect.height()) // 2 - 10
+        return rect.center(), min(rect.width(), rect.height()) // 2 - 10
+    
+    def hand_points(self, current_time):
+        # Tips of the hour, minute and second hands in half-degree steps
+        center, radius = self.clock_geometry()
+        hour = current_time.hour() % 12
+        minute = current_time.minute()
+        second = current_time.second()
+        steps = (hour * 60 + minute, minute * 12, second * 12)
+        lengths = (radius * 0.5, radius * 0.7, radius * 0.8)
+        return [QPoint(center.x() + int(length * SIN_TABLE[step]),
+                       center.y() - int(length * COS_TABLE[step]))
+                for step, length in zip(steps, lengths)]
+    
+    def tick(self):
+        # Called by the window's ClockService at every second boundary
+        self.shown_time = QTime.currentTime()
+        new_tips = self.hand_points(self.shown_time)
+        if self.hand_tips is None or self.face_cache is None:
+            self.update()
+            return
+        
+        # Repaint only the area swept by hands that moved
+        center, _ = self.clock_geometry()
+        region = QRegion()
+        drawn = 3 if self.show_seconds else 2
+        for old_tip, new_tip in zip(self.hand_tips[:drawn], new_tips[:drawn]):
+            if old_tip != new_tip:
+                for tip in (old_tip, new_tip):
+                    region = region.united(QRect(center, tip).normalized().adjusted(
+                        -HAND_MARGIN, -HAND_MARGIN, HAND_MARGIN, HAND_MARGIN))
+        if not region.isEmpty():
+            self.update(region)
+    
+    def render_face(self):
+        ratio = self.devicePixelRatioF()
+        face = QPixmap(self.size() * ratio)
+        face.setDevicePixelRatio(ratio)
+        face.fill(Qt.transparent)
+        
+        painter = QPainter(face)
+        painter.setRenderHint(QPainter.Antialiasing)
+        center, radius = self.clock_geometry()
         
         # Draw clock face
         painter.setPen(QPen(self.marker_color, 2))
         painter.setBrush(QBrush(self.face_color))
         painter.drawEllipse(center, radius, radius)
         
-        # Draw hour marks
-        painter.setPen(QPen(self.marker_color, 2))
-        for i in range(12):
-            angle = i * 30  # 360 / 12 = 30 degrees per hour
-            x1 = center.x() + int((radius - 10) * math.sin(math.radians(angle)))
-            y1 = center.y() - int((radius - 10) * math.cos(math.radians(angle)))
-            x2 = center.x() + int(radius * math.sin(math.radians(angle)))
-            y2 = center.y() - int(radius * math.cos(math.radians(angle)))
+        # Draw hour marks (every 30 degrees)
+        for step in range(0, HAND_STEPS, HAND_STEPS // 12):
+            x1 = center.x() + int((radius - 10) * SIN_TABLE[step])
+            y1 = center.y() - int((radius - 10) * COS_TABLE[step])
+            x2 = center.x() + int(radius * SIN_TABLE[step])
+            y2 = center.y() - int(radius * COS_TABLE[step])
             painter.drawLine(x1, y1, x2, y2)
+        painter.end()
+        return face
+        
+    def paintEvent(self, event):
+        started = time.perf_counter() if metrics.enabled else None
+        if self.face_cache is None:
+            self.face_cache = self.render_face()
+        
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self.face_cache)
+        painter.setRenderHint(QPainter.Antialiasing)
         
-        # Get current time
-        current_time = QTime.currentTime()
-        hour = current_time.hour() % 12
-        minute = current_time.minute()
-        second = current_time.second()
+        center, _ = self.clock_geometry()
+        self.hand_tips = self.hand_points(self.shown_time)
+        hour_tip, minute_tip, second_tip = self.hand_tips
         
         # Draw hour hand
-        hour_angle = (hour + minute / 60.0) * 30  # 360 / 12 = 30 degrees per hour
-        hour_length = radius * 0.5
-        hour_x = center.x() + int(hour_length * math.sin(math.radians(hour_angle)))
-        hour_y = center.y() - int(hour_length * math.cos(math.radians(hour_angle)))
         painter.setPen(QPen(self.hour_hand_color, 4))
-        painter.drawLine(center, QPoint(hour_x, hour_y))
+        painter.drawLine(center, hour_tip)
         
         # Draw minute hand
-        minute_angle = minute * 6  # 360 / 60 = 6 degrees per minute
-        minute_length = radius * 0.7
-        minute_x = center.x() + int(minute_length * math.sin(math.radians(minute_angle)))
-        minute_y = center.y() - int(minute_length * math.cos(math.radians(minute_angle)))
         painter.setPen(QPen(self.minute_hand_color, 3))
-        painter.drawLine(center, QPoint(minute_x, minute_y))
+        painter.drawLine(center, minute_tip)
         
         # Draw second hand
-        second_angle = second * 6  # 360 / 60 = 6 degrees per second
-        second_length = radius * 0.8
-        second_x = center.x() + int(second_length * math.sin(math.radians(second_angle)))
-        second_y = center.y() - int(second_length * math.cos(math.radians(second_angle)))
-        painter.setPen(QPen(self.second_hand_color, 2))
-        painter.drawLine(center, QPoint(second_x, second_y))
+        if self.show_seconds:
+            painter.setPen(QPen(self.second_hand_color, 2))
+            painter.drawLine(center, second_tip)
         
         # Draw center point
         painter.setPen(QPen(self.marker_color, 1))
         painter.setBrush(QBrush(self.marker_color))
         painter.drawEllipse(center, 5, 5)
+        painter.end()
+        if started is not None:
+            metrics.PAINT_TIME.observe(time.perf_counter() - started)
 
 class AlarmClock(QMainWindow):
+    sound_failed = pyqtSignal(str)  # why a sound chosen for an alarm cannot be played
+    
     def __init__(self):
         super().__init__()
-        self.alarms = []
+        # With ALARM_CLOCK_SERVER=<socket path> the window is a thin client of
+        # an alarm server (server.py), which schedules, stores and rings the
+        # alarms; otherwise the window runs its own engine
+        server_path = os.environ.get("ALARM_CLOCK_SERVER")
+        self.remote = bool(server_path)
+        if self.remote:
+            from client import RemoteEngine
+            self.engine = RemoteEngine(os.path.expanduser(server_path))
+        else:
+            self.engine = AlarmEngine()
+        self.alarm_model = AlarmListModel(self.engine)
+        self.dispatcher = FireDispatcher(self.engine, parent=self)
+        self.dispatcher.fired.connect(self.trigger_alarms)
         self.sound_options = {
             "Samsung Alarm": "SamsungAlarm.mp3",
             "iPhone Alarm": "IphoneAlarm.mp3",
@@ -149,17 +913,93 @@ class AlarmClock(QMainWindow):
             "Custom Sound": None  # Placeholder for custom sound
         }
         self.current_playing_alarm = None
-        self.play_thread = None
+        self.ringing_alarms = {}  # id -> alarm, every alarm currently sounding
         self.custom_sound_path = None
         self.current_theme = "midnight"  # Changed default to midnight
         
-        self.init_ui()
+        # Audio is set up by init_audio() once the first frame is painted;
+        # sounds asked for before then are decoded as soon as it is
+        self.sound_bank = None
+        self.mixer = None
+        self.pending_sounds = set(BUILTIN_SOUNDS)
+        
+        # Instrumentation, e.g. ALARM_CLOCK_METRICS=prometheus:9464,json:stats.json,panel
+        metrics_spec = os.environ.get("ALARM_CLOCK_METRICS", "")
+        self.metric_exporters = metrics.start_exporters(metrics_spec) if metrics_spec else []
+        self.show_stats = "panel" in metrics_spec
+        
+        # What to do with alarms missed while asleep, e.g. ALARM_CLOCK_CATCH_UP=skip
+        catch_up = os.environ.get("ALARM_CLOCK_CATCH_UP", FIRE_LATE)
+        if self.remote:
+            pass  # the server applies its own policy
+        elif catch_up in CATCH_UP_POLICIES:
+            self.engine.catch_up = catch_up
+        else:
+            print(f"Unknown catch-up policy {catch_up!r}, using {FIRE_LATE}")
         
-        # Start the alarm checker
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.check_alarms)
-        self.timer.start(1000)  # Check every second
+        # One wall-clock aligned timer drives the alarms and the clock displays
+        self.clock = ClockService(self.engine, self)
+        self.clock.jumped.connect(self.on_clock_jump)
+        self.missed_alarms = []
+        self.engine.on("missed", self.on_missed)
+        self.sound_failed.connect(self.on_sound_failed)
         
+        self.time_format = "%H:%M:%S"
+        self.init_ui()
+        
+        # Display updates follow visibility and, optionally, user activity
+        self.power = PowerManager(self, os.environ.get("ALARM_CLOCK_LOW_REFRESH") == "1")
+        
+        # Restore saved alarms and keep the database up to date from now on
+        self.load_timer = QTimer(self)
+        self.load_timer.timeout.connect(self.load_saved_alarms)
+        if self.remote:
+            self.database = None
+            self.alarm_model.append(list(self.engine))
+            self.server_notifier = QSocketNotifier(self.engine.fileno(), QSocketNotifier.Read, self)
+            self.server_notifier.activated.connect(self.poll_server)
+            # Another client may silence an alarm this window is showing
+            for event in ("snoozed", "stopped", "removed"):
+                self.engine.on(event, self.on_silenced)
+        else:
+            self.database = AlarmDatabase(os.environ.get("ALARM_CLOCK_DB", DEFAULT_PATH))
+            self.load_saved_alarms()
+            self.database.attach(self.engine)
+            self.load_timer.start(LOAD_INTERVAL_MS)
+        self.clock.arm()
+        
+    def init_audio(self):
+        # Open the audio device and start decoding sounds in the background.
+        # Anything that needs to play a sound calls this first.
+        if self.mixer is not None:
+            return
+        import pygame  # deferred, importing it takes longer than showing the window
+        pygame.mixer.init()
+        # Sounds are converted once to the mixer's format and kept on disk
+        cache = SoundCache(os.environ.get("ALARM_CLOCK_SOUND_CACHE", SOUND_CACHE_DIRECTORY))
+        self.sound_bank = SoundBank(cache=cache)
+        self.mixer = AlarmMixer(
+            call_later=lambda delay, callback: QTimer.singleShot(math.ceil(delay * 1000), callback),
+            on_finished=self.on_voice_finished)
+        self.sound_bank.warm(self.pending_sounds)
+        self.pending_sounds = set()
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if self.mixer is None and not self.remote:
+            # First frame is being drawn; bring audio up right after it
+            QTimer.singleShot(0, self.init_audio)
+    
+    def preload_sounds(self, paths):
+        # Decode paths ahead of time, or remember them until audio is up.
+        # A remote window plays nothing; the server prepares its own sounds.
+        if self.remote:
+            return
+        if self.sound_bank is None:
+            self.pending_sounds.update(filter(None, paths))
+        else:
+            self.sound_bank.warm(filter(None, paths))
+    
     def init_ui(self):
         self.setWindowTitle("Advanced Alarm Clock")
         self.setGeometry(300, 300, 600, 600)  # Made taller to accommodate the analog clock
@@ -186,6 +1026,7 @@ class AlarmClock(QMainWindow):
         
         # Add analog clock
         self.analog_clock = AnalogClock()
+        self.clock.second.connect(lambda now: self.analog_clock.tick())
         main_layout.addWidget(self.analog_clock)
         
         # Current time display
@@ -195,9 +1036,7 @@ class AlarmClock(QMainWindow):
         main_layout.addWidget(self.time_label)
         
         # Update time every second
-        self.time_timer = QTimer(self)
-        self.time_timer.timeout.connect(self.update_time)
-        self.time_timer.start(1000)
+        self.clock.second.connect(self.update_time)
         self.update_time()
         
         # Alarm creation section
@@ -228,6 +1067,17 @@ class AlarmClock(QMainWindow):
         
         alarm_layout.addWidget(sound_section)
         
+        # Repeat rule
+        self.repeat_combo = QComboBox()
+        for repeat in REPEAT_OPTIONS.keys():
+            self.repeat_combo.addItem(repeat)
+        alarm_layout.addWidget(self.repeat_combo)
+        
+        # Time zone the alarm follows; blank means this computer's zone
+        self.zone_edit = QLineEdit()
+        self.zone_edit.setPlaceholderText("Time zone, e.g. Europe/Berlin (blank: local)")
+        alarm_layout.addWidget(self.zone_edit)
+        
         # Snooze duration
         snooze_layout = QHBoxLayout()
         snooze_layout.addWidget(QLabel("Snooze (min):"))
@@ -240,6 +1090,18 @@ class AlarmClock(QMainWindow):
         snooze_widget.setLayout(snooze_layout)
         alarm_layout.addWidget(snooze_widget)
         
+        # Alarm volume
+        volume_layout = QHBoxLayout()
+        volume_layout.addWidget(QLabel("Volume (%):"))
+        self.volume_spin = QSpinBox()
+        self.volume_spin.setRange(0, 100)
+        self.volume_spin.setValue(100)
+        volume_layout.addWidget(self.volume_spin)
+        
+        volume_widget = QWidget()
+        volume_widget.setLayout(volume_layout)
+        alarm_layout.addWidget(volume_widget)
+        
         # Add alarm button
         self.add_btn = QPushButton("Add Alarm")
         self.add_btn.clicked.connect(self.add_alarm)
@@ -248,8 +1110,36 @@ class AlarmClock(QMainWindow):
         main_layout.addWidget(alarm_section)
         
         # Alarm list
-        self.alarm_list = QListWidget()
-        self.alarm_list.setSelectionMode(QListWidget.SingleSelection)
+        # Alarm list filter and sort order
+        list_tools_layout = QHBoxLayout()
+        self.filter_edit = QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter alarms...")
+        list_tools_layout.addWidget(self.filter_edit)
+        self.sort_combo = QComboBox()
+        self.sort_combo.addItem("Order added")
+        self.sort_combo.addItem("Next alarm first")
+        self.sort_combo.currentIndexChanged.connect(self.change_sort)
+        list_tools_layout.addWidget(self.sort_combo)
+        
+        list_tools_widget = QWidget()
+        list_tools_widget.setLayout(list_tools_layout)
+        main_layout.addWidget(list_tools_widget)
+        
+        # Alarm list
+        self.alarm_proxy = AlarmFilterProxy(self)
+        self.alarm_proxy.setSourceModel(self.alarm_model)
+        # Filter once typing pauses rather than on every keystroke
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(FILTER_DELAY_MS)
+        self.filter_timer.timeout.connect(
+            lambda: self.alarm_proxy.set_pattern(self.filter_edit.text()))
+        self.filter_edit.textChanged.connect(self.filter_timer.start)
+        
+        self.alarm_list = QListView()
+        self.alarm_list.setUniformItemSizes(True)
+        self.alarm_list.setSelectionMode(QListView.SingleSelection)
+        self.alarm_list.setModel(self.alarm_proxy)
         main_layout.addWidget(self.alarm_list)
         
         # Control buttons
@@ -263,10 +1153,28 @@ class AlarmClock(QMainWindow):
         self.test_btn.clicked.connect(self.test_sound)
         btn_layout.addWidget(self.test_btn)
         
+        self.import_btn = QPushButton("Import...")
+        self.import_btn.clicked.connect(self.import_alarms)
+        btn_layout.addWidget(self.import_btn)
+        
+        self.export_btn = QPushButton("Export...")
+        self.export_btn.clicked.connect(self.export_alarms)
+        btn_layout.addWidget(self.export_btn)
+        
         control_widget = QWidget()
         control_widget.setLayout(btn_layout)
         main_layout.addWidget(control_widget)
         
+        # Stats panel, only shown when metrics are enabled with "panel"
+        self.stats_label = QLabel()
+        self.stats_label.setStyleSheet("font-family: monospace; font-size: 11px;")
+        self.stats_label.setVisible(self.show_stats)
+        main_layout.addWidget(self.stats_label)
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_stats)
+        if self.show_stats:
+            self.stats_timer.start(STATS_INTERVAL_MS)
+        
         # Alarm control section (visible when alarm is triggered)
         self.alarm_control = QWidget()
         alarm_control_layout = QVBoxLayout(self.alarm_control)
@@ -306,13 +1214,33 @@ class AlarmClock(QMainWindow):
         main_layout.addWidget(self.alarm_control)
         
         self.setCentralWidget(main_widget)
+        self.toasts = ToastArea(self)
         
         # Apply default theme
         self.apply_theme("midnight")  # Changed default to midnight
         
-    def update_time(self):
-        current_time = datetime.now().strftime("%H:%M:%S")
-        self.time_label.setText(current_time)
+    def update_time(self, now=None):
+        if now is None:
+            now = datetime.now()
+        self.time_label.setText(now.strftime(self.time_format))
+    
+    def set_display_seconds(self, show):
+        # Whether the clocks show seconds; without them they only need an
+        # update once a minute
+        self.time_format = "%H:%M:%S" if show else "%H:%M"
+        self.analog_clock.set_show_seconds(show)
+    
+    def set_display_active(self, active):
+        # Displays that nobody can see need no timers
+        if self.show_stats:
+            if active:
+                self.update_stats()
+                self.stats_timer.start(STATS_INTERVAL_MS)
+            else:
+                self.stats_timer.stop()
+    
+    def update_stats(self):
+        self.stats_label.setText("\n".join(metrics.summary()))
     
     def on_sound_changed(self, sound_name):
         # Show or hide browse button based on selection
@@ -331,6 +1259,7 @@ class AlarmClock(QMainWindow):
         if file_path:
             self.custom_sound_path = file_path
             self.sound_options["Custom Sound"] = file_path
+            self.preload_sounds([file_path])
             
             # Extract just the filename for display
             file_name = file_path.split("/")[-1]
@@ -348,14 +1277,23 @@ class AlarmClock(QMainWindow):
             
         # Check if a custom sound is selected but not set
         if sound_name == "Custom Sound" and not self.custom_sound_path:
-            QMessageBox.warning(self, "No Sound Selected", 
-                               "Please select a custom sound file first.")
+            self.toasts.notify("No Sound Selected", "Please select a custom sound file first.",
+                               warning=True)
             return
             
         snooze_duration = self.snooze_spin.value()
+        volume = self.volume_spin.value()
+        rule = REPEAT_OPTIONS[self.repeat_combo.currentText()]
+        zone_name = self.zone_edit.text().strip() or None
+        try:
+            zone = get_zone(zone_name)
+        except ValueError as e:
+            self.toasts.notify("Unknown Time Zone", str(e), warning=True)
+            return
         
-        # Create datetime object for today with the selected time
-        now = datetime.now()
+        # Create datetime object for today with the selected time, as a
+        # wall-clock time in the alarm's zone
+        now = local_datetime(time.time(), zone)
         alarm_time = datetime(now.year, now.month, now.day, 
                              time_value.hour(), time_value.minute())
         
@@ -364,89 +1302,211 @@ class AlarmClock(QMainWindow):
             alarm_time += timedelta(days=1)
         
         # Create and add the alarm
-        alarm = Alarm(alarm_time, sound_file, snooze_duration)
-        alarm.signals.alarm_triggered.connect(self.trigger_alarm)
-        self.alarms.append(alarm)
-        
-        # Add to list widget
-        item = QListWidgetItem(str(alarm))
-        self.alarm_list.addItem(item)
+        alarm = self.engine.add(alarm_time, sound_file, snooze_duration, volume=volume, rule=rule,
+                                zone=zone_name)
+        if not self.remote:  # otherwise the server prepares and plays the sound
+            # The sound is checked where it is being prepared, on the sound
+            # bank's worker, so the window and its clock never wait for a
+            # long file; a file that cannot be played is reported from there
+            self.init_audio()
+            self.sound_bank.check_later(sound_file, self.sound_failed.emit)
+        
+        self.toasts.notify("Alarm Added",
+                           f"Alarm set for {alarm.time.strftime('%a %H:%M %Z').strip()}")
+    
+    def import_alarms(self):
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "Import Alarms", "", ALARM_FILE_FILTER)
+        if not file_path:
+            return
         
-        QMessageBox.information(self, "Alarm Added", 
-                               f"Alarm set for {alarm_time.strftime('%H:%M')}")
+        # Bulk insert; the list and the database each get one update per batch
+        sounds_before = len(self.engine.store.sounds)
+        try:
+            imported, skipped, rejected = import_alarms(self.engine, file_path)
+        except (OSError, ValueError, KeyError) as e:
+            self.toasts.notify("Import Failed", f"Could not import alarms: {e}", warning=True)
+            return
+        self.preload_sounds(self.engine.store.sounds[sounds_before:])
+        
+        message = f"Imported {imported} alarms."
+        if skipped:
+            message += f" Skipped {skipped} with a missing sound file."
+        if rejected:
+            message += f" Rejected {len(rejected)} invalid rows ({rejected[0]}"
+            message += ", ...)." if len(rejected) > 1 else ")."
+        self.toasts.notify("Alarms Imported", message, warning=bool(rejected))
+    
+    def export_alarms(self):
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Alarms", "alarms.csv", ALARM_FILE_FILTER)
+        if not file_path:
+            return
+        try:
+            rows = engine_rows(self.engine) if self.database is None else self.database.rows()
+            count = export_alarms(rows, file_path)
+        except (OSError, ValueError) as e:
+            self.toasts.notify("Export Failed", f"Could not export alarms: {e}", warning=True)
+            return
+        self.toasts.notify("Alarms Exported", f"Exported {count} alarms.")
+    
+    def poll_server(self):
+        if not self.engine.poll():
+            self.toasts.notify("Server Disconnected",
+                               "Lost the connection to the alarm server. Restart the app to "
+                               "reconnect.", warning=True)
+            self.server_notifier.setEnabled(False)
+    
+    def on_silenced(self, alarm):
+        if alarm.id in self.ringing_alarms:
+            self.dismiss_alarm(alarm)
+    
+    def load_saved_alarms(self):
+        if self.database is None:
+            return
+        until = datetime.now() + LOAD_WINDOW
+        due_soon = self.engine.schedule_pending(until)
+        alarms = self.database.load_into(self.engine, until)
+        self.alarm_model.append(alarms)
+        due_soon += [alarm for alarm in alarms if alarm.id not in self.engine.pending]
+        self.preload_sounds({alarm.sound for alarm in due_soon})
+    
+    def change_sort(self, index):
+        self.alarm_model.sort_by_next_fire(index == 1)
     
     def remove_alarm(self):
-        selected_items = self.alarm_list.selectedItems()
-        if not selected_items:
+        selected = self.alarm_list.selectionModel().selectedIndexes()
+        if not selected:
             return
-            
-        selected_index = self.alarm_list.row(selected_items[0])
-        self.alarm_list.takeItem(selected_index)
-        removed_alarm = self.alarms.pop(selected_index)
         
-        # If this is the currently playing alarm, stop it
-        if self.current_playing_alarm == removed_alarm:
-            self.stop_alarm()
+        alarm_id = selected[0].data(AlarmListModel.AlarmIdRole)
+        removed_alarm = self.engine.get(alarm_id)
+        self.engine.remove(alarm_id)
+        
+        # If this alarm is ringing, silence it
+        if alarm_id in self.ringing_alarms:
+            self.dismiss_alarm(removed_alarm)
     
     def test_sound(self):
+        # A second click stops the test sound
+        self.init_audio()
+        if self.mixer.stop("test"):
+            self.test_btn.setText("Test Sound")
+            return
+        
         sound_name = self.sound_combo.currentText()
         sound_file = self.sound_options[sound_name]
         
-        # Play the sound in a separate thread
-        if self.play_thread is None or not self.play_thread.is_alive():
-            self.play_thread = threading.Thread(target=self.play_test_sound, args=(sound_file,))
-            self.play_thread.daemon = True
-            self.play_thread.start()
-    
-    def play_test_sound(self, sound_file):
         try:
-            pygame.mixer.music.load(sound_file)
-            pygame.mixer.music.play()
-            # Wait for the sound to finish
-            while pygame.mixer.music.get_busy():
-                time.sleep(0.1)
+            sound = self.sound_bank.get(sound_file)
         except Exception as e:
             print(f"Error playing test sound: {e}")
+            return
+        # The test voice never steals a voice from a ringing alarm
+        if self.mixer.play("test", sound, priority=TEST_PRIORITY):
+            self.test_btn.setText("Stop Test")
+    
+    def on_voice_finished(self, key):
+        # Called by the mixer when a sound ends on its own or loses its voice.
+        # A ringing alarm that lost its voice keeps ringing; assign_voices()
+        # plays its sound again once other alarms are silenced.
+        if key == "test":
+            self.test_btn.setText("Test Sound")
+    
+    def on_sound_failed(self, message):
+        self.toasts.notify("Unusable Sound", f"{message}. Alarms using it will ring silently.",
+                           warning=True)
     
-    def check_alarms(self):
-        for alarm in self.alarms:
-            if alarm.check_and_trigger():
-                break  # Only trigger one alarm at a time
+    def on_clock_jump(self, seconds):
+        # The lazy loader's hourly timer slept through the gap as well
+        self.load_saved_alarms()
     
-    def trigger_alarm(self, sound_file):
-        # Find the alarm that triggered
-        for alarm in self.alarms:
-            if alarm.is_playing and alarm.sound == sound_file:
-                self.current_playing_alarm = alarm
-                break
+    def on_missed(self, alarm):
+        # Alarms the catch-up policy kept quiet are reported in one toast
+        # once the tick that found them is over
+        if not self.missed_alarms:
+            QTimer.singleShot(0, self.report_missed)
+        self.missed_alarms.append(alarm)
+    
+    def report_missed(self):
+        count, self.missed_alarms = len(self.missed_alarms), []
+        self.toasts.notify("Missed Alarms",
+                           f"{count} alarm{'s' if count != 1 else ''} missed while the computer "
+                           "was asleep did not ring.", warning=True)
+    
+    def trigger_alarms(self, alarms):
+        # Everything that fired together, in one pass: the alarms join the
+        # ringing set, the voices are worked out once for all of them, and
+        # the controls come up for the first if none were showing
+        for alarm in alarms:
+            self.ringing_alarms[alarm.id] = alarm
+        if not self.remote:  # otherwise the server is already playing the sounds
+            self.init_audio()
+            self.assign_voices()
+            if metrics.enabled and self.clock.woken_for is not None:
+                metrics.AUDIBLE_DELAY.observe(max(0.0, time.time() - self.clock.woken_for))
+        self.show_next_alarm()
+    
+    def assign_voices(self):
+        # One looping voice per distinct sound among the ringing alarms, at
+        # the loudest of their volumes. An alarm whose sound is already
+        # playing for another ringing alarm does not take a voice of its own;
+        # the sound moves on to it when that alarm is silenced.
+        carriers = {}  # sound -> alarm whose voice plays it
+        volumes = {}  # sound -> loudest volume among its alarms
+        for alarm in self.ringing_alarms.values():
+            sound = alarm.sound
+            if sound is None:
+                continue  # rings silently, with its controls shown as usual
+            if sound not in carriers or self.mixer.is_playing(alarm.id):
+                carriers[sound] = alarm
+            volumes[sound] = max(volumes.get(sound, 0), alarm.volume)
+        for sound, alarm in carriers.items():
+            volume = volumes[sound] / 100
+            if self.mixer.is_playing(alarm.id):
+                self.mixer.set_volume(alarm.id, volume)
+                continue
+            try:
+                source = self.sound_bank.get(sound)
+            except Exception as e:
+                # Its alarms still ring, silently, with their controls shown
+                if metrics.enabled:
+                    metrics.SOUND_ERRORS.inc()
+                self.toasts.notify("Sound Failed", f"{e}. The alarm is ringing silently.",
+                                   warning=True)
+                continue
+            # Loop the sound until its alarms are all stopped or snoozed
+            self.mixer.play(alarm.id, source, volume, ALARM_PRIORITY, loops=-1)
+    
+    def show_alarm_controls(self, alarm):
+        self.current_playing_alarm = alarm
         
         # Generate a new puzzle
         self.generate_puzzle()
         
         # Show alarm controls
         self.alarm_control.setVisible(True)
-        self.current_alarm_label.setText(f"Alarm: {sound_file}")
-        
-        # Play the sound in a separate thread
-        if self.play_thread is None or not self.play_thread.is_alive():
-            self.play_thread = threading.Thread(target=self.play_alarm_sound, args=(sound_file,))
-            self.play_thread.daemon = True
-            self.play_thread.start()
+        self.current_alarm_label.setText(f"Alarm: {alarm.sound}")
     
-    def play_alarm_sound(self, sound_file):
-        try:
-            pygame.mixer.music.load(sound_file)
-            while self.current_playing_alarm and self.current_playing_alarm.is_playing:
-                pygame.mixer.music.play()
-                # Wait for the sound to finish
-                while pygame.mixer.music.get_busy() and self.current_playing_alarm and self.current_playing_alarm.is_playing:
-                    time.sleep(0.1)
-                time.sleep(0.5)  # Small pause between repetitions
-        except Exception as e:
-            print(f"Error playing sound: {e}")
-            # Don't try to show a message box from a non-main thread
-            # Instead, emit a signal to show the message on the main thread
-            self.current_playing_alarm.stop()
+    def show_next_alarm(self):
+        # Point the controls at a ringing alarm, or hide them if none is left
+        current = self.current_playing_alarm
+        if current is not None and current.id in self.ringing_alarms:
+            return
+        self.current_playing_alarm = None
+        if self.ringing_alarms:
+            self.show_alarm_controls(next(iter(self.ringing_alarms.values())))
+        else:
+            self.alarm_control.setVisible(False)
+    
+    def dismiss_alarm(self, alarm):
+        # Silence the alarm and move the controls on to the next ringing one
+        self.ringing_alarms.pop(alarm.id, None)
+        if self.mixer is not None:
+            self.mixer.stop(alarm.id)
+            if not self.remote:
+                self.assign_voices()
+        self.show_next_alarm()
     
     def generate_puzzle(self):
         # Generate two random numbers between 1 and 20
@@ -474,34 +1534,49 @@ class AlarmClock(QMainWindow):
         if user_answer == self.correct_answer:
             # Correct answer - stop the alarm
             self.stop_alarm()
-            QMessageBox.information(self, "Puzzle Solved", "Correct! Alarm stopped.")
+            self.toasts.notify("Puzzle Solved", "Correct! Alarm stopped.")
         else:
             # Wrong answer - generate a new puzzle
-            QMessageBox.warning(self, "Wrong Answer", "Incorrect! Try again with a new puzzle.")
+            self.toasts.notify("Wrong Answer", "Incorrect! Try again with a new puzzle.",
+                               warning=True)
             self.generate_puzzle()
     
     def snooze_alarm(self):
         # Snooze doesn't require solving the puzzle
         if self.current_playing_alarm:
-            self.current_playing_alarm.snooze()
-            snooze_time = datetime.now() + timedelta(minutes=self.current_playing_alarm.snooze_duration)
-            QMessageBox.information(self, "Alarm Snoozed", 
-                                  f"Alarm snoozed until {snooze_time.strftime('%H:%M')}")
-            self.alarm_control.setVisible(False)
-            self.current_playing_alarm = None
+            started = time.perf_counter()
+            alarm = self.current_playing_alarm
+            self.engine.snooze(alarm.id)
+            snooze_time = datetime.now() + timedelta(minutes=alarm.snooze_duration)
+            self.dismiss_alarm(alarm)
+            if metrics.enabled:
+                metrics.SNOOZE_TIME.observe(time.perf_counter() - started)
+            self.toasts.notify("Alarm Snoozed",
+                               f"Alarm snoozed until {snooze_time.strftime('%H:%M')}")
     
     def stop_alarm(self):
         if self.current_playing_alarm:
-            self.current_playing_alarm.stop()
-            pygame.mixer.music.stop()  # Make sure to stop the sound
-            self.alarm_control.setVisible(False)
-            self.current_playing_alarm = None
+            started = time.perf_counter()
+            alarm = self.current_playing_alarm
+            self.engine.stop(alarm.id)
+            self.dismiss_alarm(alarm)
+            if metrics.enabled:
+                metrics.STOP_TIME.observe(time.perf_counter() - started)
     
     def closeEvent(self, event):
         # Clean up before closing
-        self.timer.stop()
-        self.time_timer.stop()
-        self.analog_clock.timer.stop()  # Stop the analog clock timer
+        self.clock.stop()
+        self.load_timer.stop()
+        self.stats_timer.stop()
+        for exporter in self.metric_exporters:
+            exporter.close()
+        if self.remote:
+            self.engine.close()
+        else:
+            self.database.close()
+        if self.mixer is not None:
+            self.mixer.stop_all()
+            self.sound_bank.shutdown()
         event.accept()
     
     def change_theme(self, index):
@@ -511,105 +1586,14 @@ class AlarmClock(QMainWindow):
             self.apply_theme("midnight")
     
     def apply_theme(self, theme_name):
+        # Setting an unchanged sheet would still make Qt re-polish every widget
+        if self.styleSheet() == THEME_STYLESHEETS.get(theme_name):
+            return
         self.current_theme = theme_name
         
         if theme_name == "sunrise":
             # 🌅 Sunrise Theme - Warmer, less pink gradient with rounded elements
-            self.setStyleSheet("""
-                QMainWindow, QWidget {
-                    background-color: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                                      stop:0 #ffecd1, stop:0.5 #ffcad4, stop:1 #f7d6e0);
-                    color: #5e4c5a;
-                }
-                QLabel {
-                    color: #5e4c5a;
-                    background-color: transparent;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                }
-                QPushButton {
-                    background-color: #f8a978;
-                    color: #5e4c5a;
-                    border: none;
-                    border-radius: 12px;
-                    padding: 10px 18px;
-                    font-weight: bold;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-                }
-                QPushButton:hover {
-                    background-color: #f9c784;
-                    transform: translateY(-2px);
-                }
-                QPushButton:pressed {
-                    background-color: #e88a54;
-                    transform: translateY(1px);
-                }
-                QTimeEdit, QSpinBox {
-                    background-color: #fff1e6;
-                    border: 2px solid #f8a978;
-                    border-radius: 10px;
-                    padding: 6px;
-                    color: #5e4c5a;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    selection-background-color: #f8a978;
-                }
-                QComboBox {
-                    background-color: #fff1e6;
-                    border: 2px solid #f8a978;
-                    border-radius: 10px;
-                    padding: 6px;
-                    color: #5e4c5a;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    selection-background-color: #f8a978;
-                    min-height: 25px;
-                }
-                QComboBox::drop-down {
-                    subcontrol-origin: padding;
-                    subcontrol-position: right center;
-                    width: 25px;
-                    border-left: none;
-                    border-top-right-radius: 10px;
-                    border-bottom-right-radius: 10px;
-                }
-                QComboBox::down-arrow {
-                    image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTQiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDE0IDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+PHBhdGggZD0iTTEgMUw3IDdMMTMgMSIgc3Ryb2tlPSIjZjhhOTc4IiBzdHJva2Utd2lkdGg9IjIiIHN0cm9rZS1saW5lY2FwPSJyb3VuZCIgc3Ryb2tlLWxpbmVqb2luPSJyb3VuZCIvPjwvc3ZnPg==);
-                    width: 14px;
-                    height: 8px;
-                }
-                QComboBox QAbstractItemView {
-                    background-color: #fff1e6;
-                    border: 2px solid #f8a978;
-                    border-radius: 10px;
-                    selection-background-color: #f9c784;
-                    selection-color: #5e4c5a;
-                    outline: none;
-                }
-                QListWidget {
-                    background-color: rgba(255, 241, 230, 0.7);
-                    border: 2px solid #f8a978;
-                    border-radius: 12px;
-                    padding: 5px;
-                    alternate-background-color: rgba(255, 202, 212, 0.3);
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                }
-                QListWidget::item {
-                    border-radius: 8px;
-                    padding: 5px;
-                    margin: 2px;
-                }
-                QListWidget::item:selected {
-                    background-color: #f8a978;
-                    color: #5e4c5a;
-                }
-                #time_label {
-                    color: #e88a54;
-                    font-size: 48px;
-                    font-weight: bold;
-                    background-color: transparent;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    text-shadow: 2px 2px 4px rgba(0, 0, 0, 0.1);
-                }
-            """)
+            self.setStyleSheet(THEME_STYLESHEETS["sunrise"])
             # Update analog clock colors for sunrise theme
             self.analog_clock.face_color = QColor(255, 241, 230, 200)
             self.analog_clock.hour_hand_color = QColor(94, 76, 90)
@@ -619,104 +1603,7 @@ class AlarmClock(QMainWindow):
             
         else:  # midnight theme
             # 🌙 Midnight Theme - Cute starry night with glowing elements
-            self.setStyleSheet("""
-                QMainWindow, QWidget {
-                    background-color: qlineargradient(x1:0, y1:0, x2:1, y2:1,
-                                      stop:0 #0f1c2e, stop:0.5 #1a2a43, stop:1 #0f1c2e);
-                    color: #e0fbfc;
-                }
-                QLabel {
-                    color: #e0fbfc;
-                    background-color: transparent;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                }
-                QPushButton {
-                    background-color: #1e3a5f;
-                    color: #5edfff;
-                    border: 2px solid #5edfff;
-                    border-radius: 12px;
-                    padding: 10px 18px;
-                    font-weight: bold;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    box-shadow: 0 0 10px rgba(94, 223, 255, 0.5);
-                }
-                QPushButton:hover {
-                    background-color: #2a4a7f;
-                    border: 2px solid #98f5ff;
-                    box-shadow: 0 0 15px rgba(94, 223, 255, 0.7);
-                }
-                QPushButton:pressed {
-                    background-color: #0c2c54;
-                    box-shadow: 0 0 5px rgba(94, 223, 255, 0.3);
-                }
-                QTimeEdit, QSpinBox {
-                    background-color: #1e3a5f;
-                    border: 2px solid #5edfff;
-                    border-radius: 10px;
-                    padding: 6px;
-                    color: #e0fbfc;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    selection-background-color: #5edfff;
-                    selection-color: #0f1c2e;
-                }
-                QComboBox {
-                    background-color: #1e3a5f;
-                    border: 2px solid #5edfff;
-                    border-radius: 10px;
-                    padding: 6px;
-                    color: #e0fbfc;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    selection-background-color: #5edfff;
-                    min-height: 25px;
-                }
-                QComboBox::drop-down {
-                    subcontrol-origin: padding;
-                    subcontrol-position: right center;
-                    width: 25px;
-                    border-left: none;
-                    border-top-right-radius: 10px;
-                    border-bottom-right-radius: 10px;
-                }
-                QComboBox::down-arrow {
-                    image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTQiIGhlaWdodD0iOCIgdmlld0JveD0iMCAwIDE0IDgiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+PHBhdGggZD0iTTEgMUw3IDdMMTMgMSIgc3Ryb2tlPSIjNWVkZmZmIiBzdHJva2Utd2lkdGg9IjIiIHN0cm9rZS1saW5lY2FwPSJyb3VuZCIgc3Ryb2tlLWxpbmVqb2luPSJyb3VuZCIvPjwvc3ZnPg==);
-                    width: 14px;
-                    height: 8px;
-                }
-                QComboBox QAbstractItemView {
-                    background-color: #1e3a5f;
-                    border: 2px solid #5edfff;
-                    border-radius: 10px;
-                    selection-background-color: #5edfff;
-                    selection-color: #0f1c2e;
-                    outline: none;
-                }
-                QListWidget {
-                    background-color: #1e3a5f;
-                    border: 2px solid #5edfff;
-                    border-radius: 12px;
-                    padding: 5px;
-                    color: #e0fbfc;
-                    alternate-background-color: #2a4a7f;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                }
-                QListWidget::item {
-                    border-radius: 8px;
-                    padding: 5px;
-                    margin: 2px;
-                }
-                QListWidget::item:selected {
-                    background-color: #5edfff;
-                    color: #0f1c2e;
-                }
-                #time_label {
-                    color: #5edfff;
-                    font-size: 48px;
-                    font-weight: bold;
-                    background-color: transparent;
-                    font-family: 'Arial Rounded MT Bold', 'Arial', sans-serif;
-                    text-shadow: 0 0 10px rgba(94, 223, 255, 0.7);
-                }
-            """)
+            self.setStyleSheet(THEME_STYLESHEETS["midnight"])
             # Update analog clock colors for midnight theme
             self.analog_clock.face_color = QColor(30, 58, 95)
             self.analog_clock.hour_hand_color = QColor(224, 251, 252)
@@ -727,8 +1614,8 @@ class AlarmClock(QMainWindow):
         # Set ID for time label to apply specific styling
         self.time_label.setObjectName("time_label")
         
-        # Update the analog clock
-        self.analog_clock.update()
+        # Redraw the analog clock face in the new colors
+        self.analog_clock.invalidate_face()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
@@ -0,0 +1,270 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# Instrumentation is off unless enable() is called. Every call site checks
+# the module-level flag first, e.g.
+#   if metrics.enabled:
+#       metrics.FIRE_LATENESS.observe(late)
+# so a disabled build pays one attribute lookup and branch per event.
+enabled = False
+
+PREFIX = "alarm_clock_"
+
+# Upper bounds in seconds, from 100 µs to 10 s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_PROMETHEUS_PORT = 9464
+DEFAULT_JSON_INTERVAL = 10.0
+
+
+class Counter:
+    __slots__ = ("name", "help", "value", "_lock")
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+    def prometheus(self):
+        return [f"{PREFIX}{self.name} {self.value}"]
+
+
+class Histogram:
+    # Fixed-bucket histogram; observe() is a bisect and three additions
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count", "max", "_lock")
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        with self._lock:
+            counts, count, largest = list(self.counts), self.count, self.max
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for bound, n in zip(self.buckets, counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, largest)
+        return largest
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "max": self.max,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(map(str, self.buckets + ("+Inf",)), self.counts)),
+        }
+
+    def prometheus(self):
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        lines = []
+        seen = 0
+        for bound, n in zip(self.buckets + ("+Inf",), counts):
+            seen += n
+            lines.append(f'{PREFIX}{self.name}_bucket{{le="{bound}"}} {seen}')
+        lines.append(f"{PREFIX}{self.name}_sum {total}")
+        lines.append(f"{PREFIX}{self.name}_count {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def counter(self, name, help):
+        return self.metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS):
+        return self.metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    def prometheus_text(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {PREFIX}{metric.name} {metric.help}")
+            lines.append(f"# TYPE {PREFIX}{metric.name} {metric.kind}")
+            lines.extend(metric.prometheus())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+FIRE_LATENESS = REGISTRY.histogram(
+    "fire_lateness_seconds", "Actual minus scheduled fire time of each alarm")
+AUDIBLE_DELAY = REGISTRY.histogram(
+    "audible_delay_seconds", "Scheduled fire time to the sound starting on a mixer voice")
+DECODE_TIME = REGISTRY.histogram(
+    "sound_decode_seconds", "Time to load and decode a sound file")
+TRANSCODE_TIME = REGISTRY.histogram(
+    "sound_transcode_seconds", "Time to find or make the mixer-format copy of a sound file",
+    LATENCY_BUCKETS + (30.0, 60.0))
+SNOOZE_TIME = REGISTRY.histogram(
+    "snooze_seconds", "Snooze button press until the alarm is silenced and rescheduled")
+STOP_TIME = REGISTRY.histogram(
+    "stop_seconds", "Stop button press until the alarm is silenced and rescheduled")
+TIMER_DRIFT = REGISTRY.histogram(
+    "timer_drift_seconds", "Lateness of the clock timer behind its wall-clock target")
+PAINT_TIME = REGISTRY.histogram(
+    "paint_seconds", "Analog clock paintEvent duration")
+
+ALARMS_FIRED = REGISTRY.counter("alarms_fired_total", "Alarms that started ringing")
+ALARMS_SNOOZED = REGISTRY.counter("alarms_snoozed_total", "Alarms snoozed")
+ALARMS_STOPPED = REGISTRY.counter("alarms_stopped_total", "Alarms stopped")
+SOUND_ERRORS = REGISTRY.counter("sound_errors_total", "Alarms whose sound could not be played")
+VOICES_STOLEN = REGISTRY.counter("voices_stolen_total", "Sounds cut off for a newer alarm")
+CLOCK_JUMPS = REGISTRY.counter("clock_jumps_total", "Wall-clock jumps from suspends or clock steps")
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+class PrometheusExporter:
+    # Serves the registry in the Prometheus text format on
+    # http://127.0.0.1:<port>/metrics from a background thread
+    def __init__(self, registry=REGISTRY, port=DEFAULT_PROMETHEUS_PORT, host="127.0.0.1"):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = exporter.registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.registry = registry
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.server.server_address[1]
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class JsonFileExporter:
+    # Rewrites path with a JSON snapshot of the registry every interval
+    # seconds; the file is replaced atomically so readers never see half of it
+    def __init__(self, path, registry=REGISTRY, interval=DEFAULT_JSON_INTERVAL):
+        self.path = path
+        self.registry = registry
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-json", daemon=True)
+        self._thread.start()
+
+    def write(self):
+        data = {"time": time.time(), "metrics": self.registry.snapshot()}
+        temp = f"{self.path}.tmp"
+        with open(temp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp, self.path)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Error writing metrics: {e}")
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.write()
+        except OSError as e:
+            print(f"Error writing metrics: {e}")
+
+
+def start_exporters(spec):
+    # Turn metrics on and start the exporters named in spec, a comma
+    # separated list such as "prometheus:9464,json:/tmp/alarm-metrics.json".
+    # "panel" is left for the GUI to handle. Returns the started exporters;
+    # one that is unknown or cannot start (a bad or busy port) is reported
+    # and left out.
+    exporters = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, arg = item.partition(":")
+        try:
+            if kind == "prometheus":
+                exporters.append(PrometheusExporter(port=int(arg or DEFAULT_PROMETHEUS_PORT)))
+            elif kind == "json":
+                exporters.append(JsonFileExporter(arg or "alarm-metrics.json"))
+            elif kind != "panel":
+                raise ValueError(f"Unknown metrics exporter: {kind}")
+        except (ValueError, OverflowError, OSError) as e:
+            print(f"Metrics exporter {item!r} not started: {e}")
+    enable()
+    return exporters
+
+
+def summary(registry=REGISTRY):
+    # Human-readable lines for the stats panel
+    lines = []
+    for metric in registry.metrics.values():
+        if isinstance(metric, Counter):
+            lines.append(f"{metric.name}: {metric.value}")
+        elif metric.count:
+            lines.append(f"{metric.name}: n={metric.count} "
+                         f"p50={metric.quantile(0.5) * 1000:.1f}ms "
+                         f"p99={metric.quantile(0.99) * 1000:.1f}ms "
+                         f"max={metric.max * 1000:.1f}ms")
+        else:
+            lines.append(f"{metric.name}: no samples")
+    return lines
@@ -0,0 +1,170 @@
+import itertools
+import threading
+
+import metrics
+from streaming import MUSIC_POLL_SECONDS, MusicChannel, MusicFile, SoundStream
+
+DEFAULT_VOICES = 16
+
+# Voice priorities; a new sound may only steal a voice of equal or lower priority
+TEST_PRIORITY = 0
+ALARM_PRIORITY = 10
+
+# Grace period after a sound's nominal end before its voice is checked again
+END_SLACK_SECONDS = 0.02
+
+
+class Voice:
+    __slots__ = ("key", "channel", "priority", "order", "player")
+
+    def __init__(self, key, channel, priority, order, player=None):
+        self.key = key
+        self.channel = channel
+        self.priority = priority
+        self.order = order
+        self.player = player  # StreamPlayer feeding the channel, for streamed sounds
+
+    def busy(self):
+        # A stream's channel can run dry for a moment while its reader catches up
+        return self.channel.get_busy() or (self.player is not None and self.player.active)
+
+    def silence(self):
+        if self.player is not None:
+            self.player.stop()
+        self.channel.stop()
+
+
+class AlarmMixer:
+    # Plays any number of sounds at once on dedicated pygame mixer channels.
+    # Each voice is addressed by a key (an alarm id, or "test" for the test
+    # button) and has its own volume and priority. When every channel is in
+    # use the lowest-priority, oldest voice is stolen. Mixing happens inside
+    # SDL, so no Python thread is needed per playing sound.
+    #
+    # Large files come from the SoundBank as streams (streaming.py): a
+    # SoundStream is fed to its channel chunk by chunk, and a MusicFile plays
+    # on pygame.mixer.music, which counts as one extra voice.
+    #
+    # Completion is event driven: call_later(delay, callback) is supplied by
+    # the host event loop (QTimer.singleShot, asyncio's loop.call_later) and
+    # is used to wake up once at the end of each finite sound. on_finished(key)
+    # is then called for voices that ended on their own or were stolen, but
+    # not for voices silenced with stop().
+    def __init__(self, voices=DEFAULT_VOICES, call_later=None, on_finished=None):
+        import pygame  # imported on first use to keep it off the start-up path
+        pygame.mixer.set_num_channels(voices)
+        self.channels = [pygame.mixer.Channel(i) for i in range(voices)]
+        self.music = MusicChannel()
+        self.call_later = call_later
+        self.on_finished = on_finished
+        self._voices = {}  # key -> Voice
+        self._finished = []  # keys to report once the lock is released
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            self._reap()
+        self._notify()
+        return len(self._voices)
+
+    def _reap(self):
+        # Forget voices whose sound has finished on its own
+        for key in [key for key, voice in self._voices.items() if not voice.busy()]:
+            del self._voices[key]
+            self._finished.append(key)
+
+    def _notify(self):
+        with self._lock:
+            finished, self._finished = self._finished, []
+        if self.on_finished is not None:
+            for key in finished:
+                self.on_finished(key)
+
+    def _free_channel(self, priority, music=False):
+        channels = [self.music] if music else self.channels
+        used = {voice.channel for voice in self._voices.values()}
+        for channel in channels:
+            if channel not in used:
+                return channel
+        victims = [voice for voice in self._voices.values()
+                   if voice.priority <= priority and voice.channel in channels]
+        if not victims:
+            return None
+        victim = min(victims, key=lambda voice: (voice.priority, voice.order))
+        del self._voices[victim.key]
+        victim.silence()
+        self._finished.append(victim.key)
+        if metrics.enabled:
+            metrics.VOICES_STOLEN.inc()
+        return victim.channel
+
+    def play(self, key, sound, volume=1.0, priority=ALARM_PRIORITY, loops=0):
+        # Start sound on its own voice; returns False if no voice could be had.
+        # loops=-1 repeats the sound seamlessly until the voice is stopped.
+        music = isinstance(sound, MusicFile)
+        with self._lock:
+            self._reap()
+            voice = self._voices.pop(key, None)
+            if voice is not None:
+                voice.silence()
+            if voice is not None and (voice.channel is self.music) == music:
+                channel = voice.channel
+            else:
+                channel = self._free_channel(priority, music)
+            if channel is not None:
+                channel.set_volume(volume)
+                player = None
+                if isinstance(sound, SoundStream):
+                    player = sound.play(channel, loops)
+                else:
+                    channel.play(sound, loops=loops)
+                voice = self._voices[key] = Voice(key, channel, priority, next(self._order),
+                                                  player)
+        self._notify()
+        if channel is None:
+            return False
+        if loops >= 0 and self.call_later is not None:
+            length = sound.get_length()
+            self._watch(voice, MUSIC_POLL_SECONDS if length is None else length * (loops + 1))
+        return True
+
+    def _watch(self, voice, delay):
+        self.call_later(delay + END_SLACK_SECONDS, lambda: self._check_finished(voice))
+
+    def _check_finished(self, voice):
+        with self._lock:
+            if self._voices.get(voice.key) is not voice:
+                return  # stopped, stolen or replaced in the meantime
+            if voice.busy():
+                # Output latency can hold the channel a little past its end;
+                # music of unknown length is polled
+                self._watch(voice, MUSIC_POLL_SECONDS if voice.channel is self.music else 0)
+                return
+            del self._voices[voice.key]
+            self._finished.append(voice.key)
+        self._notify()
+
+    def stop(self, key):
+        with self._lock:
+            voice = self._voices.pop(key, None)
+            if voice is not None:
+                voice.silence()
+            return voice is not None
+
+    def stop_all(self):
+        with self._lock:
+            for voice in self._voices.values():
+                voice.silence()
+            self._voices.clear()
+
+    def set_volume(self, key, volume):
+        with self._lock:
+            voice = self._voices.get(key)
+            if voice is not None:
+                voice.channel.set_volume(volume)
+
+    def is_playing(self, key):
+        with self._lock:
+            voice = self._voices.get(key)
+            return voice is not None and voice.busy()
@@ -0,0 +1,186 @@
+import os
+import queue
+import random
+import sqlite3
+import threading
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".pookie_clock", "alarms.db")
+
+# Most changes the writer thread commits in one transaction
+BATCH_SIZE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS alarms (
+    key INTEGER PRIMARY KEY,
+    fire_time INTEGER NOT NULL,
+    snoozed_until INTEGER NOT NULL DEFAULT 0,
+    last_triggered INTEGER NOT NULL DEFAULT 0,
+    sound TEXT,
+    snooze_minutes INTEGER NOT NULL DEFAULT 5,
+    volume INTEGER NOT NULL DEFAULT 100,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    wake_time INTEGER NOT NULL,
+    session INTEGER NOT NULL DEFAULT 0,
+    start_time INTEGER,
+    rule TEXT,
+    zone TEXT
+);
+CREATE INDEX IF NOT EXISTS alarms_wake_time ON alarms (wake_time);
+"""
+
+# Columns added after the first release, as (name, type)
+MIGRATIONS = (
+    ("start_time", "INTEGER"),
+    ("rule", "TEXT"),
+    ("zone", "TEXT"),  # IANA name; NULL is the system's local zone
+)
+
+COLUMNS = ("key, fire_time, snoozed_until, last_triggered, sound, snooze_minutes, volume, "
+           "enabled, start_time, rule, zone")
+
+# Older databases have no rule; those alarms repeated every day
+SELECT_COLUMNS = COLUMNS.replace("start_time, rule",
+                                 "COALESCE(start_time, fire_time), COALESCE(rule, 'FREQ=DAILY')")
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class AlarmDatabase:
+    # Crash-safe alarm storage in SQLite (WAL mode). Every add, remove, fire,
+    # snooze and stop is queued as a single-row change; a background writer
+    # thread drains the queue and commits whatever has piled up in one
+    # transaction, so the GUI thread never waits on the disk.
+    #
+    # Rows record the session (process run) that last loaded or wrote them,
+    # which lets a periodic reload pick up only alarms this run does not hold
+    # yet, such as ones another process added.
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.session = random.getrandbits(62) + 1
+        self._reader = _connect(path)
+        self._reader.executescript(SCHEMA)
+        self._migrate()
+        self._queue = queue.Queue()
+        self._claiming = set()  # keys loaded whose claim is not committed yet
+        self._writer = threading.Thread(target=self._write_loop, name="alarm-db", daemon=True)
+        self._writer.start()
+
+    def _migrate(self):
+        existing = {row[1] for row in self._reader.execute("PRAGMA table_info(alarms)")}
+        with self._reader:
+            for name, kind in MIGRATIONS:
+                if name not in existing:
+                    self._reader.execute(f"ALTER TABLE alarms ADD COLUMN {name} {kind}")
+
+    def attach(self, engine):
+        # Persist every change the engine makes from now on
+        engine.on("added", self.save)
+        engine.on("imported", self.save_many)
+        engine.on("fired", self.save)
+        engine.on("missed", self.save)
+        engine.on("snoozed", self.save)
+        engine.on("stopped", self.save)
+        engine.on("removed", self.delete)
+        engine.next_key = max(engine.next_key, self.max_key() + 1)
+
+    def save(self, alarm):
+        self._queue.put(("save", alarm.store.row(alarm.id)))
+
+    def save_many(self, alarms):
+        if alarms:
+            store = alarms[0].store
+            self._queue.put(("saves", [store.row(alarm.id) for alarm in alarms]))
+
+    def delete(self, alarm):
+        self._queue.put(("delete", alarm.key))
+
+    def max_key(self):
+        return self._reader.execute("SELECT COALESCE(MAX(key), 0) FROM alarms").fetchone()[0]
+
+    def load(self):
+        # Saved alarms not loaded by this run yet, soonest first; they are
+        # claimed for this run as they are read
+        rows = self._reader.execute(
+            f"SELECT {SELECT_COLUMNS} FROM alarms WHERE session != ? ORDER BY wake_time",
+            (self.session,)).fetchall()
+        rows = [row for row in rows if row[0] not in self._claiming]
+        if rows:
+            keys = [row[0] for row in rows]
+            self._claiming.update(keys)
+            self._queue.put(("claim", keys))
+        return rows
+
+    def rows(self):
+        # Every saved alarm, in the order they were added, once all queued
+        # changes have been committed
+        self.flush()
+        return self._reader.execute(f"SELECT {SELECT_COLUMNS} FROM alarms ORDER BY key")
+
+    def load_into(self, engine, until):
+        # Every alarm goes into the engine, so that all of them can be listed
+        # and removed, but only those waking before until are scheduled; the
+        # rest wait for engine.schedule_pending()
+        return engine.restore(self.load(), until=until)
+
+    def flush(self):
+        # Block until every queued change has been committed
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+        self._reader.close()
+
+    def _write_loop(self):
+        conn = _connect(self.path)
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            try:
+                self._apply(conn, [op for op in batch if op is not None])
+            except sqlite3.Error as e:
+                print(f"Error saving alarms: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _apply(self, conn, batch):
+        # Only the last change to each alarm in a batch needs to be written
+        saves, deletes, claims = {}, set(), []
+        for kind, value in batch:
+            if kind == "save":
+                saves[value[0]] = value
+                deletes.discard(value[0])
+            elif kind == "saves":
+                for row in value:
+                    saves[row[0]] = row
+                    deletes.discard(row[0])
+            elif kind == "delete":
+                saves.pop(value, None)
+                deletes.add(value)
+            else:
+                claims.extend(value)
+        with conn:
+            conn.executemany(
+                f"INSERT OR REPLACE INTO alarms ({COLUMNS}, wake_time, session) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [row + (row[2] or row[1], self.session) for row in saves.values()])
+            conn.executemany("DELETE FROM alarms WHERE key = ?", [(key,) for key in deletes])
+            conn.executemany("UPDATE alarms SET session = ? WHERE key = ?",
+                             [(self.session, key) for key in claims])
+        self._claiming.difference_update(claims)
@@ -0,0 +1,314 @@
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+from zones import local_datetime, local_seconds, local_timestamp, offset_table
+
+ONCE = "ONCE"
+MINUTELY = "MINUTELY"
+DAILY = "DAILY"
+WEEKLY = "WEEKLY"
+FREQUENCIES = (ONCE, MINUTELY, DAILY, WEEKLY)
+
+# Weekday bits, Monday first like datetime.weekday()
+DAY_NAMES = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+WEEKDAYS = 0b0011111
+WEEKENDS = 0b1100000
+
+STAMP_FORMAT = "%Y%m%dT%H%M%S"
+
+DAY_SECONDS = 86400
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+def _popcount(mask):
+    return bin(mask).count("1")
+
+
+class RecurrenceRule:
+    # RRULE-style recurrence of a local wall-clock time. Every occurrence is
+    # computed arithmetically from the rule's start, so finding the next one
+    # is O(1) no matter how far ahead it lies and nothing ever iterates
+    # minute by minute.
+    #
+    # The wall clock is that of zone, a zones.ZoneIndex, or the system's
+    # local zone when zone is None; daylight saving days follow the rules in
+    # ZoneIndex. A rule holds no zone itself, so alarms in different zones
+    # share it. All times are epoch seconds. until is inclusive; count limits the number
+    # of occurrences before exdates are taken out, as in RFC 5545.
+    __slots__ = ("freq", "interval", "weekdays", "until", "count", "exdates", "_hash")
+
+    def __init__(self, freq=DAILY, interval=1, weekdays=0, until=None, count=None, exdates=()):
+        if freq not in FREQUENCIES:
+            raise ValueError(f"Unknown recurrence frequency: {freq}")
+        if interval < 1:
+            raise ValueError("Recurrence interval must be at least 1")
+        self.freq = freq
+        self.interval = interval
+        self.weekdays = weekdays
+        self.until = until
+        self.count = count
+        self.exdates = frozenset(exdates)
+        self._hash = hash(self._key())  # rules are used as dict keys per alarm
+
+    def _key(self):
+        return (self.freq, self.interval, self.weekdays, self.until, self.count, self.exdates)
+
+    def __eq__(self, other):
+        return isinstance(other, RecurrenceRule) and other._key() == self._key()
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"RecurrenceRule({str(self)!r})"
+
+    def __str__(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.weekdays:
+            parts.append("BYDAY=" + ",".join(name for i, name in enumerate(DAY_NAMES)
+                                             if self.weekdays >> i & 1))
+        if self.until is not None:
+            parts.append("UNTIL=" + utc_stamp(self.until))
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.exdates:
+            parts.append("EXDATE=" + ",".join(map(utc_stamp, sorted(self.exdates))))
+        return ";".join(parts)
+
+    @classmethod
+    def parse(cls, text):
+        # Inverse of str(rule); also accepts iCalendar RRULE values
+        fields = {}
+        for part in text.strip().split(";"):
+            if part:
+                name, _, value = part.partition("=")
+                fields[name.strip().upper()] = value.strip()
+        weekdays = 0
+        for day in filter(None, fields.get("BYDAY", "").upper().split(",")):
+            if day[-2:] not in DAY_NAMES:
+                raise ValueError(f"Unknown weekday in BYDAY: {day!r}")
+            weekdays |= 1 << DAY_NAMES.index(day[-2:])
+        until = fields.get("UNTIL")
+        exdates = fields.get("EXDATE")
+        return cls(
+            freq=fields.get("FREQ", DAILY).upper(),
+            interval=int(fields.get("INTERVAL", 1)),
+            weekdays=weekdays,
+            until=parse_stamp(until) if until else None,
+            count=int(fields["COUNT"]) if "COUNT" in fields else None,
+            exdates=[parse_stamp(value) for value in exdates.split(",")] if exdates else ())
+
+    def describe(self):
+        if self.freq == ONCE:
+            return "Once"
+        if self.freq == MINUTELY:
+            return f"Every {self.interval} min"
+        if self.freq == DAILY:
+            return "Daily" if self.interval == 1 else f"Every {self.interval} days"
+        if self.weekdays == WEEKDAYS:
+            days = "Weekdays"
+        elif self.weekdays == WEEKENDS:
+            days = "Weekends"
+        else:
+            days = " ".join(name.title() for i, name in enumerate(DAY_NAMES)
+                            if self.weekdays >> i & 1) or "Weekly"
+        return days if self.interval == 1 else f"{days} every {self.interval} weeks"
+
+    def first(self, start, zone=None):
+        return self.next_after(start, start - 1, zone)
+
+    def next_after(self, start, after, zone=None):
+        # First occurrence strictly after `after`, or None once the rule ends
+        when = after
+        while True:
+            when = self._next_raw(start, when, zone)
+            if when is None:
+                return None
+            if self.until is not None and when > self.until:
+                return None
+            if self.count is not None and self._index(start, when, zone) >= self.count:
+                return None
+            if when not in self.exdates:
+                return when
+
+    def occurrences(self, start, window_start, window_end, zone=None):
+        # Every occurrence in [window_start, window_end) in order, as a
+        # read-only numpy array of epoch seconds. The local days a rule falls
+        # on are laid out once per rule and window and shifted to each
+        # alarm's time of day, so alarms with different start times share
+        # the work. Without numpy it is a tuple built one next_after() at a
+        # time, cached per rule, start, window and zone.
+        from store import load_numpy
+        if load_numpy() is None:
+            return _expand(self, start, window_start, window_end, zone)
+        return _expand_array(self, start, window_start, window_end, zone)
+
+    def _next_raw(self, start, after, zone):
+        if after < start and self.freq != WEEKLY:
+            return start
+        if self.freq == ONCE:
+            return None
+        if self.freq == MINUTELY:
+            step = self.interval * 60
+            return start + ((after - start) // step + 1) * step
+
+        # Days are stepped in local time; candidates are compared as instants
+        # so the repeated hour of a fall-back day is not used twice
+        first = local_datetime(start, zone)
+        after = max(after, start - 1)
+        limit = local_datetime(after, zone)
+        if self.freq == DAILY:
+            days = (limit.date() - first.date()).days
+            day = first.date() + timedelta(days=days - days % self.interval)
+            candidate = local_timestamp(datetime.combine(day, first.time()), zone)
+            if candidate <= after:
+                day += timedelta(days=self.interval)
+                candidate = local_timestamp(datetime.combine(day, first.time()), zone)
+            return candidate
+
+        # Weekly: look at the current period of `interval` weeks and the next
+        weekdays = self.weekdays or 1 << first.weekday()
+        first_monday = first.date() - timedelta(days=first.weekday())
+        week = max(0, (limit.date() - first_monday).days // 7)
+        week -= week % self.interval
+        for period in (week, week + self.interval):
+            monday = first_monday + timedelta(weeks=period)
+            for weekday in range(7):
+                if not weekdays >> weekday & 1:
+                    continue
+                day = monday + timedelta(days=weekday)
+                if day < first.date():
+                    continue
+                candidate = local_timestamp(datetime.combine(day, first.time()), zone)
+                if candidate > after:
+                    return candidate
+        return None
+
+    def _index(self, start, when, zone):
+        # Zero-based position of the occurrence `when` in the series
+        if self.freq == ONCE:
+            return 0
+        if self.freq == MINUTELY:
+            return (when - start) // (self.interval * 60)
+        first = local_datetime(start, zone).date()
+        day = local_datetime(when, zone).date()
+        if self.freq == DAILY:
+            return (day - first).days // self.interval
+        weekdays = self.weekdays or 1 << first.weekday()
+        period = ((day - first).days + first.weekday()) // 7 // self.interval
+        before_first = _popcount(weekdays & ((1 << first.weekday()) - 1))
+        before_day = _popcount(weekdays & ((1 << day.weekday()) - 1))
+        return period * _popcount(weekdays) + before_day - before_first
+
+
+def utc_stamp(epoch):
+    # Stamps are written in UTC so they mean the same instant in every zone
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(STAMP_FORMAT) + "Z"
+
+
+def parse_stamp(value):
+    # Local time, or UTC when the stamp ends in Z
+    utc = value.endswith("Z")
+    value = value.rstrip("Z")
+    if "T" not in value:
+        value += "T000000"
+    stamp = datetime.strptime(value, STAMP_FORMAT)
+    if utc:
+        stamp = stamp.replace(tzinfo=timezone.utc)
+    return int(stamp.timestamp())
+
+
+@lru_cache(maxsize=4096)
+def _expand(rule, start, window_start, window_end, zone):
+    times = []
+    when = rule.next_after(start, window_start - 1, zone)
+    while when is not None and when < window_end:
+        times.append(when)
+        when = rule.next_after(start, when, zone)
+    return tuple(times)
+
+
+@lru_cache(maxsize=1024)
+def _days(freq, cycle, weekdays, phase, day_lo, day_hi):
+    # Local day numbers (days since 1970-01-01) in [day_lo, day_hi] that a
+    # daily rule with the given cycle, or a weekly one whose cycle of weeks
+    # starts on Mondays, falls on; phase is the first day (daily) or first
+    # Monday (weekly) of the series modulo cycle
+    import numpy as np
+    if freq == DAILY:
+        days = np.arange(day_lo + (phase - day_lo) % cycle, day_hi + 1, cycle)
+    else:
+        first_monday = day_lo - 6 + (phase - day_lo + 6) % cycle
+        offsets = [weekday for weekday in range(7) if weekdays >> weekday & 1]
+        days = (np.arange(first_monday, day_hi + 1, cycle)[:, None] + offsets).ravel()
+        days = days[(days >= day_lo) & (days <= day_hi)]
+    days.flags.writeable = False
+    return days
+
+
+@lru_cache(maxsize=256)
+def _window_days(zone, window_start, window_end):
+    # Local day numbers that can hold an occurrence in the window, with a
+    # day to spare either side for the zone's offset
+    return (local_seconds(window_start, zone) // DAY_SECONDS - 1,
+            local_seconds(window_end, zone) // DAY_SECONDS + 1)
+
+
+def _expand_array(rule, start, window_start, window_end, zone):
+    import numpy as np
+    if rule.freq == ONCE:
+        times = np.array(_expand(rule, start, window_start, window_end, zone), dtype=np.int64)
+    elif rule.freq == MINUTELY:
+        step = rule.interval * 60
+        first = max(0, -(-(window_start - start) // step))
+        last = -(-(window_end - start) // step)
+        if rule.count is not None:
+            last = min(last, rule.count)
+        times = start + np.arange(first, max(first, last), dtype=np.int64) * step
+    else:
+        first_day, time_of_day = divmod(local_seconds(start, zone), DAY_SECONDS)
+        window_lo, window_hi = _window_days(zone, window_start, window_end)
+        weekday = (first_day + EPOCH_WEEKDAY) % 7
+        weekdays = 0
+        if rule.freq == DAILY:
+            cycle, anchor = rule.interval, first_day
+        else:
+            weekdays = rule.weekdays or 1 << weekday
+            cycle, anchor = 7 * rule.interval, first_day - weekday
+        days = _days(rule.freq, cycle, weekdays, anchor % cycle, max(first_day, window_lo),
+                     window_hi)
+        if rule.count is not None:
+            # Position in the series, as in RecurrenceRule._index()
+            if rule.freq == DAILY:
+                index = (days - first_day) // rule.interval
+            else:
+                before = np.array([_popcount(weekdays & ((1 << day) - 1)) for day in range(7)])
+                index = ((days - anchor) // cycle * _popcount(weekdays)
+                         + before[(days - anchor) % 7] - before[weekday])
+            days = days[index < rule.count]
+        bounds, offsets = offset_table(zone, (window_lo - 1) * DAY_SECONDS,
+                                       (window_hi + 2) * DAY_SECONDS)
+        times = days * DAY_SECONDS + (time_of_day - offsets[0])
+        # Later offsets apply from the first time whose local reading is at
+        # or past their bound
+        if bounds:
+            changes = times.searchsorted([bound - offsets[0] for bound in bounds])
+            for change, before, after in zip(changes, offsets, offsets[1:]):
+                times[change:] += before - after
+        if rule.freq == DAILY and days.size and days[0] == first_day:
+            times[0] = start  # a start in a repeated hour may be its second reading
+    # times are in order, so the window and until only trim the ends
+    last = times.searchsorted(window_end)
+    if rule.until is not None:
+        last = min(last, times.searchsorted(rule.until, side="right"))
+    times = times[times.searchsorted(max(start, window_start)):last]
+    if rule.exdates:
+        times = times[~np.isin(times, list(rule.exdates))]
+    times.flags.writeable = False
+    return times
+
+
+DAILY_RULE = RecurrenceRule(DAILY)
+ONCE_RULE = RecurrenceRule(ONCE)
@@ -0,0 +1,321 @@
+import heapq
+import time
+from array import array
+
+# Heap entries pack the fire time and the alarm id into one int
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+
+
+class AlarmScheduler:
+    # Min-heap of alarm ids keyed by their next fire time in epoch seconds.
+    # Each heap entry is a single packed int and the live deadline of every
+    # id is kept in a flat array, so cancelled or rescheduled entries are
+    # recognised as stale and dropped lazily when they reach the top.
+    def __init__(self):
+        self._heap = []
+        self._deadlines = array("q")  # 0 = not scheduled
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, alarm_id):
+        return alarm_id < len(self._deadlines) and self._deadlines[alarm_id] != 0
+
+    def schedule(self, alarm_id, when):
+        # Re-scheduling an alarm replaces its previous deadline
+        deadlines = self._deadlines
+        if alarm_id >= len(deadlines):
+            deadlines.frombytes(bytes(deadlines.itemsize * (alarm_id + 1 - len(deadlines))))
+        if deadlines[alarm_id] == 0:
+            self._count += 1
+        deadlines[alarm_id] = when
+        heapq.heappush(self._heap, when << ID_BITS | alarm_id)
+        self._maybe_compact()
+
+    def schedule_many(self, entries):
+        # Bulk schedule of (alarm_id, when) pairs; one heapify instead of a
+        # push per entry when the batch is large next to the heap
+        deadlines, heap = self._deadlines, self._heap
+        keys = []
+        for alarm_id, when in entries:
+            if alarm_id >= len(deadlines):
+                deadlines.frombytes(bytes(deadlines.itemsize * (alarm_id + 1 - len(deadlines))))
+            if deadlines[alarm_id] == 0:
+                self._count += 1
+            deadlines[alarm_id] = when
+            keys.append(when << ID_BITS | alarm_id)
+        if len(keys) > len(heap) // 8:
+            heap.extend(keys)
+            heapq.heapify(heap)
+        else:
+            for key in keys:
+                heapq.heappush(heap, key)
+        self._maybe_compact()
+
+    def cancel(self, alarm_id):
+        if alarm_id in self:
+            self._deadlines[alarm_id] = 0
+            self._count -= 1
+            self._maybe_compact()
+
+    def clear(self):
+        self._heap.clear()
+        self._deadlines = array("q")
+        self._count = 0
+
+    def _maybe_compact(self):
+        # Rebuild the heap once stale entries outnumber live ones
+        if len(self._heap) > 2 * self._count + 64:
+            self._heap = [when << ID_BITS | alarm_id
+                          for alarm_id, when in enumerate(self._deadlines) if when]
+            heapq.heapify(self._heap)
+
+    def next_deadline(self):
+        heap, deadlines = self._heap, self._deadlines
+        while heap:
+            key = heap[0]
+            when = key >> ID_BITS
+            if deadlines[key & ID_MASK] == when:
+                return when
+            heapq.heappop(heap)
+        return None
+
+    def pop_due(self, now):
+        # Remove and return the ids of every alarm due at or before now
+        due = []
+        heap, deadlines = self._heap, self._deadlines
+        limit = (int(now) + 1) << ID_BITS
+        while heap and heap[0] < limit:
+            key = heapq.heappop(heap)
+            alarm_id = key & ID_MASK
+            if deadlines[alarm_id] == key >> ID_BITS:
+                deadlines[alarm_id] = 0
+                self._count -= 1
+                due.append(alarm_id)
+        return due
+
+
+class BatchScheduler:
+    # Alternative to AlarmScheduler for bulk deployments. Instead of keeping
+    # a heap it evaluates the store's columns with one vectorized comparison
+    # per tick. The cached earliest deadline may be early after a reschedule,
+    # which only costs a spurious wakeup before it is recomputed. Ids in
+    # held (the engine's pending set, alarms restored outside the scheduling
+    # window) are skipped, as if they had never been scheduled.
+    def __init__(self, store, held=()):
+        self.store = store
+        self.held = held
+        self._next = None
+        self._dirty = True
+
+    def __len__(self):
+        return len(self.store)
+
+    def schedule(self, alarm_id, when):
+        if not self._dirty and (self._next is None or when < self._next):
+            self._next = when
+
+    def schedule_many(self, entries):
+        for alarm_id, when in entries:
+            self.schedule(alarm_id, when)
+
+    def cancel(self, alarm_id):
+        self._dirty = True
+
+    def clear(self):
+        self._dirty = True
+
+    def next_deadline(self):
+        if self._dirty:
+            self._next = self.store.next_wake(self.held)
+            self._dirty = False
+        return self._next
+
+    def pop_due(self, now):
+        self._dirty = True
+        return self.store.elapsed_ids(now, self.held)
+
+
+# Levels of the timing wheel as (seconds per slot, slots)
+WHEEL_LEVELS = ((1, 60), (60, 60), (3600, 24), (86400, 64))
+
+# A pop_due() that is this far behind the wheel's clock (after a suspend,
+# or on first use) rebuilds the wheel instead of stepping through every
+# second in between
+WHEEL_MAX_STEP_SECONDS = 3600
+
+
+class TimingWheelScheduler:
+    # Hierarchical timing wheel with second, minute, hour and day levels, for
+    # heavy churn such as thousands of alarms being snoozed at once. Entries
+    # are the same packed ints as AlarmScheduler's heap. schedule() appends
+    # to one slot and cancel() only clears the deadline, both O(1); stale
+    # entries are dropped when their slot comes round. As the clock reaches
+    # the start of a minute, hour or day, that slot of the level above is
+    # cascaded down. Deadlines beyond the day level wait in an overflow list
+    # that is sorted back in whenever the day level wraps.
+    def __init__(self, now=None):
+        self._cursor = int(time.time() if now is None else now)  # last second processed
+        self._set_wheels([[[] for _ in range(slots)] for _, slots in WHEEL_LEVELS])
+        self._overflow = []
+        self._expired = []  # scheduled at or before the cursor
+        self._deadlines = array("q")  # 0 = not scheduled
+        self._count = 0
+        self._entries = 0
+        self._next = None  # cached earliest deadline, None when unknown
+        self._next_known = True
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, alarm_id):
+        return alarm_id < len(self._deadlines) and self._deadlines[alarm_id] != 0
+
+    def _set_wheels(self, wheels):
+        self._wheels = wheels
+        self._levels = [(wheel, unit, slots) for wheel, (unit, slots) in zip(wheels, WHEEL_LEVELS)]
+
+    def _insert(self, key):
+        when = key >> ID_BITS
+        cursor = self._cursor
+        if when <= cursor:
+            self._expired.append(key)
+            return
+        for wheel, unit, slots in self._levels:
+            tick = when // unit
+            if tick < cursor // unit + slots:
+                wheel[tick % slots].append(key)
+                return
+        self._overflow.append(key)
+
+    def schedule(self, alarm_id, when):
+        deadlines = self._deadlines
+        if alarm_id >= len(deadlines):
+            deadlines.frombytes(bytes(deadlines.itemsize * (alarm_id + 1 - len(deadlines))))
+        previous = deadlines[alarm_id]
+        if previous == 0:
+            self._count += 1
+        elif previous == self._next:
+            self._next_known = False
+        deadlines[alarm_id] = when
+        self._insert(when << ID_BITS | alarm_id)
+        self._entries += 1
+        if self._next_known and (self._next is None or when < self._next):
+            self._next = when
+        self._maybe_compact()
+
+    def schedule_many(self, entries):
+        for alarm_id, when in entries:
+            self.schedule(alarm_id, when)
+
+    def cancel(self, alarm_id):
+        if alarm_id in self:
+            if self._deadlines[alarm_id] == self._next:
+                self._next_known = False
+            self._deadlines[alarm_id] = 0
+            self._count -= 1
+            self._maybe_compact()
+
+    def clear(self):
+        self._set_wheels([[[] for _ in range(slots)] for _, slots in WHEEL_LEVELS])
+        self._overflow = []
+        self._expired = []
+        self._deadlines = array("q")
+        self._count = self._entries = 0
+        self._next, self._next_known = None, True
+
+    def _live(self, keys):
+        deadlines = self._deadlines
+        return [key for key in keys if deadlines[key & ID_MASK] == key >> ID_BITS]
+
+    def _rebuild(self, cursor):
+        # Re-insert every live entry relative to a new cursor
+        self._cursor = cursor
+        keys = [when << ID_BITS | alarm_id for alarm_id, when in enumerate(self._deadlines) if when]
+        self._set_wheels([[[] for _ in range(slots)] for _, slots in WHEEL_LEVELS])
+        self._overflow = []
+        self._expired = []
+        for key in keys:
+            self._insert(key)
+        self._entries = len(keys)
+
+    def _maybe_compact(self):
+        if self._entries > 2 * self._count + 64:
+            self._rebuild(self._cursor)
+
+    def _cascade(self, cursor):
+        # Move the slots that start at cursor down a level, highest first
+        wheels = self._wheels
+        for level in range(len(WHEEL_LEVELS) - 1, 0, -1):
+            unit, slots = WHEEL_LEVELS[level]
+            if cursor % unit:
+                continue
+            if level == len(WHEEL_LEVELS) - 1 and cursor // unit % slots == 0:
+                keys, self._overflow = self._overflow, []
+                self._reinsert(keys)
+            index = cursor // unit % slots
+            keys, wheels[level][index] = wheels[level][index], []
+            self._reinsert(keys)
+
+    def _reinsert(self, keys):
+        live = self._live(keys)
+        self._entries -= len(keys) - len(live)
+        for key in live:
+            self._insert(key)
+
+    def next_deadline(self):
+        if not self._next_known:
+            self._next = self._earliest()
+            self._next_known = True
+        return self._next
+
+    def _earliest(self):
+        # Earliest live deadline. Each level is searched from the cursor on
+        # and its first slot holding a live entry settles that level; the
+        # levels can overlap, so the answer is the smallest of them.
+        live = self._live(self._expired)
+        if live:
+            return min(key >> ID_BITS for key in live)
+        candidates = [key >> ID_BITS for key in self._live(self._overflow)]
+        cursor = self._cursor
+        for level, (unit, slots) in enumerate(WHEEL_LEVELS):
+            wheel = self._wheels[level]
+            first = cursor // unit
+            for offset in range(slots):
+                live = self._live(wheel[(first + offset) % slots])
+                if live:
+                    candidates.append(min(live) >> ID_BITS)
+                    break
+        return min(candidates) if candidates else None
+
+    def pop_due(self, now):
+        # Remove and return the ids of every alarm due at or before now
+        now = int(now)
+        if now - self._cursor > WHEEL_MAX_STEP_SECONDS:
+            self._rebuild(now)
+        due_keys = self._expired
+        self._expired = []
+        level0 = self._wheels[0]
+        _, slots = WHEEL_LEVELS[0]
+        while self._cursor < now:
+            self._cursor += 1
+            self._cascade(self._cursor)
+            index = self._cursor % slots
+            due_keys += level0[index]
+            level0[index] = []
+        due_keys += self._expired  # cascaded entries that were already due
+        self._expired = []
+        due = []
+        deadlines = self._deadlines
+        for key in due_keys:
+            alarm_id = key & ID_MASK
+            if deadlines[alarm_id] == key >> ID_BITS:
+                deadlines[alarm_id] = 0
+                self._count -= 1
+                due.append(alarm_id)
+        self._entries -= len(due_keys)
+        if due:
+            self._next_known = False
+        return due
@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from engine import CATCH_UP_POLICIES, EVENTS, FIRE_LATE, AlarmEngine
+from persistence import DEFAULT_PATH, AlarmDatabase
+from recurrence import RecurrenceRule
+from store import check_fields
+
+DEFAULT_SOCKET = os.path.join(os.path.expanduser("~"), ".pookie_clock", "alarms.sock")
+
+# Fields of an alarm on the wire: AlarmStore.row() plus two flags
+ROW_FIELDS = ("key", "fire_time", "snoozed_until", "last_triggered", "sound", "snooze", "volume",
+              "enabled", "start_time", "rule", "zone")
+
+# Events a client may subscribe to. Alarms the server loads from its
+# database are announced as "imported"; fired alarms are sent one by one.
+SUBSCRIBABLE = tuple(event for event in EVENTS if event not in ("fired_batch", "rescheduled"))
+
+# A subscriber whose unsent notifications grow past this is too slow to keep
+# up and is disconnected, so it cannot make the server buffer without bound
+MAX_SUBSCRIBER_BUFFER = 1024 * 1024
+
+# Longest request line accepted from a client
+MAX_REQUEST_BYTES = 16 * 1024 * 1024
+
+# Saved alarms are all loaded, but scheduled only this far ahead, once per
+# interval
+LOAD_WINDOW = timedelta(hours=48)
+LOAD_INTERVAL_SECONDS = 3600
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# Fields of an alarm sent to add and add_many
+ALARM_PARAMS = ("time", "sound", "snooze", "enabled", "volume", "rule", "zone")
+
+# What a bad parameter can raise inside a method
+PARAM_ERRORS = (TypeError, ValueError, KeyError, OverflowError)
+
+
+def alarm_record(alarm):
+    record = dict(zip(ROW_FIELDS, alarm.store.row(alarm.id)))
+    record["playing"] = alarm.is_playing
+    record["expired"] = alarm.expired
+    return record
+
+
+def _whole(fields, name, default):
+    value = fields.get(name, default)
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a whole number, not {value!r}")
+    try:
+        return int(value)
+    except (TypeError, ValueError, OverflowError):
+        raise ValueError(f"{name} must be a whole number, not {value!r}") from None
+
+
+def _text(fields, name, default=None):
+    value = fields.get(name, default)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f"{name} must be a string, not {value!r}")
+    return value
+
+
+def alarm_fields(fields, rules):
+    # (start_time, sound, snooze, enabled, volume, rule, zone) from the params
+    # of add or one alarm of add_many, checked before the engine sees them.
+    # rules caches parsed rules by their text.
+    unknown = set(fields) - set(ALARM_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown alarm fields: {', '.join(sorted(unknown))}")
+    record = (_whole(fields, "time", None), _text(fields, "sound"), _whole(fields, "snooze", 5),
+              bool(fields.get("enabled", True)), _whole(fields, "volume", 100),
+              _text(fields, "rule", "FREQ=DAILY") or "FREQ=DAILY", _text(fields, "zone"))
+    check_fields(record[0], record[2], record[4])
+    rule = record[5]
+    if rule not in rules:
+        rules[rule] = RecurrenceRule.parse(rule)
+    return record[:5] + (rules[rule],) + record[6:]
+
+
+def encode(message):
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+
+class AlarmServer:
+    # One process owns the alarms: the engine, the database and the audio
+    # output. Clients (the Qt window, scripts) talk to it over a Unix socket
+    # with newline-delimited JSON-RPC 2.0:
+    #
+    #   {"jsonrpc": "2.0", "id": 1, "method": "add", "params": {"time": 1767250800}}
+    #
+    # Methods: add, add_many, list, get, remove, snooze, stop, subscribe,
+    # unsubscribe, ping. Alarms are addressed by their persistent key.
+    # After subscribe the connection also receives notifications
+    #
+    #   {"jsonrpc": "2.0", "method": "event", "params": {"event": "fired", "time": ...,
+    #    "alarm": {...}}}
+    #
+    # ("imported" carries "alarms", a list). Each notification is encoded
+    # once and written to every subscriber without waiting, so thousands of
+    # subscribers cost one buffer append each per event.
+    def __init__(self, engine, database=None, audio=True):
+        self.engine = engine
+        self.database = database
+        self.audio = audio
+        self.sound_bank = None
+        self.mixer = None
+        self.ids = {}  # persistent key -> alarm id
+        self.subscribers = {}  # StreamWriter -> set of events
+        self.server = None
+        for event in SUBSCRIBABLE:
+            if event != "imported":
+                engine.on(event, lambda alarm, event=event: self._on_event(event, alarm))
+        engine.on("imported", self._on_imported)
+
+    def init_audio(self):
+        import pygame
+        from mixer import AlarmMixer
+        from soundbank import BUILTIN_SOUNDS, SoundBank
+        from transcode import DEFAULT_DIRECTORY, SoundCache
+        loop = asyncio.get_running_loop()
+        pygame.mixer.init()
+        cache = SoundCache(os.environ.get("ALARM_CLOCK_SOUND_CACHE", DEFAULT_DIRECTORY))
+        self.sound_bank = SoundBank(cache=cache)
+        self.mixer = AlarmMixer(call_later=loop.call_later)
+        self.sound_bank.warm(BUILTIN_SOUNDS)
+
+    def _on_event(self, event, alarm):
+        if event == "added":
+            self.ids[alarm.key] = alarm.id
+            self._prepare([alarm.sound])
+        elif event == "removed":
+            self.ids.pop(alarm.key, None)
+        if self.mixer is not None:
+            if event == "fired":
+                self._play(alarm)
+            else:
+                self.mixer.stop(alarm.id)
+        self.publish(event, alarm=alarm_record(alarm))
+
+    def _on_imported(self, alarms):
+        for alarm in alarms:
+            self.ids[alarm.key] = alarm.id
+        self._prepare({alarm.sound for alarm in alarms})
+        self.publish("imported", alarms=[alarm_record(alarm) for alarm in alarms])
+
+    def _prepare(self, sounds):
+        # Convert sounds to the mixer's format ahead of their alarms firing
+        if self.sound_bank is not None:
+            self.sound_bank.warm(filter(None, sounds))
+
+    def _play(self, alarm):
+        from mixer import ALARM_PRIORITY
+        if alarm.sound is None:
+            return
+        try:
+            sound = self.sound_bank.get(alarm.sound)
+        except Exception as e:
+            _report(f"Error playing sound: {e}")
+            return
+        self.mixer.play(alarm.id, sound, alarm.volume / 100, ALARM_PRIORITY, loops=-1)
+
+    def publish(self, event, **params):
+        subscribers = [writer for writer, events in self.subscribers.items() if event in events]
+        if not subscribers:
+            return
+        data = encode({"jsonrpc": "2.0", "method": "event",
+                       "params": {"event": event, "time": time.time(), **params}})
+        for writer in subscribers:
+            if writer.transport.get_write_buffer_size() > MAX_SUBSCRIBER_BUFFER:
+                _report("Dropping a subscriber that stopped reading")
+                del self.subscribers[writer]
+                writer.transport.abort()
+            else:
+                writer.write(data)
+
+    def load(self):
+        # Bring in saved alarms this server does not hold yet and schedule
+        # the ones that are now due soon
+        until = datetime.now() + LOAD_WINDOW
+        due_soon = self.engine.schedule_pending(until)
+        alarms = self.database.load_into(self.engine, until)
+        self._prepare({alarm.sound for alarm in due_soon})
+        if alarms:
+            self._on_imported(alarms)
+
+    async def _load_periodically(self):
+        while True:
+            await asyncio.sleep(LOAD_INTERVAL_SECONDS)
+            self.load()
+
+    async def serve(self, path=DEFAULT_SOCKET):
+        if self.audio:
+            try:
+                self.init_audio()
+            except (ImportError, RuntimeError) as e:
+                _report(f"Audio unavailable, alarms will ring silently: {e}")
+        if self.database is not None:
+            self.load()
+            self.database.attach(self.engine)
+        _claim_socket(path)
+        self.server = await asyncio.start_unix_server(self._client, path, limit=MAX_REQUEST_BYTES)
+        os.chmod(path, 0o600)
+        tasks = [asyncio.ensure_future(self.engine.run())]
+        if self.database is not None:
+            tasks.append(asyncio.ensure_future(self._load_periodically()))
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if os.path.exists(path):
+                os.unlink(path)
+            if self.mixer is not None:
+                self.mixer.stop_all()
+                self.sound_bank.shutdown()
+
+    async def _client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = self.handle(line, writer)
+                if response is not None:
+                    writer.write(response)
+                    await writer.drain()
+        except (OSError, ValueError):
+            pass  # disconnected, or sent a line longer than MAX_REQUEST_BYTES
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+    def handle(self, line, writer=None):
+        # Response bytes for one request line, or None for a notification
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return encode(_error(None, PARSE_ERROR, "Parse error"))
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return encode(_error(None, INVALID_REQUEST, "Invalid request"))
+        request_id = request.get("id")
+        params = request.get("params", {})
+        handler = getattr(self, "rpc_" + request["method"], None)
+        if handler is None:
+            response = _error(request_id, METHOD_NOT_FOUND, f"No method {request['method']!r}")
+        elif not isinstance(params, dict):
+            response = _error(request_id, INVALID_PARAMS, "Params must be an object")
+        else:
+            try:
+                response = {"jsonrpc": "2.0", "id": request_id, "result": handler(writer, **params)}
+            except PARAM_ERRORS as e:
+                response = _error(request_id, INVALID_PARAMS, str(e))
+            except OSError as e:
+                response = _error(request_id, INTERNAL_ERROR, f"Internal error: {e}")
+        return None if "id" not in request else encode(response)
+
+    def _id(self, key):
+        alarm_id = self.ids.get(key)
+        if alarm_id is None or alarm_id not in self.engine.store:
+            raise ValueError(f"No alarm with key {key}")
+        return alarm_id
+
+    def rpc_ping(self, writer):
+        return time.time()
+
+    def rpc_add(self, writer, **fields):
+        # time is in epoch seconds
+        start, sound, snooze, enabled, volume, rule, zone = alarm_fields(fields, {})
+        alarm = self.engine.add(datetime.fromtimestamp(start, timezone.utc), sound, snooze,
+                                enabled, volume, rule, zone)
+        return alarm_record(alarm)
+
+    def rpc_add_many(self, writer, alarms):
+        # Every alarm is checked before any is added
+        if not isinstance(alarms, list) or not all(isinstance(fields, dict) for fields in alarms):
+            raise ValueError("alarms must be a list of objects")
+        rules = {}
+        records = [alarm_fields(fields, rules) for fields in alarms]
+        return [alarm_record(alarm) for alarm in self.engine.add_many(records)]
+
+    def rpc_list(self, writer):
+        return [alarm_record(alarm) for alarm in self.engine]
+
+    def rpc_get(self, writer, key):
+        return alarm_record(self.engine.get(self._id(key)))
+
+    def rpc_remove(self, writer, key):
+        return self.engine.remove(self._id(key))
+
+    def rpc_snooze(self, writer, key):
+        alarm_id = self._id(key)
+        if not self.engine.snooze(alarm_id):
+            return None
+        return alarm_record(self.engine.get(alarm_id))
+
+    def rpc_stop(self, writer, key):
+        alarm_id = self._id(key)
+        self.engine.stop(alarm_id)
+        return alarm_record(self.engine.get(alarm_id))
+
+    def rpc_subscribe(self, writer, events=SUBSCRIBABLE):
+        unknown = set(events) - set(SUBSCRIBABLE)
+        if unknown:
+            raise ValueError(f"Unknown events: {', '.join(sorted(unknown))}")
+        self.subscribers.setdefault(writer, set()).update(events)
+        return sorted(self.subscribers[writer])
+
+    def rpc_unsubscribe(self, writer):
+        return self.subscribers.pop(writer, None) is not None
+
+
+def _report(message):
+    # Problems the server works around; stdout is left to the startup line
+    print(message, file=sys.stderr, flush=True)
+
+
+def _error(request_id, code, message):
+    return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+
+def _claim_socket(path):
+    # Remove a socket file left behind by a server that died, but refuse to
+    # start next to one that is still running
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise OSError(f"An alarm server is already listening on {path}")
+    finally:
+        probe.close()
+
+
+def _raise_file_limit():
+    # Every client holds a socket; allow as many as the hard limit permits
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main(argv):
+    # python server.py [--socket PATH] [--db PATH | --memory] [--no-audio] [--wheel | --batch]
+    parser = argparse.ArgumentParser(description="Alarm server")
+    parser.add_argument("--socket", default=os.environ.get("ALARM_CLOCK_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--db", default=os.environ.get("ALARM_CLOCK_DB", DEFAULT_PATH))
+    parser.add_argument("--memory", action="store_true", help="keep alarms in memory only")
+    parser.add_argument("--no-audio", action="store_true", help="ring silently")
+    parser.add_argument("--catch-up", default=os.environ.get("ALARM_CLOCK_CATCH_UP", FIRE_LATE))
+    schedulers = parser.add_mutually_exclusive_group()
+    schedulers.add_argument("--wheel", action="store_true",
+                            help="timing-wheel scheduler, for heavy snooze and cancel churn")
+    schedulers.add_argument("--batch", action="store_true",
+                            help="vectorized scan of every alarm per tick, for very many alarms")
+    args = parser.parse_args(argv)
+    if args.catch_up not in CATCH_UP_POLICIES:
+        parser.error(f"unknown catch-up policy: {args.catch_up}")
+
+    _raise_file_limit()
+    database = None if args.memory else AlarmDatabase(args.db)
+    engine = AlarmEngine(catch_up=args.catch_up, wheel=args.wheel, batch=args.batch)
+    server = AlarmServer(engine, database, audio=not args.no_audio)
+    print(f"Serving alarms on {args.socket}", flush=True)
+    try:
+        asyncio.run(server.serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if database is not None:
+            database.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,329 @@
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from multiprocessing.connection import wait
+
+from engine import FIRE_LATE, MAX_WAIT_SECONDS, AlarmEngine, epoch_of
+from recurrence import DAILY_RULE, RecurrenceRule
+from store import PLAYING
+
+# Alarms are spread over this many buckets by key (key % BUCKETS) and each
+# bucket belongs to one shard. Rebalancing moves whole buckets, so adding a
+# shard to n moves about 1/(n+1) of the alarms and the rest stay put.
+BUCKETS = 4096
+
+# Most fired alarms a shard sends back in one message
+FIRED_BATCH = 10000
+
+# How often the dispatcher looks for new or removed shards, in seconds
+DISPATCH_POLL_SECONDS = 0.1
+
+
+def _run_shard(commands, events, catch_up):
+    # Body of one shard worker. It owns an AlarmEngine for its part of the
+    # alarms, sleeps until the next deadline or command, and sends the rows
+    # of fired alarms (AlarmStore.row()) back on events as ("fired", rows).
+    # Commands are (name, *args) tuples; replies are sent on events too.
+    engine = AlarmEngine(catch_up=catch_up)
+    store = engine.store
+    ids = {}  # persistent key -> alarm id
+    rules = {}  # rule text -> RecurrenceRule; rules cross the pipe as text
+
+    def rule_of(text):
+        if text not in rules:
+            rules[text] = RecurrenceRule.parse(text)
+        return rules[text]
+
+    while True:
+        deadline = engine.scheduler.next_deadline()
+        timeout = MAX_WAIT_SECONDS
+        if deadline is not None:
+            timeout = min(max(0.0, deadline - time.time()), MAX_WAIT_SECONDS)
+        if commands.poll(timeout):
+            command, *args = commands.recv()
+            if command == "add":
+                records, keys = args
+                alarms = engine.add_many(((start, sound, snooze, enabled, volume, rule_of(rule),
+                                           zone)
+                                          for start, sound, snooze, enabled, volume, rule, zone
+                                          in records), keys)
+                ids.update((alarm.key, alarm.id) for alarm in alarms)
+            elif command == "restore":
+                rows, playing = args
+                ids.update((alarm.key, alarm.id) for alarm in engine.restore(rows))
+                for key in playing:
+                    store.flags[ids[key]] |= PLAYING  # still ringing, so it can be snoozed
+            elif command == "take":
+                # Hand over every alarm in the given buckets (rebalancing),
+                # with the keys of those that are ringing
+                buckets = args[0]
+                keys = [key for key in ids if key % BUCKETS in buckets]
+                rows = [store.row(ids[key]) for key in keys]
+                playing = [key for key in keys if store.flags[ids[key]] & PLAYING]
+                for key in keys:
+                    engine.remove(ids.pop(key))
+                events.send(("taken", (rows, playing)))
+            elif command in ("remove", "snooze", "stop"):
+                alarm_id = ids.get(args[0])
+                if alarm_id is not None:
+                    getattr(engine, command)(alarm_id)
+                    if command == "remove":
+                        del ids[args[0]]
+            elif command == "count":
+                events.send(("count", len(engine)))
+            elif command == "row":
+                alarm_id = ids.get(args[0])
+                events.send(("row", None if alarm_id is None else store.row(alarm_id)))
+            elif command == "close":
+                return len(engine)
+        fired = engine.tick()
+        for i in range(0, len(fired), FIRED_BATCH):
+            events.send(("fired", [store.row(alarm.id) for alarm in fired[i:i + FIRED_BATCH]]))
+
+
+class Shard:
+    __slots__ = ("commands", "events", "future", "replies", "requesting", "closed", "_lock")
+
+    def __init__(self, pool, catch_up):
+        commands, self.commands = multiprocessing.Pipe(duplex=False)
+        self.events, events = multiprocessing.Pipe(duplex=False)
+        self.future = pool.submit(_run_shard, commands, events, catch_up)
+        self.replies = queue.Queue()  # every message that is not "fired"
+        # One request waits for a reply at a time, so replies reach their callers
+        self.requesting = threading.Lock()
+        self.closed = False
+        self._lock = threading.Lock()  # on_fired may send from the dispatcher
+
+    def send(self, *command):
+        with self._lock:
+            self.commands.send(command)
+
+    def request(self, *command):
+        # The reply to command, or None once the shard is closed
+        with self.requesting:
+            if self.closed:
+                return None
+            self.send(*command)
+            return self.replies.get()[1]
+
+    def close(self):
+        with self.requesting:
+            self.closed = True
+            self.send("close")
+
+
+class ShardedScheduler:
+    # Alarm scheduling split over worker processes, for alarm counts one
+    # Python thread cannot keep up with. Each shard is a long-running task
+    # on a ProcessPoolExecutor that owns an engine for the alarms in its
+    # buckets. Fired alarms come back over pipes to a single dispatcher
+    # thread, which calls on_fired(rows) with AlarmStore.row() tuples; this
+    # takes the place of the window's trigger_alarm.
+    #
+    # Alarms are addressed by the persistent keys add_many() returns.
+    # add_shard() and remove_shard() rebalance buckets while running;
+    # commands for alarms in a bucket that is being moved are held back and
+    # replayed on the new owner once it has the alarms.
+    def __init__(self, shards=None, on_fired=None, max_shards=None, catch_up=FIRE_LATE):
+        shards = shards or os.cpu_count() or 1
+        self.max_shards = max(max_shards or os.cpu_count() or 1, shards)
+        self.on_fired = on_fired
+        self.catch_up = catch_up
+        self.pool = ProcessPoolExecutor(max_workers=self.max_shards)
+        self.shards = [Shard(self.pool, catch_up) for _ in range(shards)]
+        self.owner = [self.shards[bucket % shards] for bucket in range(BUCKETS)]
+        self.next_key = 1
+        self._held = {}  # bucket being moved -> commands waiting for it
+        self._lock = threading.Lock()  # guards owner and _held, and orders sends
+        self._moved = threading.Condition(self._lock)  # notified as buckets land
+        self._running = True
+        self._dispatcher = threading.Thread(target=self._dispatch, name="shard-dispatch",
+                                            daemon=True)
+        self._dispatcher.start()
+
+    def __len__(self):
+        # A shard removed meanwhile has handed its alarms on and counts none
+        return sum(shard.request("count") or 0 for shard in list(self.shards))
+
+    def _dispatch(self):
+        while self._running:
+            shards = {shard.events: shard for shard in self.shards}
+            for conn in wait(list(shards), DISPATCH_POLL_SECONDS):
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    continue  # the shard was removed
+                if message[0] == "fired":
+                    if self.on_fired is not None:
+                        self.on_fired(message[1])
+                else:
+                    shards[conn].replies.put(message)
+
+    def add(self, time, sound, snooze_duration=5, enabled=True, volume=100, rule=DAILY_RULE,
+            zone=None):
+        return self.add_many([(epoch_of(time, zone), sound, snooze_duration, enabled, volume,
+                               rule, zone)])[0]
+
+    def add_many(self, records):
+        # Same records as AlarmEngine.add_many(); returns the new keys
+        batches = {}
+        rules = {}
+        keys = []
+        with self._lock:
+            for start, sound, snooze, enabled, volume, rule, zone in records:
+                key, self.next_key = self.next_key, self.next_key + 1
+                if rule not in rules:
+                    rules[rule] = str(rule)
+                batch = batches.setdefault(self.owner[key % BUCKETS], ([], []))
+                batch[0].append((start, sound, snooze, enabled, volume, rules[rule], zone))
+                batch[1].append(key)
+                keys.append(key)
+            # New alarms go straight to the new owner of a moving bucket;
+            # the alarms restored there later have other keys
+            for shard, (shard_records, shard_keys) in batches.items():
+                shard.send("add", shard_records, shard_keys)
+        return keys
+
+    def _send(self, command, key):
+        bucket = key % BUCKETS
+        with self._lock:
+            held = self._held.get(bucket)
+            if held is not None:
+                held.append((command, key))
+            else:
+                self.owner[bucket].send(command, key)
+
+    def remove(self, key):
+        self._send("remove", key)
+
+    def snooze(self, key):
+        self._send("snooze", key)
+
+    def stop(self, key):
+        self._send("stop", key)
+
+    def row(self, key):
+        # AlarmStore.row() of the alarm with this key, or None if there is
+        # none; waits for its bucket if that is being moved
+        bucket = key % BUCKETS
+        while True:
+            with self._lock:
+                self._moved.wait_for(lambda: bucket not in self._held)
+                shard = self.owner[bucket]
+            with shard.requesting:
+                with self._lock:
+                    # Sent under the lock so that it reaches the owner ahead
+                    # of any later "take"
+                    if bucket in self._held or self.owner[bucket] is not shard:
+                        continue
+                    shard.send("row", key)
+                return shard.replies.get()[1]
+
+    def _move(self, heirs):
+        # Hand buckets to new owners (heirs maps bucket -> shard): take their
+        # alarms out of the current owners, restore them on the heirs and
+        # then replay the commands that arrived for them in the meantime
+        by_donor = {}
+        with self._lock:
+            for bucket, heir in heirs.items():
+                by_donor.setdefault(self.owner[bucket], []).append(bucket)
+                self.owner[bucket] = heir
+                self._held[bucket] = []
+        for donor, buckets in by_donor.items():
+            rows, playing = donor.request("take", frozenset(buckets))
+            by_heir = {}
+            for row in rows:
+                by_heir.setdefault(heirs[row[0] % BUCKETS], ([], []))[0].append(row)
+            for key in playing:
+                by_heir[heirs[key % BUCKETS]][1].append(key)
+            with self._lock:
+                for heir, (heir_rows, heir_playing) in by_heir.items():
+                    heir.send("restore", heir_rows, heir_playing)
+                for bucket in buckets:
+                    for command in self._held.pop(bucket):
+                        heirs[bucket].send(*command)
+                self._moved.notify_all()
+
+    def add_shard(self):
+        # Start one more shard and give it an even share of the buckets,
+        # taken from the shards that hold the most
+        if len(self.shards) >= self.max_shards:
+            raise ValueError(f"At most {self.max_shards} shards")
+        shard = Shard(self.pool, self.catch_up)
+        self.shards.append(shard)
+        held = {other: [] for other in self.shards}
+        for bucket, owner in enumerate(self.owner):
+            held[owner].append(bucket)
+        heirs = {}
+        for _ in range(BUCKETS // len(self.shards)):
+            donor = max(held, key=lambda other: len(held[other]) if other is not shard else -1)
+            heirs[held[donor].pop()] = shard
+        self._move(heirs)
+        return shard
+
+    def remove_shard(self, shard=None):
+        # Stop a shard (the last one by default) after handing its buckets
+        # to the remaining shards, least loaded first
+        if len(self.shards) == 1:
+            raise ValueError("Cannot remove the last shard")
+        shard = shard or self.shards[-1]
+        remaining = [other for other in self.shards if other is not shard]
+        counts = {other: 0 for other in remaining}
+        for owner in self.owner:
+            if owner is not shard:
+                counts[owner] += 1
+        heirs = {}
+        for bucket, owner in enumerate(self.owner):
+            if owner is shard:
+                heir = heirs[bucket] = min(counts, key=counts.get)
+                counts[heir] += 1
+        self._move(heirs)
+        self.shards.remove(shard)
+        shard.close()
+        shard.future.result()
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+        self._running = False
+        self._dispatcher.join()
+        self.pool.shutdown()
+
+
+def main(argv):
+    # Headless sharded mode: python shards.py [--shards N] HH:MM [HH:MM ...]
+    shards = None
+    if argv[:1] == ["--shards"]:
+        shards, argv = int(argv[1]), argv[2:]
+    scheduler = None
+
+    def on_fired(rows):
+        for row in rows:
+            print(f"{datetime.now().strftime('%H:%M:%S')} fired: alarm {row[0]}", flush=True)
+            # Nobody is there to press stop in headless mode
+            scheduler.stop(row[0])
+
+    scheduler = ShardedScheduler(shards, on_fired)
+    now = datetime.now()
+    for value in argv:
+        hour, minute = map(int, value.split(":"))
+        alarm_time = datetime(now.year, now.month, now.day, hour, minute)
+        if alarm_time < now:
+            alarm_time += timedelta(days=1)
+        scheduler.add(alarm_time, None)
+    try:
+        while True:
+            time.sleep(MAX_WAIT_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scheduler.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from streaming import STREAM_THRESHOLD_BYTES, open_stream
+from transcode import probe
+
+BUILTIN_SOUNDS = (
+    "SamsungAlarm.mp3",
+    "IphoneAlarm.mp3",
+    "MotivationalQuote1.mp3",
+    "MotivationalQuote2.mp3",
+)
+
+# Decoded PCM is ~10 MB per minute of 44.1 kHz 16-bit stereo audio
+DEFAULT_BUDGET_BYTES = 64 * 1024 * 1024
+
+
+def _unplayable(path, error):
+    # ValueError describing why path could not be prepared
+    if isinstance(error, ValueError):
+        return error
+    if isinstance(error, OSError):
+        return ValueError(f"Cannot open sound {path}: {error.strerror}")
+    # pygame.error, without importing pygame here
+    return ValueError(f"Cannot play {os.path.basename(path)}: {error}")
+
+
+class SoundBank:
+    # Cache of sounds decoded to PCM ahead of time, so firing an alarm never
+    # has to read or decode a file. Entries are keyed by path and mtime (an
+    # edited file is decoded again) and evicted least-recently-used once the
+    # decoded size exceeds the byte budget. Files over stream_bytes are not
+    # decoded at all: get() returns a stream that reads them as they play.
+    #
+    # With a SoundCache (transcode.py) every file that is decoded is first
+    # converted to the mixer's own format and only the converted copy is
+    # decoded; preload() does the conversion on the background worker.
+    # Files that are streamed are only probed, since converting them would
+    # decode all of them at once.
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES, stream_bytes=STREAM_THRESHOLD_BYTES,
+                 cache=None):
+        self.budget_bytes = budget_bytes
+        self.stream_bytes = stream_bytes
+        self.cache = cache
+        self.size_bytes = 0
+        self._sounds = OrderedDict()  # (path, mtime) -> (Sound, size in bytes)
+        self._pending = {}  # (path, mtime) -> Future of a background decode
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="soundbank")
+
+    def __contains__(self, path):
+        try:
+            return self._key(path) in self._sounds
+        except OSError:
+            return False
+
+    def _key(self, path):
+        path = os.path.abspath(path)
+        return path, os.stat(path).st_mtime_ns
+
+    def streams(self, path):
+        return os.path.getsize(path) > self.stream_bytes
+
+    def get(self, path):
+        # Decoded sound for path; decodes synchronously on a cache miss.
+        # Large files come back as a stream that the mixer plays (streaming.py).
+        key = self._key(path)
+        with self._lock:
+            entry = self._sounds.get(key)
+            if entry is not None:
+                self._sounds.move_to_end(key)
+                return entry[0]
+            future = self._pending.get(key)
+        if future is not None:
+            return future.result()
+        return self._load(key)
+
+    def preload(self, path):
+        # Decode path on the background worker; returns a Future or None
+        try:
+            key = self._key(path)
+        except OSError as e:
+            print(f"Error preloading sound: {e}")
+            return None
+        with self._lock:
+            if key in self._sounds:
+                return None
+            future = self._pending.get(key)
+            if future is None:
+                future = self._pending[key] = self._executor.submit(self._load, key)
+        return future
+
+    def warm(self, paths):
+        return [future for future in map(self.preload, paths) if future is not None]
+
+    def check(self, path):
+        # Prepare path, or wait for its preload to finish; raises ValueError
+        # if it cannot be played
+        try:
+            self.get(path)
+        except Exception as e:
+            raise _unplayable(path, e) from e
+
+    def check_later(self, path, on_error):
+        # check() without waiting: path is prepared on the background worker
+        # and on_error(message) is called, from that thread, if it cannot be
+        # played
+        try:
+            self._key(path)
+        except OSError as e:
+            on_error(str(_unplayable(path, e)))
+            return
+
+        def report(future):
+            if not future.cancelled() and future.exception() is not None:
+                on_error(str(_unplayable(path, future.exception())))
+
+        future = self.preload(path)
+        if future is not None:
+            future.add_done_callback(report)
+
+    def _source(self, path):
+        # File that is actually played for path
+        if self.cache is None:
+            return path
+        if self.streams(path):
+            probe(path)
+            return path
+        started = time.perf_counter()
+        source = self.cache.normalize(path)
+        if metrics.enabled:
+            metrics.TRANSCODE_TIME.observe(time.perf_counter() - started)
+        return source
+
+    def _load(self, key):
+        import pygame  # imported on first use to keep it off the start-up path
+        try:
+            source = self._source(key[0])
+            if self.streams(source):
+                return open_stream(source)  # only the header is read
+            started = time.perf_counter()
+            sound = pygame.mixer.Sound(source)
+            if metrics.enabled:
+                metrics.DECODE_TIME.observe(time.perf_counter() - started)
+            frequency, size, channels = pygame.mixer.get_init()
+            nbytes = int(sound.get_length() * frequency) * (abs(size) // 8) * channels
+            with self._lock:
+                self._insert(key, sound, nbytes)
+            return sound
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _insert(self, key, sound, nbytes):
+        if nbytes > self.budget_bytes:
+            return  # too large to keep around, the caller still gets it
+        # Drop older decodes of the same file along with LRU entries
+        for old_key in [k for k in self._sounds if k[0] == key[0] and k != key]:
+            self.size_bytes -= self._sounds.pop(old_key)[1]
+        while self._sounds and self.size_bytes + nbytes > self.budget_bytes:
+            self.size_bytes -= self._sounds.popitem(last=False)[1][1]
+        self._sounds[key] = (sound, nbytes)
+        self.size_bytes += nbytes
+
+    def evict(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            for key in [k for k in self._sounds if k[0] == path]:
+                self.size_bytes -= self._sounds.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._sounds.clear()
+            self.size_bytes = 0
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
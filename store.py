@@ -0,0 +1,388 @@
+import operator
+from array import array
+from datetime import datetime
+
+from recurrence import DAILY_RULE
+from zones import aware_datetime, get_zone
+
+np = None  # numpy, once load_numpy() has run and found it
+_numpy_checked = False
+
+
+def load_numpy():
+    # numpy is imported on first use of a batch operation rather than at
+    # start-up; without it batch evaluation falls back to plain Python
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        np = numpy
+    return np
+
+# Flag bits packed into one byte per alarm
+ENABLED = 1
+PLAYING = 2
+DELETED = 4
+EXPIRED = 8  # the recurrence rule has no occurrences left
+
+NOT_SET = 0  # sentinel for empty time columns
+
+# Accepted field values. Times stop a year short of datetime's limit so that
+# the next occurrence of any rule can still be represented.
+MAX_TIME = 253370764800  # 9999-01-01
+MAX_SNOOZE_MINUTES = 65535
+MAX_KEY = 2 ** 63 - 1
+
+
+def check_fields(start_time, snooze_duration, volume, key=0):
+    # Raises ValueError for a value the columns cannot hold. Called before
+    # any column grows, so a bad record cannot leave them different lengths.
+    for name, value, low, high in (("time", start_time, 1, MAX_TIME),
+                                   ("snooze", snooze_duration, 0, MAX_SNOOZE_MINUTES),
+                                   ("volume", volume, 0, 100),
+                                   ("key", key, 0, MAX_KEY)):
+        try:
+            valid = low <= operator.index(value) <= high
+        except TypeError:
+            valid = False
+        if not valid:
+            raise ValueError(f"{name} must be a whole number from {low} to {high}, not {value!r}")
+
+
+class AlarmStore:
+    # Columnar table of alarms. Every field is kept in a typed array indexed
+    # by alarm id, so a million alarms cost ~54 bytes each and no Python
+    # object exists for an alarm until a view is asked for. Ids are never
+    # reused; removed rows are only flagged as DELETED.
+    def __init__(self):
+        self.fire_time = array("q")  # next occurrence, epoch seconds
+        self.start_time = array("q")  # first occurrence, anchors the rule
+        self.snoozed_until = array("q")  # epoch seconds, NOT_SET if not snoozed
+        self.last_triggered = array("q")  # epoch minute of the last trigger
+        self.snooze_minutes = array("H")
+        self.volume = array("B")  # percent
+        self.sound_id = array("I")
+        self.rule_id = array("I")
+        self.zone_id = array("H")
+        self.flags = array("B")
+        self.key = array("q")  # persistent key, stable across restarts
+        self.sounds = []  # sound id -> sound path
+        self._sound_ids = {}  # sound path -> sound id
+        self.rules = []  # rule id -> RecurrenceRule
+        self._rule_ids = {}  # RecurrenceRule -> rule id
+        self.zones = [None]  # zone id -> ZoneIndex; 0 is the system's local zone
+        self._zone_ids = {None: 0}  # zone name -> zone id
+        self._live = 0
+
+    def __len__(self):
+        return self._live
+
+    def __contains__(self, alarm_id):
+        return 0 <= alarm_id < len(self.flags) and not self.flags[alarm_id] & DELETED
+
+    def __iter__(self):
+        # Ids of all alarms that have not been removed
+        flags = self.flags
+        return (i for i in range(len(flags)) if not flags[i] & DELETED)
+
+    def intern_sound(self, sound):
+        sound_id = self._sound_ids.get(sound)
+        if sound_id is None:
+            sound_id = self._sound_ids[sound] = len(self.sounds)
+            self.sounds.append(sound)
+        return sound_id
+
+    def intern_rule(self, rule):
+        rule_id = self._rule_ids.get(rule)
+        if rule_id is None:
+            rule_id = self._rule_ids[rule] = len(self.rules)
+            self.rules.append(rule)
+        return rule_id
+
+    def intern_zone(self, name):
+        # Raises ValueError for names that are not IANA zones
+        zone_id = self._zone_ids.get(name or None)
+        if zone_id is None:
+            zone = get_zone(name)
+            zone_id = self._zone_ids[name] = len(self.zones)
+            self.zones.append(zone)
+        return zone_id
+
+    def add(self, start_time, sound, snooze_duration=5, enabled=True, volume=100, key=0,
+            rule=DAILY_RULE, zone=None):
+        # Raises ValueError, with the store unchanged, for invalid fields
+        check_fields(start_time, snooze_duration, volume, key)
+        alarm_id = len(self.flags)
+        zone_id = self.intern_zone(zone)
+        fire_time = rule.first(start_time, self.zones[zone_id])
+        rule_id, sound_id = self.intern_rule(rule), self.intern_sound(sound)
+        self.fire_time.append(start_time if fire_time is None else fire_time)
+        self.start_time.append(start_time)
+        self.rule_id.append(rule_id)
+        self.zone_id.append(zone_id)
+        self.snoozed_until.append(NOT_SET)
+        self.last_triggered.append(NOT_SET)
+        self.snooze_minutes.append(snooze_duration)
+        self.volume.append(volume)
+        self.sound_id.append(sound_id)
+        self.flags.append((ENABLED if enabled else 0) | (EXPIRED if fire_time is None else 0))
+        self.key.append(key)
+        self._live += 1
+        return alarm_id
+
+    def add_many(self, records):
+        # Bulk add of (start_time, sound, snooze_duration, enabled, volume,
+        # key, rule, zone) records; each column is extended once. Returns the
+        # ids. Raises ValueError, adding none of the records, if one is invalid.
+        first = len(self.flags)
+        firsts = {}  # (rule, start, zone id) -> first occurrence, shared by rosters
+        # New rows are collected in typed arrays, which also range check them,
+        # and only then are the columns extended
+        fire_time, start_time, key = array("q"), array("q"), array("q")
+        rule_id, sound_id = array("I"), array("I")
+        zone_id, snooze_minutes = array("H"), array("H")
+        volume, flags = array("B"), array("B")
+        for start, sound, snooze, enabled, percent, alarm_key, rule, zone in records:
+            check_fields(start, snooze, percent, alarm_key)
+            zone = self.intern_zone(zone)
+            try:
+                when = firsts[rule, start, zone]
+            except KeyError:
+                when = firsts[rule, start, zone] = rule.first(start, self.zones[zone])
+            fire_time.append(start if when is None else when)
+            start_time.append(start)
+            rule_id.append(self.intern_rule(rule))
+            zone_id.append(zone)
+            snooze_minutes.append(snooze)
+            volume.append(percent)
+            sound_id.append(self.intern_sound(sound))
+            flags.append((ENABLED if enabled else 0) | (EXPIRED if when is None else 0))
+            key.append(alarm_key)
+        self.fire_time.extend(fire_time)
+        self.start_time.extend(start_time)
+        self.rule_id.extend(rule_id)
+        self.zone_id.extend(zone_id)
+        self.snoozed_until.extend([NOT_SET] * len(flags))
+        self.last_triggered.extend([NOT_SET] * len(flags))
+        self.snooze_minutes.extend(snooze_minutes)
+        self.volume.extend(volume)
+        self.sound_id.extend(sound_id)
+        self.flags.extend(flags)
+        self.key.extend(key)
+        self._live += len(flags)
+        return range(first, len(self.flags))
+
+    def remove(self, alarm_id):
+        if alarm_id not in self:
+            return False
+        self.flags[alarm_id] = DELETED
+        self._live -= 1
+        return True
+
+    def view(self, alarm_id):
+        return Alarm(self, alarm_id) if alarm_id in self else None
+
+    def ids_between(self, start, end):
+        # Ids of alarms whose next occurrence falls in [start, end)
+        fire_time, flags = self.fire_time, self.flags
+        return [i for i in range(len(flags))
+                if start <= fire_time[i] < end and not flags[i] & DELETED]
+
+    def _columns(self):
+        # Zero-copy NumPy views; they must not outlive the call because an
+        # array that exports its buffer cannot grow
+        return (np.frombuffer(self.fire_time, dtype=np.int64),
+                np.frombuffer(self.snoozed_until, dtype=np.int64),
+                np.frombuffer(self.last_triggered, dtype=np.int64),
+                np.frombuffer(self.flags, dtype=np.uint8))
+
+    def _schedulable(self, snoozed_until, flags):
+        # Enabled and not removed; expired alarms only while snoozed
+        return (((flags & (ENABLED | DELETED)) == ENABLED)
+                & ((snoozed_until != NOT_SET) | ((flags & EXPIRED) == 0)))
+
+    def _wake_mask(self, fire_time, snoozed_until, flags, now):
+        wake = np.where(snoozed_until == NOT_SET, fire_time, snoozed_until)
+        return (wake <= int(now)) & self._schedulable(snoozed_until, flags)
+
+    def elapsed_ids(self, now, held=()):
+        # Ids of enabled alarms whose wake time (snooze or next occurrence)
+        # has passed, including ones held back by the trigger gates. Ids in
+        # held (a set) are left out.
+        if load_numpy() is None or not self.flags:
+            wake = map(self.next_fire_time, range(len(self.flags)))
+            return [i for i, when in enumerate(wake) if when is not None and when <= now
+                    and not self.flags[i] & DELETED and i not in held]
+        fire_time, snoozed_until, last_triggered, flags = self._columns()
+        mask = self._wake_mask(fire_time, snoozed_until, flags, now)
+        if held:
+            mask[np.fromiter(held, dtype=np.int64, count=len(held))] = False
+        return np.flatnonzero(mask).tolist()
+
+    def next_wake(self, held=()):
+        # Earliest wake time over all enabled alarms not in held, or None
+        if load_numpy() is None or not self.flags:
+            times = [self.next_fire_time(i) for i in self if i not in held]
+            times = [when for when in times if when is not None]
+            return min(times) if times else None
+        fire_time, snoozed_until, last_triggered, flags = self._columns()
+        wake = np.where(snoozed_until == NOT_SET, fire_time, snoozed_until)
+        mask = self._schedulable(snoozed_until, flags)
+        if held:
+            mask[np.fromiter(held, dtype=np.int64, count=len(held))] = False
+        wake = wake[mask]
+        return int(wake.min()) if wake.size else None
+
+    def next_fire_time(self, alarm_id):
+        # Absolute time (epoch seconds) at which the scheduler should wake up
+        if not self.flags[alarm_id] & ENABLED:
+            return None
+        snoozed_until = self.snoozed_until[alarm_id]
+        if snoozed_until != NOT_SET:
+            return snoozed_until
+        if self.flags[alarm_id] & EXPIRED:
+            return None
+        return self.fire_time[alarm_id]
+
+    def snooze(self, alarm_id, now):
+        flags = self.flags[alarm_id]
+        if flags & PLAYING:
+            self.flags[alarm_id] = flags & ~PLAYING
+            self.snoozed_until[alarm_id] = int(now) + self.snooze_minutes[alarm_id] * 60
+            return True
+        return False
+
+    def stop(self, alarm_id, now):
+        self.flags[alarm_id] &= ~PLAYING
+        self.snoozed_until[alarm_id] = NOT_SET
+        self.last_triggered[alarm_id] = int(now) // 60
+
+    def row(self, alarm_id):
+        # Plain tuple of the persistent fields, safe to hand to another thread
+        return (self.key[alarm_id], self.fire_time[alarm_id], self.snoozed_until[alarm_id],
+                self.last_triggered[alarm_id], self.sounds[self.sound_id[alarm_id]],
+                self.snooze_minutes[alarm_id], self.volume[alarm_id],
+                bool(self.flags[alarm_id] & ENABLED), self.start_time[alarm_id],
+                str(self.rules[self.rule_id[alarm_id]]), self.zone_name(alarm_id))
+
+    def zone(self, alarm_id):
+        return self.zones[self.zone_id[alarm_id]]
+
+    def zone_name(self, alarm_id):
+        zone = self.zones[self.zone_id[alarm_id]]
+        return None if zone is None else zone.name
+
+    def roll_forward(self, alarm_id, now):
+        # Move the alarm over to its next occurrence after now
+        if self.fire_time[alarm_id] <= now and not self.flags[alarm_id] & EXPIRED:
+            rule = self.rules[self.rule_id[alarm_id]]
+            fire_time = rule.next_after(self.start_time[alarm_id], int(now), self.zone(alarm_id))
+            if fire_time is None:
+                self.flags[alarm_id] |= EXPIRED
+            else:
+                self.fire_time[alarm_id] = fire_time
+
+    def skip(self, alarm_id, now):
+        # Let a due alarm pass without ringing: drop any snooze and move on to
+        # the next occurrence after now
+        self.snoozed_until[alarm_id] = NOT_SET
+        self.roll_forward(alarm_id, now)
+
+    def occurrences(self, alarm_id, start, end):
+        # Occurrences of one alarm in [start, end), see RecurrenceRule.occurrences()
+        rule = self.rules[self.rule_id[alarm_id]]
+        return rule.occurrences(self.start_time[alarm_id], start, end, self.zone(alarm_id))
+
+    def check_and_trigger(self, alarm_id, now):
+        current_minute = int(now) // 60
+        flags = self.flags[alarm_id]
+        snoozed_until = self.snoozed_until[alarm_id]
+        self.roll_forward(alarm_id, now)
+
+        # Check if alarm should trigger; the occurrence that made it due counts
+        # even if rolling forward just found the rule exhausted
+        if flags & ENABLED and not flags & (PLAYING | DELETED):
+            if flags & EXPIRED and snoozed_until == NOT_SET:
+                return False
+            # Don't trigger again in the same minute
+            if self.last_triggered[alarm_id] != current_minute:
+                if snoozed_until == NOT_SET or now >= snoozed_until:
+                    self.flags[alarm_id] |= PLAYING
+                    self.snoozed_until[alarm_id] = NOT_SET
+                    self.last_triggered[alarm_id] = current_minute
+                    return True
+        return False
+
+
+class Alarm:
+    # Lightweight handle onto one row of an AlarmStore
+    __slots__ = ("store", "id")
+
+    def __init__(self, store, alarm_id):
+        self.store = store
+        self.id = alarm_id
+
+    def __eq__(self, other):
+        return isinstance(other, Alarm) and other.store is self.store and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def key(self):
+        return self.store.key[self.id]
+
+    @property
+    def time(self):
+        # Aware in the alarm's zone; naive local time for local alarms
+        return aware_datetime(self.store.fire_time[self.id], self.store.zone(self.id))
+
+    @property
+    def zone(self):
+        return self.store.zone_name(self.id)
+
+    @property
+    def sound(self):
+        return self.store.sounds[self.store.sound_id[self.id]]
+
+    @property
+    def snooze_duration(self):
+        return self.store.snooze_minutes[self.id]
+
+    @property
+    def rule(self):
+        return self.store.rules[self.store.rule_id[self.id]]
+
+    @property
+    def expired(self):
+        return bool(self.store.flags[self.id] & EXPIRED)
+
+    @property
+    def volume(self):
+        return self.store.volume[self.id]
+
+    @property
+    def enabled(self):
+        return bool(self.store.flags[self.id] & ENABLED)
+
+    @property
+    def is_playing(self):
+        return bool(self.store.flags[self.id] & PLAYING)
+
+    @property
+    def snoozed_until(self):
+        snoozed_until = self.store.snoozed_until[self.id]
+        return None if snoozed_until == NOT_SET else datetime.fromtimestamp(snoozed_until)
+
+    def stop(self, now=None):
+        if now is None:
+            now = datetime.now()
+        self.store.stop(self.id, now.timestamp())
+
+    def __str__(self):
+        zone = f" {self.zone}" if self.zone else ""
+        return (f"{self.time.strftime('%H:%M')}{zone} - {self.sound} "
+                f"(Snooze: {self.snooze_duration}m, {self.rule.describe()})")
@@ -0,0 +1,260 @@
+import collections
+import mmap
+import os
+import struct
+import threading
+import time
+
+# Files larger than this are streamed while they play instead of being
+# decoded into memory up front
+STREAM_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+# Audio handed to the channel at a time, and how many chunks the reader
+# keeps ready ahead of the channel. Memory per playing stream is about
+# RING_CHUNKS + 2 chunks (~450 KB at 44.1 kHz 16-bit stereo), whatever the
+# size of the file.
+CHUNK_SECONDS = 0.5
+RING_CHUNKS = 4
+
+# How often the music fallback is checked for having finished
+MUSIC_POLL_SECONDS = 0.25
+
+# The reader wakes this long after the playing chunk is due to end, by when
+# the channel has moved on to the queued one
+QUEUE_SLACK_SECONDS = 0.01
+
+# WAVE format tags of uncompressed integer PCM
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def wav_layout(path):
+    # (channels, rate, sample width, data offset, data size) of an integer
+    # PCM WAV file, or None for anything else
+    with open(path, "rb") as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b"RIFF" or header[8:] != b"WAVE":
+            return None
+        fmt = None
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                return None
+            chunk_id, size = struct.unpack("<4sI", chunk)
+            if chunk_id == b"fmt ":
+                fmt = f.read(size)
+                if size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b"data":
+                break
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+        offset = f.tell()
+    if fmt is None or len(fmt) < 16:
+        return None
+    tag, channels, rate, _, _, bits = struct.unpack("<HHIIHH", fmt[:16])
+    if tag == WAVE_FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        tag = struct.unpack("<H", fmt[24:26])[0]  # first two bytes of the sub-format GUID
+    if tag != WAVE_FORMAT_PCM or bits not in (8, 16) or not channels:
+        return None
+    # A data size that runs past the end is common in files that were cut short
+    size = min(size, os.path.getsize(path) - offset)
+    return channels, rate, bits // 8, offset, size
+
+
+def native_layout(path):
+    # wav_layout() of path if it is a WAV in the open mixer's own format,
+    # which plays without any conversion; None otherwise
+    import pygame  # imported on first use to keep it off the start-up path
+    frequency, size, channels = pygame.mixer.get_init()
+    layout = wav_layout(path)
+    if layout is None:
+        return None
+    wav_channels, rate, width = layout[:3]
+    # 8-bit WAV is unsigned and 16-bit signed, as are the mixer's 8 and -16
+    if (wav_channels, rate, width * 8) == (channels, frequency, abs(size)) \
+            and (width == 1) == (size > 0):
+        return layout
+    return None
+
+
+def open_stream(path):
+    # Streaming source for path: chunks straight from the file when it is a
+    # WAV in the mixer's own format, otherwise SDL_mixer's music stream,
+    # which decodes compressed files incrementally but plays one at a time
+    layout = native_layout(path)
+    if layout is not None:
+        channels, rate, width, offset, nbytes = layout
+        return SoundStream(path, offset, nbytes, rate, width * channels)
+    return MusicFile(path)
+
+
+class SoundStream:
+    # A large PCM file played in fixed-size chunks from a memory map. Only
+    # the first chunk is read before playback starts; a reader thread per
+    # playing stream keeps a bounded ring of chunks ready and queues them on
+    # the channel one after the other (Channel.queue), so resident memory
+    # stays the same for an hour-long file as for a short one. Pages the
+    # channel has been given are released again with madvise.
+    #
+    # The reader sleeps until the playing chunk is due to end, when the
+    # channel's queue slot frees, so it wakes once per chunk. (The channel's
+    # end event would need SDL's video subsystem, which nothing here starts.)
+    def __init__(self, path, offset, nbytes, rate, frame_bytes):
+        self.path = path
+        self.offset = offset
+        self.nbytes = nbytes - nbytes % frame_bytes
+        self.rate = rate
+        self.frame_bytes = frame_bytes
+        self.chunk_bytes = max(1, int(rate * CHUNK_SECONDS)) * frame_bytes
+
+    def get_length(self):
+        return self.nbytes / (self.rate * self.frame_bytes)
+
+    def play(self, channel, loops=0):
+        player = StreamPlayer(self, channel, loops)
+        player.start()
+        return player
+
+
+class StreamPlayer:
+    __slots__ = ("stream", "channel", "loops", "_file", "_map", "_position", "_released",
+                 "_ring", "_ends", "_queued", "_lock", "_stopped", "_thread")
+
+    def __init__(self, stream, channel, loops):
+        self.stream = stream
+        self.channel = channel
+        self.loops = loops  # passes left after this one; -1 repeats forever
+        self._file = open(stream.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._position = 0
+        self._released = 0  # bytes of the data handed back to the kernel
+        self._ring = collections.deque()
+        self._ends = 0.0  # time.monotonic() at which the playing chunk ends
+        self._queued = 0.0  # length of the chunk in the channel's queue slot
+        self._lock = threading.Lock()  # held while queueing, so stop() wins any race
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sound-stream", daemon=True)
+
+    @property
+    def active(self):
+        # True until every chunk has been queued on the channel
+        return self._thread.is_alive()
+
+    def start(self):
+        first = self._read()
+        if first is None:
+            self._close()
+            return
+        self.channel.play(first)
+        self._ends = time.monotonic() + first.get_length()
+        self._thread.start()
+
+    def stop(self):
+        # Once this returns nothing more is queued on the channel, which the
+        # caller then stops or gives to another sound
+        with self._lock:
+            self._stopped.set()
+        if not self._thread.is_alive():
+            self._close()
+
+    def _read(self):
+        # Next chunk as a pygame Sound, or None at the end of the last pass
+        import pygame
+        stream = self.stream
+        if self._position >= stream.nbytes:
+            if self.loops == 0:
+                return None
+            if self.loops > 0:
+                self.loops -= 1
+            self._position = 0
+            self._release(stream.nbytes)
+            self._released = 0
+        start = stream.offset + self._position
+        end = start + min(stream.chunk_bytes, stream.nbytes - self._position)
+        chunk = pygame.mixer.Sound(buffer=self._map[start:end])
+        self._position = end - stream.offset
+        self._release(self._position)
+        return chunk
+
+    def _release(self, upto):
+        # Drop the pages of everything read so far from resident memory
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        start = self._released + self.stream.offset
+        start -= start % mmap.PAGESIZE
+        end = upto + self.stream.offset
+        end -= end % mmap.PAGESIZE
+        if end > start:
+            self._map.madvise(mmap.MADV_DONTNEED, start, end - start)
+            self._released = end - self.stream.offset
+
+    def _run(self):
+        ring = self._ring
+        try:
+            while not self._stopped.is_set():
+                # Keep the channel's one queue slot filled. An idle channel
+                # means the reader fell behind; queue() starts it again.
+                if ring and self.channel.get_queue() is None:
+                    with self._lock:
+                        if self._stopped.is_set():
+                            break
+                        busy = self.channel.get_busy()
+                        chunk = ring.popleft()
+                        self.channel.queue(chunk)
+                    if busy:
+                        # The chunk queued last time has taken over from the
+                        # one that ended
+                        self._ends += self._queued
+                        self._queued = chunk.get_length()
+                    else:
+                        self._ends, self._queued = time.monotonic() + chunk.get_length(), 0.0
+                    continue
+                if len(ring) < RING_CHUNKS:
+                    chunk = self._read()
+                    if chunk is not None:
+                        ring.append(chunk)
+                        continue
+                    if not ring:
+                        return  # the channel plays out the last queued chunk
+                # Nothing to do until the playing chunk ends and the queued
+                # one takes its place
+                self._stopped.wait(max(0.0, self._ends - time.monotonic()) + QUEUE_SLACK_SECONDS)
+        finally:
+            ring.clear()
+            self._close()
+
+    def _close(self):
+        self._map.close()
+        self._file.close()
+
+
+class MusicFile:
+    # A large compressed file, played through pygame.mixer.music
+    def __init__(self, path):
+        self.path = path
+
+    def get_length(self):
+        return None  # unknown without decoding the whole file
+
+
+class MusicChannel:
+    # pygame.mixer.music behind the Channel methods AlarmMixer uses, so the
+    # single music stream can be one more voice
+    def play(self, music, loops=0):
+        import pygame
+        pygame.mixer.music.load(music.path)
+        pygame.mixer.music.play(loops=loops)
+
+    def stop(self):
+        import pygame
+        pygame.mixer.music.stop()
+        pygame.mixer.music.unload()
+
+    def get_busy(self):
+        import pygame
+        return pygame.mixer.music.get_busy()
+
+    def set_volume(self, volume):
+        import pygame
+        pygame.mixer.music.set_volume(volume)
@@ -0,0 +1,24 @@
+# The modules live at the top of the repository; Qt and SDL run headless
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+AUDIO_RATE = 22050
+
+
+@pytest.fixture
+def audio(request):
+    # pygame's mixer on SDL's dummy driver, which plays in real time. Mono,
+    # with the sample size given by indirect parametrization, signed 16-bit
+    # otherwise; yields pygame.mixer.get_init()
+    pygame = pytest.importorskip("pygame")
+    pygame.mixer.quit()
+    pygame.mixer.init(AUDIO_RATE, getattr(request, "param", -16), 1)
+    yield pygame.mixer.get_init()
+    pygame.mixer.quit()
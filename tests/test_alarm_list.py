@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from engine import AlarmEngine
+
+MINUTES = (50, 0, 30, 0, 10, 40, 20, 15, 25, 45, 55, 5, 35, 12, 48, 33, 3, 58, 27, 19)
+
+
+@pytest.fixture
+def model():
+    from PyQt5.QtWidgets import QApplication
+    import main
+    QApplication.instance() or QApplication([])
+    engine = AlarmEngine()
+    model = main.AlarmListModel(engine)
+    model.sort_by_next_fire(True)
+    start = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=1)
+    for minutes in MINUTES:
+        engine.add(start + timedelta(minutes=minutes), f"{minutes}.wav")
+    return model
+
+
+def in_order(model):
+    times = [model.fire_time(alarm_id) for alarm_id in model.ids]
+    return times == sorted(times) and sorted(model.ids) == sorted(alarm.id for alarm in model.engine)
+
+
+def test_fired_rows_move_to_their_next_occurrence(model):
+    engine = model.engine
+    assert in_order(model)
+    first = engine.next_deadline()
+    fired = engine.tick(first)
+    assert len(fired) == 2  # both alarms set for the same minute
+    assert in_order(model)
+    # They wait for tomorrow now, after every other alarm
+    assert set(model.ids[-2:]) == {alarm.id for alarm in fired}
+    assert model.fire_row(first.timestamp() + 3 * 60) == 1
+
+
+def test_snoozed_and_stopped_rows_move(model):
+    engine = model.engine
+    due = engine.next_deadline()
+    fired = engine.tick(due)
+    engine.snooze(fired[0].id, due)
+    assert in_order(model)
+    assert model.fire_time(fired[0].id) == due.timestamp() + 5 * 60
+    engine.stop(fired[1].id, due)
+    assert in_order(model)
+
+
+def test_large_batches_sort_the_whole_list(model):
+    engine = model.engine
+    assert len(engine.tick(engine.next_deadline() + timedelta(minutes=30))) > len(MINUTES) // 8
+    assert in_order(model)
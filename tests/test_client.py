@@ -0,0 +1,50 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from client import RemoteEngine
+from engine import AlarmEngine
+from server import AlarmServer
+
+
+@pytest.fixture
+def remote(tmp_path):
+    path = str(tmp_path / "alarms.sock")
+    server = AlarmServer(AlarmEngine(), audio=False)
+    threading.Thread(target=asyncio.run, args=(server.serve(path),), daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(path):
+        assert time.monotonic() < deadline, "the server did not start"
+        time.sleep(0.01)
+    remote = RemoteEngine(path)
+    yield remote
+    remote.close()
+
+
+def test_events_is_still_the_async_iterator(remote):
+    assert hasattr(remote.events(), "__anext__")
+    assert remote.fileno() == remote.stream.fileno()
+
+
+def test_changes_reach_the_server(remote):
+    when = datetime.now().replace(microsecond=0) + timedelta(hours=1)
+    alarm = remote.add(when, None, volume=0, snooze_duration=0)
+    assert (alarm.time, alarm.volume, alarm.snooze_duration) == (when, 0, 0)
+    assert [record["key"] for record in remote.client.call("list")] == [alarm.key]
+    assert remote.stop(alarm.id)
+    assert remote.remove(alarm.id)
+    assert remote.client.call("list") == []
+
+
+def test_unknown_alarms_return_false_like_the_base_engine(remote):
+    alarm = remote.add(datetime.now() + timedelta(hours=1), None)
+    assert not remote.snooze(alarm.id)  # not ringing
+    remote.client.call("remove", key=alarm.key)  # gone behind the replica's back
+    for method in (remote.snooze, remote.stop, remote.remove):
+        assert method(alarm.id) is False
+    for method in (remote.snooze, remote.stop, remote.remove):
+        assert method(12345) is False
@@ -0,0 +1,64 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from engine import COALESCE, FIRE_LATE, SKIP, AlarmEngine
+from recurrence import MINUTELY, RecurrenceRule
+
+
+def sleep_through(policy):
+    # Three alarms and a minutely one all fall due while the machine sleeps
+    # for an hour; returns the alarms that ring on waking and those missed
+    engine = AlarmEngine(catch_up=policy)
+    start = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+    alarms = [engine.add(start + timedelta(minutes=minutes), f"{minutes}.wav")
+              for minutes in (0, 10, 20)]
+    alarms.append(engine.add(start, "minutely.wav", rule=RecurrenceRule(MINUTELY)))
+    missed = []
+    engine.on("missed", missed.append)
+    woke = start + timedelta(hours=1)
+    fired = engine.tick(woke)
+    for alarm in alarms:
+        assert alarm.time > woke  # every alarm has moved past the gap
+    return sorted(alarm.sound for alarm in fired), sorted(alarm.sound for alarm in missed)
+
+
+def test_fire_late_rings_each_missed_alarm_once():
+    assert sleep_through(FIRE_LATE) == (["0.wav", "10.wav", "20.wav", "minutely.wav"], [])
+
+
+def test_coalesce_rings_once_for_the_gap():
+    fired, missed = sleep_through(COALESCE)
+    assert fired == ["20.wav"]
+    assert missed == ["0.wav", "10.wav", "minutely.wav"]
+
+
+def test_skip_rings_nothing():
+    assert sleep_through(SKIP) == ([], ["0.wav", "10.wav", "20.wav", "minutely.wav"])
+
+
+def test_clock_service_reports_jumps_and_catches_up(monkeypatch):
+    pytest.importorskip("PyQt5")
+    from PyQt5.QtWidgets import QApplication
+    import main
+    app = QApplication.instance() or QApplication([])
+    engine = AlarmEngine(catch_up=COALESCE)
+    clock = main.ClockService(engine)
+    jumps = []
+    clock.jumped.connect(jumps.append)
+    wall, monotonic = time.time(), time.monotonic()
+    due = datetime.fromtimestamp(wall).replace(microsecond=0) + timedelta(minutes=5)
+    early = engine.add(due, "early.wav")
+    late = engine.add(due + timedelta(minutes=30), "late.wav")
+
+    clock.deadline = clock.last_wall = wall
+    clock.last_monotonic = monotonic
+    # An hour passes on the wall clock while the monotonic clock moves 2 s
+    monkeypatch.setattr(main.time, "time", lambda: wall + 3600)
+    monkeypatch.setattr(main.time, "monotonic", lambda: monotonic + 2)
+    clock.wake()
+    clock.stop()
+    app.processEvents()
+    assert jumps == [pytest.approx(3598)]
+    assert late.is_playing and not early.is_playing
@@ -0,0 +1,27 @@
+import socket
+
+import metrics
+
+
+def test_bad_exporters_are_reported_and_skipped(capsys):
+    # A port that is already taken, a malformed or out of range port and an
+    # unknown name each cost only their own exporter
+    busy = socket.socket()
+    busy.bind(("127.0.0.1", 0))
+    busy.listen()
+    port = busy.getsockname()[1]
+    try:
+        exporters = metrics.start_exporters(
+            f"prometheus:{port},prometheus:abc,prometheus:99999,statsd:8125,panel,prometheus:0")
+    finally:
+        busy.close()
+        metrics.disable()
+    try:
+        assert [type(exporter) for exporter in exporters] == [metrics.PrometheusExporter]
+        assert exporters[0].port != port
+    finally:
+        for exporter in exporters:
+            exporter.close()
+    out = capsys.readouterr().out
+    for item in (f"prometheus:{port}", "prometheus:abc", "prometheus:99999", "statsd:8125"):
+        assert f"{item!r} not started" in out
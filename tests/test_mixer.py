@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from conftest import AUDIO_RATE
+from mixer import ALARM_PRIORITY, TEST_PRIORITY, AlarmMixer
+
+pygame = pytest.importorskip("pygame")
+
+
+def tone(seconds):
+    # Silent signed 16-bit mono sound of the given length
+    return pygame.mixer.Sound(buffer=bytes(int(AUDIO_RATE * seconds) * 2))
+
+
+def test_overlapping_sounds_get_their_own_voices(audio):
+    mixer = AlarmMixer(voices=3)
+    for key in (1, 2, 3):
+        assert mixer.play(key, tone(5), volume=key / 10)
+    assert len(mixer) == 3
+    assert all(mixer.is_playing(key) for key in (1, 2, 3))
+    assert {round(channel.get_volume(), 1) for channel in mixer.channels} == {0.1, 0.2, 0.3}
+    assert mixer.stop(2) and not mixer.stop(2)
+    assert not mixer.is_playing(2) and len(mixer) == 2
+    mixer.stop_all()
+    assert len(mixer) == 0
+
+
+def test_full_mixer_steals_the_oldest_lowest_priority_voice(audio):
+    stolen = []
+    mixer = AlarmMixer(voices=2, on_finished=stolen.append)
+    assert mixer.play("test", tone(5), priority=TEST_PRIORITY)
+    assert mixer.play(1, tone(5))
+    assert mixer.play(2, tone(5))  # takes the test sound's voice
+    assert stolen == ["test"]
+    assert not mixer.play("test", tone(5), priority=TEST_PRIORITY)  # cannot steal an alarm
+    assert mixer.play(3, tone(5), priority=ALARM_PRIORITY)  # the older alarm goes
+    assert stolen == ["test", 1]
+    assert mixer.is_playing(2) and mixer.is_playing(3)
+    mixer.stop_all()
+
+
+def test_playing_a_key_again_restarts_its_voice(audio):
+    mixer = AlarmMixer(voices=2)
+    mixer.play(1, tone(5))
+    mixer.play(1, tone(5))
+    assert len(mixer) == 1
+    mixer.stop_all()
+
+
+class Timers:
+    # call_later() for the mixer, on threads the way a host loop would
+    def __init__(self):
+        self.calls = 0
+        self.threads = []
+
+    def __call__(self, delay, callback):
+        self.calls += 1
+        timer = threading.Timer(delay, callback)
+        self.threads.append(timer)
+        timer.start()
+
+    def join(self):
+        for timer in list(self.threads):
+            timer.join(5)
+
+
+def test_finished_sounds_are_reported_once(audio):
+    finished = []
+    done = threading.Event()
+    timers = Timers()
+    mixer = AlarmMixer(voices=2, call_later=timers,
+                       on_finished=lambda key: (finished.append(key), done.set()))
+    started = time.monotonic()
+    mixer.play(1, tone(0.2))
+    assert done.wait(5)
+    assert time.monotonic() - started >= 0.2
+    timers.join()
+    assert finished == [1]
+    assert timers.calls <= 3  # one wakeup at the end, and a recheck or two for latency
+    assert len(mixer) == 0
+
+
+def test_stopped_and_looping_sounds_are_not_reported(audio):
+    finished = []
+    timers = Timers()
+    mixer = AlarmMixer(voices=2, call_later=timers, on_finished=finished.append)
+    mixer.play(1, tone(0.1))
+    mixer.play(2, tone(0.1), loops=-1)
+    assert timers.calls == 1  # a looping sound has no end to wait for
+    mixer.stop(1)
+    timers.join()
+    assert finished == [] and mixer.is_playing(2)
+    mixer.stop_all()
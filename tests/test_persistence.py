@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from engine import AlarmEngine
+from persistence import AlarmDatabase
+from recurrence import ONCE_RULE
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "alarms.db")
+
+
+def test_alarms_survive_a_restart(path):
+    now = datetime.now().replace(second=0, microsecond=0)
+    database = AlarmDatabase(path)
+    engine = AlarmEngine()
+    database.attach(engine)
+    soon = engine.add(now + timedelta(hours=1), "soon.wav", snooze_duration=0, volume=0)
+    later = engine.add(now + timedelta(days=30), "later.wav", rule=ONCE_RULE, zone="Europe/Oslo")
+    gone = engine.add(now + timedelta(hours=2), "gone.wav")
+    engine.remove(gone.id)
+    database.close()
+
+    database = AlarmDatabase(path)
+    engine = AlarmEngine()
+    alarms = database.load_into(engine, now + timedelta(days=1))
+    assert sorted(alarm.key for alarm in alarms) == [soon.key, later.key]
+    by_key = {alarm.key: alarm for alarm in alarms}
+    assert (by_key[soon.key].volume, by_key[soon.key].snooze_duration) == (0, 0)
+    assert by_key[later.key].zone == "Europe/Oslo"
+    # Far-off alarms are held back from the schedule but still listed
+    assert engine.pending == {by_key[later.key].id}
+    assert engine.next_deadline() == soon.time
+    assert engine.schedule_pending(now + timedelta(days=31)) == [by_key[later.key]]
+    assert database.load_into(engine, now) == []  # already claimed by this run
+    database.close()
+
+
+def test_rows_include_alarms_not_loaded(path):
+    now = datetime.now().replace(second=0, microsecond=0)
+    database = AlarmDatabase(path)
+    engine = AlarmEngine()
+    database.attach(engine)
+    for days in (1, 10, 100):
+        engine.add(now + timedelta(days=days), f"{days}.wav")
+    assert [row[4] for row in database.rows()] == ["1.wav", "10.wav", "100.wav"]
+    engine.add(now + timedelta(days=1000), "1000.wav")
+    assert len(list(database.rows())) == 4  # queued changes are written first
+    database.close()
+
+
+def test_new_keys_follow_saved_ones(path):
+    database = AlarmDatabase(path)
+    engine = AlarmEngine()
+    database.attach(engine)
+    first = engine.add(datetime.now() + timedelta(hours=1), "a.wav")
+    database.close()
+    database = AlarmDatabase(path)
+    engine = AlarmEngine()
+    database.attach(engine)
+    assert engine.add(datetime.now() + timedelta(hours=1), "b.wav").key > first.key
+    database.close()
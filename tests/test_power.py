@@ -0,0 +1,87 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from engine import AlarmEngine
+
+
+@pytest.fixture
+def app():
+    from PyQt5.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def make_window(app):
+    # The parts of AlarmClock that PowerManager drives
+    from PyQt5.QtWidgets import QWidget
+    import main
+
+    class Window(QWidget):
+        def __init__(self):
+            super().__init__()
+            self.clock = main.ClockService(AlarmEngine(), self)
+            self.seconds = self.active = None
+            self.refreshes = 0
+            self.clock.second.connect(self.count_refresh)
+
+        def count_refresh(self, now):
+            self.refreshes += 1
+
+        def set_display_seconds(self, seconds):
+            self.seconds = seconds
+
+        def set_display_active(self, active):
+            self.active = active
+
+    return Window()
+
+
+def settle(app, window):
+    for _ in range(5):
+        app.processEvents()
+    return window.active, window.clock.ticking, window.clock.resolution
+
+
+def test_displays_only_tick_while_visible(app):
+    import main
+    window = make_window(app)
+    main.PowerManager(window)  # owned by the window
+    try:
+        assert settle(app, window) == (False, False, 1)
+        refreshes = window.refreshes
+        window.show()
+        assert settle(app, window) == (True, True, 1)
+        assert window.refreshes > refreshes  # caught up on the way back
+        window.showMinimized()
+        assert settle(app, window)[:2] == (False, False)
+        window.showNormal()
+        assert settle(app, window)[:2] == (True, True)
+        window.hide()
+        assert settle(app, window)[:2] == (False, False)
+    finally:
+        window.clock.stop()
+        window.close()
+
+
+def test_low_refresh_drops_seconds_until_input(app):
+    import main
+    from PyQt5.QtCore import QEvent, Qt
+    from PyQt5.QtGui import QKeyEvent
+    window = make_window(app)
+    power = main.PowerManager(window, low_refresh=True)
+    try:
+        window.show()
+        settle(app, window)
+        assert window.seconds and power.idle_timer.isActive()
+        power.idle_timer.timeout.emit()  # IDLE_SECONDS without input
+        assert not window.seconds and window.clock.resolution == 60
+        app.sendEvent(window, QKeyEvent(QEvent.KeyPress, Qt.Key_A, Qt.NoModifier))
+        assert window.seconds and window.clock.resolution == 1
+        assert power.idle_timer.isActive()
+        window.hide()
+        settle(app, window)
+        assert not power.idle_timer.isActive()  # nobody to be idle in front of
+    finally:
+        app.removeEventFilter(power)
+        window.clock.stop()
+        window.close()
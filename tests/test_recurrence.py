@@ -0,0 +1,161 @@
+import random
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+from recurrence import (DAILY, WEEKDAYS, WEEKENDS, WEEKLY, RecurrenceRule, _expand,
+                        _window_days)
+from zones import get_zone, local_datetime, local_timestamp, offset_table
+
+BERLIN = get_zone("Europe/Berlin")
+
+
+def utc(*fields):
+    return int(datetime(*fields, tzinfo=timezone.utc).timestamp())
+
+
+def following(rule, start, n, zone):
+    times = [rule.first(start, zone)]
+    while len(times) < n:
+        times.append(rule.next_after(start, times[-1], zone))
+    return times
+
+
+def test_alarm_in_skipped_hour_rings_after_the_gap():
+    # 2025-03-30 02:00 CET jumps to 03:00 CEST
+    start = local_timestamp(datetime(2025, 3, 29, 2, 30), BERLIN)
+    times = following(RecurrenceRule(DAILY), start, 3, BERLIN)
+    assert times == [utc(2025, 3, 29, 1, 30), utc(2025, 3, 30, 1, 30), utc(2025, 3, 31, 0, 30)]
+    assert [local_datetime(t, BERLIN).hour for t in times] == [2, 3, 2]
+
+
+def test_alarm_in_repeated_hour_rings_once():
+    # 2025-10-26 03:00 CEST falls back to 02:00 CET; 02:30 happens twice
+    start = local_timestamp(datetime(2025, 10, 25, 2, 30), BERLIN)
+    times = following(RecurrenceRule(DAILY), start, 3, BERLIN)
+    assert times == [utc(2025, 10, 25, 0, 30), utc(2025, 10, 26, 0, 30), utc(2025, 10, 27, 1, 30)]
+
+
+def test_minutely_rule_keeps_real_intervals_across_the_gap():
+    start = local_timestamp(datetime(2025, 3, 30, 1, 40), BERLIN)
+    times = following(RecurrenceRule("MINUTELY", interval=15), start, 4, BERLIN)
+    assert [b - a for a, b in zip(times, times[1:])] == [900, 900, 900]
+
+
+def test_weekly_rule_on_chosen_days():
+    # 2025-06-02 is a Monday; Monday and Friday only
+    start = local_timestamp(datetime(2025, 6, 2, 7, 0), BERLIN)
+    rule = RecurrenceRule(WEEKLY, weekdays=0b0010001)
+    days = [local_datetime(t, BERLIN) for t in following(rule, start, 4, BERLIN)]
+    assert [d.day for d in days] == [2, 6, 9, 13]
+    assert {(d.hour, d.minute) for d in days} == {(7, 0)}
+
+
+def test_count_until_and_exdates():
+    start = local_timestamp(datetime(2025, 6, 2, 7, 0), BERLIN)
+    skipped = start + 86400
+    counted = RecurrenceRule(DAILY, count=3, exdates=[skipped])
+    assert following(counted, start, 2, BERLIN) == [start, start + 2 * 86400]
+    assert counted.next_after(start, start + 2 * 86400, BERLIN) is None
+    until = RecurrenceRule(DAILY, until=start + 86400)
+    assert until.next_after(start, start, BERLIN) == start + 86400
+    assert until.next_after(start, start + 86400, BERLIN) is None
+    assert RecurrenceRule("ONCE").next_after(start, start, BERLIN) is None
+
+
+def test_occurrences_in_window():
+    start = local_timestamp(datetime(2025, 6, 2, 7, 0), BERLIN)
+    rule = RecurrenceRule(WEEKLY, weekdays=WEEKDAYS)
+    window = rule.occurrences(start, start, start + 14 * 86400, BERLIN)
+    assert len(window) == 10
+    assert window[0] == start
+
+
+@pytest.mark.parametrize("text", [
+    "FREQ=DAILY",
+    "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE,FR",
+    "FREQ=DAILY;UNTIL=20251231T070000Z;COUNT=5",
+    "FREQ=WEEKLY;BYDAY=SA,SU;EXDATE=20250607T070000Z,20250614T070000Z",
+    "FREQ=MINUTELY;INTERVAL=10",
+])
+def test_rule_text_round_trip(text):
+    rule = RecurrenceRule.parse(text)
+    assert str(rule) == text
+    assert RecurrenceRule.parse(str(rule)) == rule
+
+
+def test_bad_rules_and_zones_are_rejected():
+    with pytest.raises(ValueError):
+        RecurrenceRule.parse("FREQ=YEARLY")
+    with pytest.raises(ValueError):
+        RecurrenceRule(DAILY, interval=0)
+    with pytest.raises(ValueError):
+        get_zone("Mars/Olympus_Mons")
+
+
+EXPANDED_RULES = [
+    RecurrenceRule(DAILY),
+    RecurrenceRule(DAILY, interval=3),
+    RecurrenceRule(DAILY, count=40),
+    RecurrenceRule(WEEKLY),
+    RecurrenceRule(WEEKLY, weekdays=WEEKDAYS),
+    RecurrenceRule(WEEKLY, interval=2, weekdays=0b1010101),
+    RecurrenceRule(WEEKLY, interval=3, weekdays=0b0100110, count=17),
+    RecurrenceRule(WEEKLY, weekdays=WEEKENDS, until=utc(2025, 9, 1)),
+    RecurrenceRule("MINUTELY", interval=90, count=500),
+    RecurrenceRule("ONCE"),
+]
+
+
+def check_expansion(zone, seed):
+    # occurrences() lays out days in bulk; it has to agree with stepping
+    # through next_after() one occurrence at a time
+    pytest.importorskip("numpy")
+    rnd = random.Random(seed)
+    for _ in range(300):
+        start = rnd.randrange(utc(2024, 1, 1), utc(2026, 1, 1))
+        if rnd.random() < 0.5:
+            start -= start % 1800  # on the half hour, like the changes themselves
+        rule = rnd.choice(EXPANDED_RULES)
+        if rnd.random() < 0.3:
+            skipped = _expand(rule, start, start, start + 90 * 86400, zone)[1:6:2]
+            rule = RecurrenceRule(rule.freq, rule.interval, rule.weekdays, rule.until,
+                                  rule.count, skipped)
+        window_start = start + rnd.randrange(-200, 300) * 86400 + rnd.randrange(86400)
+        window_end = window_start + rnd.randrange(400) * 86400
+        expected = _expand(rule, start, window_start, window_end, zone)
+        assert rule.occurrences(start, window_start, window_end, zone).tolist() == list(expected)
+
+
+@pytest.mark.parametrize("name", ["Europe/Berlin", "America/New_York", "Australia/Lord_Howe",
+                                  "UTC"])
+def test_bulk_expansion_matches_stepping(name):
+    check_expansion(get_zone(name), name)
+
+
+def forget_system_zone():
+    time.tzset()
+    for cached in (offset_table, _expand, _window_days):
+        cached.cache_clear()
+
+
+def test_bulk_expansion_matches_stepping_in_system_zone(monkeypatch):
+    monkeypatch.setenv("TZ", "Europe/Berlin")
+    forget_system_zone()
+    try:
+        check_expansion(None, "system")
+    finally:
+        monkeypatch.undo()
+        forget_system_zone()
+
+
+@pytest.mark.parametrize("local", [datetime(2025, 3, 30, 1, 30), datetime(2025, 3, 30, 3, 30),
+                                   datetime(2025, 10, 26, 2, 30)])
+def test_bulk_expansion_starting_at_a_change(local):
+    pytest.importorskip("numpy")
+    window = utc(2025, 1, 1), utc(2026, 1, 1)
+    for start in {local_timestamp(local, BERLIN), local_timestamp(local, BERLIN) + 3600}:
+        for rule in EXPANDED_RULES:
+            expected = _expand(rule, start, *window, BERLIN)
+            assert rule.occurrences(start, *window, BERLIN).tolist() == list(expected)
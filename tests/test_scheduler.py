@@ -0,0 +1,105 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from engine import AlarmEngine
+from recurrence import DAILY_RULE, MINUTELY, ONCE_RULE, WEEKDAYS, WEEKLY, RecurrenceRule
+from scheduler import WHEEL_LEVELS, AlarmScheduler, TimingWheelScheduler
+
+DAY_LEVEL_SECONDS = WHEEL_LEVELS[-1][0] * WHEEL_LEVELS[-1][1]
+# Ten minutes before the day level wraps, when the overflow is sorted back in
+START = (1_750_000_000 // DAY_LEVEL_SECONDS + 1) * DAY_LEVEL_SECONDS - 600
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_wheel_matches_heap(seed):
+    # Random schedules, reschedules, cancels and clock advances, mostly
+    # stepped through the wheel's levels and now and then a jump that
+    # rebuilds it; both schedulers must agree on every answer
+    rnd = random.Random(seed)
+    heap, wheel = AlarmScheduler(), TimingWheelScheduler(START)
+    now = START
+    for _ in range(3000):
+        action = rnd.random()
+        alarm_id = rnd.randrange(200)
+        if action < 0.45:
+            reach = rnd.choice((5, 90, 7200, 3 * 86400, DAY_LEVEL_SECONDS * 2))
+            when = now + rnd.randrange(-30, reach)
+            heap.schedule(alarm_id, when)
+            wheel.schedule(alarm_id, when)
+        elif action < 0.6:
+            heap.cancel(alarm_id)
+            wheel.cancel(alarm_id)
+        elif action < 0.62:
+            entries = [(rnd.randrange(200), now + rnd.randrange(1, 600)) for _ in range(50)]
+            heap.schedule_many(entries)
+            wheel.schedule_many(entries)
+        elif action < 0.99:
+            now += rnd.choice((0, 1, 1, 2, 7, 59, 61, 600, 1800, 3600))
+            assert sorted(wheel.pop_due(now)) == sorted(heap.pop_due(now))
+        else:
+            now += rnd.choice((3601, 90000))  # a suspend; the wheel is rebuilt
+            assert sorted(wheel.pop_due(now)) == sorted(heap.pop_due(now))
+        assert wheel.next_deadline() == heap.next_deadline()
+        assert len(wheel) == len(heap)
+        assert (alarm_id in wheel) == (alarm_id in heap)
+
+
+def test_wheel_cascades_every_level():
+    # One alarm per level, each popped at exactly its second
+    wheel = TimingWheelScheduler(START)
+    deadlines = [START + 30, START + 45 * 60 + 7, START + 5 * 3600 + 61,
+                 START + 20 * 86400 + 3601, START + 100 * 86400 + 1]
+    wheel.schedule_many(enumerate(deadlines))
+    for alarm_id, when in enumerate(deadlines):
+        assert wheel.next_deadline() == when
+        assert wheel.pop_due(when - 1) == []
+        assert wheel.pop_due(when) == [alarm_id]
+    assert len(wheel) == 0 and wheel.next_deadline() is None
+
+
+def test_overflow_comes_back_when_the_day_level_wraps():
+    wheel = TimingWheelScheduler(START)
+    far = START + DAY_LEVEL_SECONDS + 86400  # beyond the day level, in the overflow
+    wheel.schedule(1, far)
+    wheel.schedule(2, START + 300)
+    assert wheel.pop_due(START + 900) == [2]  # steps across the wrap
+    assert wheel.next_deadline() == far
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_engines_ring_the_same_alarms_whatever_the_scheduler(seed):
+    # The batch scheduler scans the store instead of keeping its own
+    # deadlines, so it is compared through the engine: the same adds,
+    # removes, snoozes, stops and ticks must ring the same alarms
+    rnd = random.Random(seed)
+    engines = [AlarmEngine(), AlarmEngine(batch=True), AlarmEngine(wheel=True)]
+    rules = [DAILY_RULE, ONCE_RULE, RecurrenceRule(MINUTELY, interval=7),
+             RecurrenceRule(WEEKLY, weekdays=WEEKDAYS)]
+    now = datetime.now().replace(microsecond=0)
+    ringing = []
+    for _ in range(400):
+        action = rnd.random()
+        if action < 0.3:
+            when = now + timedelta(seconds=rnd.randrange(-60, 3 * 3600))
+            rule, snooze = rnd.choice(rules), rnd.randrange(3)
+            for engine in engines:
+                engine.add(when, "a.wav", snooze_duration=snooze, rule=rule)
+        elif action < 0.4 and len(engines[0]):
+            alarm_id = rnd.choice([alarm.id for alarm in engines[0]])
+            for engine in engines:
+                engine.remove(alarm_id)
+        elif action < 0.55 and ringing:
+            alarm_id = ringing.pop(rnd.randrange(len(ringing)))
+            method = rnd.choice(("snooze", "stop"))
+            assert len({getattr(engine, method)(alarm_id, now) for engine in engines}) == 1
+        else:
+            now += timedelta(seconds=rnd.choice((1, 30, 59, 60, 300, 1800)))
+            fired = [sorted(alarm.id for alarm in engine.tick(now)) for engine in engines]
+            assert fired[1] == fired[0] and fired[2] == fired[0]
+            ringing = sorted(set(ringing) | set(fired[0]))
+        deadlines = [engine.next_deadline() for engine in engines]
+        assert deadlines[2] == deadlines[0]
+        # The batch scheduler may wake early after a reschedule, never late
+        assert deadlines[0] is None or deadlines[1] <= deadlines[0]
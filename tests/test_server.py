@@ -0,0 +1,159 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from engine import AlarmEngine
+from server import (INTERNAL_ERROR, INVALID_PARAMS, INVALID_REQUEST, MAX_SUBSCRIBER_BUFFER,
+                    METHOD_NOT_FOUND, PARSE_ERROR, AlarmServer)
+
+
+@pytest.fixture
+def server():
+    return AlarmServer(AlarmEngine(), audio=False)
+
+
+def call(server, method, params=None, request_id=1):
+    request = {"jsonrpc": "2.0", "id": request_id, "method": method}
+    if params is not None:
+        request["params"] = params
+    return json.loads(server.handle(json.dumps(request).encode()))
+
+
+def error_code(response):
+    assert "result" not in response
+    return response["error"]["code"]
+
+
+def soon():
+    return int(time.time()) + 3600
+
+
+def test_add_list_get_remove(server):
+    added = call(server, "add", {"time": soon(), "sound": "a.wav", "volume": 0, "snooze": 0})
+    alarm = added["result"]
+    assert (alarm["volume"], alarm["snooze"], alarm["sound"]) == (0, 0, "a.wav")
+    assert [a["key"] for a in call(server, "list")["result"]] == [alarm["key"]]
+    assert call(server, "get", {"key": alarm["key"]})["result"]["key"] == alarm["key"]
+    call(server, "remove", {"key": alarm["key"]})
+    assert call(server, "list")["result"] == []
+
+
+def test_notifications_get_no_reply(server):
+    assert server.handle(b'{"jsonrpc": "2.0", "method": "ping"}') is None
+
+
+@pytest.mark.parametrize("line, code", [
+    (b"{not json", PARSE_ERROR),
+    (b"\xff\xfe", PARSE_ERROR),
+    (b"[1, 2]", INVALID_REQUEST),
+    (b'{"id": 1}', INVALID_REQUEST),
+    (b'{"id": 1, "method": 5}', INVALID_REQUEST),
+    (b'{"id": 1, "method": "explode"}', METHOD_NOT_FOUND),
+    (b'{"id": 1, "method": "list", "params": [1]}', INVALID_PARAMS),
+    (b'{"id": 1, "method": "list", "params": {"verbose": true}}', INVALID_PARAMS),
+])
+def test_malformed_requests(server, line, code):
+    assert error_code(json.loads(server.handle(line))) == code
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"time": "tomorrow"},
+    {"time": 10 ** 30},
+    {"time": -5},
+    {"time": 1.0e300},
+    {"time": soon(), "volume": 300},
+    {"time": soon(), "volume": True},
+    {"time": soon(), "snooze": -1},
+    {"time": soon(), "snooze": [5]},
+    {"time": soon(), "sound": 7},
+    {"time": soon(), "rule": "FREQ=YEARLY"},
+    {"time": soon(), "zone": "Nowhere/Special"},
+    {"time": soon(), "colour": "red"},
+])
+def test_bad_alarms_are_rejected_without_side_effects(server, params):
+    assert error_code(call(server, "add", params)) == INVALID_PARAMS
+    assert len(server.engine) == 0
+    when = soon()
+    alarm = call(server, "add", {"time": when})["result"]
+    assert alarm["fire_time"] == when
+    assert len(server.engine) == 1
+
+
+def test_add_many_is_all_or_nothing(server):
+    good = {"time": soon(), "sound": "a.wav"}
+    for alarms in ([good, {"time": soon(), "volume": 101}], [good, 5], {"time": soon()}):
+        assert error_code(call(server, "add_many", {"alarms": alarms})) == INVALID_PARAMS
+    assert len(server.engine) == 0
+    assert len(call(server, "add_many", {"alarms": [good] * 3})["result"]) == 3
+
+
+@pytest.mark.parametrize("method", ["get", "remove", "snooze", "stop"])
+def test_unknown_keys(server, method):
+    assert error_code(call(server, method, {"key": 12345})) == INVALID_PARAMS
+    assert error_code(call(server, method, {"key": "twelve"})) == INVALID_PARAMS
+    assert error_code(call(server, method)) == INVALID_PARAMS
+
+
+def test_os_errors_are_internal_errors(server, monkeypatch):
+    def broken(writer):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(server, "rpc_list", broken)
+    response = call(server, "list")
+    assert error_code(response) == INTERNAL_ERROR
+    assert "disk full" in response["error"]["message"]
+
+
+def test_connection_survives_bad_requests(server, tmp_path):
+    path = str(tmp_path / "alarms.sock")
+
+    async def session():
+        listener = await asyncio.start_unix_server(server._client, path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        replies = []
+        for line in (b"{oops\n", b'{"id": 2, "method": "add", "params": {"volume": 300}}\n',
+                     b'{"id": 3, "method": "ping"}\n'):
+            writer.write(line)
+            await writer.drain()
+            replies.append(json.loads(await asyncio.wait_for(reader.readline(), 5)))
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return replies
+
+    parse, params, ping = asyncio.run(session())
+    assert error_code(parse) == PARSE_ERROR
+    assert (params["id"], error_code(params)) == (2, INVALID_PARAMS)
+    assert ping["id"] == 3 and isinstance(ping["result"], float)
+
+
+class StalledTransport:
+    # Transport of a subscriber that stopped reading
+    aborted = False
+
+    def get_write_buffer_size(self):
+        return MAX_SUBSCRIBER_BUFFER + 1
+
+    def abort(self):
+        self.aborted = True
+
+
+class StalledWriter:
+    def __init__(self):
+        self.transport = StalledTransport()
+
+    def write(self, data):
+        raise AssertionError("nothing is written to a stalled subscriber")
+
+
+def test_stalled_subscribers_are_dropped_and_reported(server, capsys):
+    writer = StalledWriter()
+    server.subscribers[writer] = {"added"}
+    call(server, "add", {"time": soon()})
+    assert writer not in server.subscribers
+    assert writer.transport.aborted
+    out, err = capsys.readouterr()
+    assert "Dropping a subscriber" in err and out == ""
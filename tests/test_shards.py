@@ -0,0 +1,71 @@
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from recurrence import ONCE_RULE
+from shards import ShardedScheduler
+
+MOVED_KEY = 4000  # its bucket goes to the new shard when a second one is added
+KEPT_KEY = 1
+
+
+@pytest.fixture
+def fired():
+    return queue.Queue()
+
+
+@pytest.fixture
+def scheduler(fired):
+    scheduler = ShardedScheduler(1, lambda rows: [fired.put(row) for row in rows], max_shards=3)
+    yield scheduler
+    scheduler.close()
+
+
+def add_with_key(scheduler, key, when, **fields):
+    scheduler.next_key = key
+    return scheduler.add(when, None, **fields)
+
+
+def test_ringing_alarms_can_be_snoozed_after_moving(scheduler, fired):
+    due = datetime.fromtimestamp(int(time.time()) + 1)
+    for key in (MOVED_KEY, KEPT_KEY):
+        add_with_key(scheduler, key, due, rule=ONCE_RULE)
+    rung = {fired.get(timeout=5)[0] for _ in range(2)}
+    assert rung == {MOVED_KEY, KEPT_KEY}
+    scheduler.add_shard()
+    for key in (MOVED_KEY, KEPT_KEY):
+        scheduler.snooze(key)
+    snoozed = {key: scheduler.row(key)[2] for key in (MOVED_KEY, KEPT_KEY)}
+    assert snoozed[MOVED_KEY] > time.time()
+    assert snoozed[KEPT_KEY] > time.time()
+
+
+def test_rebalancing_keeps_every_alarm(scheduler):
+    start = int((datetime.now() + timedelta(days=1)).timestamp())
+    keys = scheduler.add_many([(start + i, None, 5, True, 100, ONCE_RULE, None)
+                               for i in range(5000)])
+    counts = []
+    counting = True
+
+    def count():
+        while counting:
+            counts.append(len(scheduler))
+
+    counter = threading.Thread(target=count)
+    counter.start()
+    try:
+        scheduler.add_shard()
+        scheduler.add_shard()
+        for key in keys[::2]:
+            scheduler.remove(key)
+        scheduler.remove_shard()
+    finally:
+        counting = False
+        counter.join()
+    assert len(scheduler) == 2500
+    assert all(isinstance(n, int) for n in counts)
+    assert scheduler.row(keys[0]) is None
+    assert scheduler.row(keys[1])[8] == start + 1
@@ -0,0 +1,84 @@
+import os
+import threading
+import wave
+
+import pytest
+
+from conftest import AUDIO_RATE
+from soundbank import SoundBank
+from streaming import SoundStream
+
+SECOND_BYTES = AUDIO_RATE * 2  # signed 16-bit mono, as the audio fixture opens the mixer
+
+
+def write_wav(path, seconds, level=0):
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(AUDIO_RATE)
+        out.writeframes(level.to_bytes(2, "little", signed=True) * int(AUDIO_RATE * seconds))
+    return str(path)
+
+
+@pytest.fixture
+def bank(audio):
+    bank = SoundBank(budget_bytes=int(SECOND_BYTES * 1.25))  # two half-second sounds
+    yield bank
+    bank.shutdown()
+
+
+def test_decoded_sounds_are_kept_least_recently_used(bank, tmp_path):
+    a, b, c = (write_wav(tmp_path / f"{name}.wav", 0.5) for name in "abc")
+    first = bank.get(a)
+    assert bank.get(a) is first  # decoded once
+    bank.get(b)
+    bank.get(a)
+    bank.get(c)  # over budget; b is the least recently used
+    assert a in bank and c in bank and b not in bank
+    assert bank.size_bytes == pytest.approx(SECOND_BYTES, abs=4)
+
+
+def test_edited_files_are_decoded_again(bank, tmp_path):
+    path = write_wav(tmp_path / "a.wav", 0.5)
+    old = bank.get(path)
+    write_wav(path, 0.25, level=1000)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))  # whatever the clock's grain
+    new = bank.get(path)
+    assert new is not old and new.get_length() == pytest.approx(0.25, abs=0.01)
+    assert bank.size_bytes == pytest.approx(SECOND_BYTES / 4, abs=4)  # the old one is dropped
+
+
+def test_preload_decodes_in_the_background(bank, tmp_path):
+    path = write_wav(tmp_path / "a.wav", 0.5)
+    future = bank.preload(path)
+    sound = future.result(5)
+    assert path in bank and bank.get(path) is sound
+    assert bank.preload(path) is None  # nothing left to do
+
+
+def test_unplayable_sounds_raise_value_error(bank, tmp_path):
+    broken = tmp_path / "broken.wav"
+    broken.write_bytes(b"RIFF not really a wave file" * 100)
+    missing = str(tmp_path / "missing.wav")
+    for path in (str(broken), missing):
+        with pytest.raises(ValueError):
+            bank.check(path)
+    errors = []
+    reported = threading.Event()
+    bank.check_later(missing, errors.append)
+    bank.check_later(str(broken), lambda message: (errors.append(message), reported.set()))
+    assert reported.wait(5)
+    assert len(errors) == 2 and "missing.wav" in errors[0] and "broken.wav" in errors[1]
+
+
+def test_large_files_are_streamed_not_kept(audio, tmp_path):
+    path = write_wav(tmp_path / "long.wav", 2)
+    bank = SoundBank(stream_bytes=SECOND_BYTES)
+    try:
+        sound = bank.get(path)
+        assert isinstance(sound, SoundStream)
+        assert sound.get_length() == pytest.approx(2, abs=0.01)
+        assert path not in bank and bank.size_bytes == 0
+    finally:
+        bank.shutdown()
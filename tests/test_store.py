@@ -0,0 +1,116 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from engine import AlarmEngine
+from recurrence import DAILY_RULE, ONCE_RULE
+from store import MAX_TIME, AlarmStore
+
+COLUMNS = ("fire_time", "start_time", "snoozed_until", "last_triggered", "snooze_minutes",
+           "volume", "sound_id", "rule_id", "zone_id", "flags", "key")
+
+
+def column_lengths(store):
+    return {len(getattr(store, name)) for name in COLUMNS}
+
+
+@pytest.mark.parametrize("fields", [
+    {"volume": 300},
+    {"volume": -1},
+    {"snooze_duration": 65536},
+    {"snooze_duration": 2.5},
+    {"key": -1},
+])
+def test_add_rejects_values_out_of_range(fields):
+    store = AlarmStore()
+    start = int(time.time()) + 3600
+    with pytest.raises(ValueError):
+        store.add(start, "a.wav", **fields)
+    assert column_lengths(store) == {0}
+    assert len(store) == 0
+
+
+@pytest.mark.parametrize("start", [0, MAX_TIME + 1, 10 ** 20])
+def test_add_rejects_times_out_of_range(start):
+    store = AlarmStore()
+    with pytest.raises(ValueError):
+        store.add(start, "a.wav")
+    assert column_lengths(store) == {0}
+
+
+def test_failed_add_leaves_next_alarm_intact():
+    engine = AlarmEngine()
+    when = datetime.now().replace(second=0, microsecond=0) + timedelta(hours=1)
+    with pytest.raises(ValueError):
+        engine.add(when, "a.wav", volume=300)
+    alarm = engine.add(when, "b.wav", volume=40)
+    assert alarm.id == 0
+    assert alarm.time == when
+    assert (alarm.sound, alarm.volume) == ("b.wav", 40)
+    assert engine.store.row(alarm.id)[0] == 1  # the failed add used up no key
+
+
+def test_add_many_adds_nothing_if_one_record_is_bad():
+    store = AlarmStore()
+    start = int(time.time()) + 3600
+    store.add(start, "a.wav")
+    records = [(start, "b.wav", 5, True, 50, 10, DAILY_RULE, None),
+               (start, "b.wav", 5, True, 500, 11, DAILY_RULE, None)]
+    with pytest.raises(ValueError):
+        store.add_many(records)
+    assert column_lengths(store) == {1}
+    ids = store.add_many(records[:1] * 3)
+    assert list(ids) == [1, 2, 3]
+    assert column_lengths(store) == {4}
+
+
+def test_elapsed_and_next_wake():
+    store = AlarmStore()
+    now = int(time.time())
+    soon = store.add(now + 60, "a.wav", rule=ONCE_RULE)
+    later = store.add(now + 120, "a.wav", rule=ONCE_RULE)
+    disabled = store.add(now + 30, "a.wav", enabled=False, rule=ONCE_RULE)
+    assert store.next_wake() == now + 60
+    assert store.next_wake({soon}) == now + 120
+    assert store.elapsed_ids(now + 90) == [soon]
+    assert store.elapsed_ids(now + 200, {soon}) == [later]
+    store.remove(soon)
+    assert store.next_wake() == now + 120
+    assert store.elapsed_ids(now + 200) == [later]
+    assert disabled not in store.elapsed_ids(now + 200)
+
+
+def test_engine_fires_and_moves_on():
+    engine = AlarmEngine()
+    due = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=5)
+    alarm = engine.add(due, "a.wav")
+    assert engine.tick(due - timedelta(seconds=1)) == []
+    assert engine.tick(due) == [alarm]
+    assert alarm.is_playing
+    engine.snooze(alarm.id, due)
+    assert engine.next_deadline() == due + timedelta(minutes=alarm.snooze_duration)
+    engine.stop(alarm.id, due + timedelta(minutes=5))
+    assert alarm.time == due + timedelta(days=1)
+
+
+@pytest.mark.parametrize("scheduler", [{}, {"batch": True}, {"wheel": True}])
+def test_restore_holds_back_alarms_outside_the_window(scheduler):
+    engine = AlarmEngine(**scheduler)
+    now = datetime.now()
+    rows = []
+    for key, hours in ((1, 2), (2, 72)):
+        start = int((now + timedelta(hours=hours)).timestamp())
+        rows.append((key, start, 0, 0, "a.wav", 5, 0, True, start, "FREQ=WEEKLY", None))
+    alarms = engine.restore(rows, now, until=now + timedelta(hours=24))
+    assert len(alarms) == len(engine) == 2
+    assert engine.pending == {alarms[1].id}
+    assert engine.next_deadline().timestamp() == rows[0][1]
+    # A held back alarm does not ring until it is scheduled, whichever
+    # scheduler finds the due alarms
+    assert engine.tick(datetime.fromtimestamp(rows[1][1])) == [alarms[0]]
+    assert not alarms[1].is_playing
+    assert engine.schedule_pending(now + timedelta(days=2)) == []
+    assert engine.schedule_pending(now + timedelta(days=4)) == [alarms[1]]
+    assert engine.pending == set()
+    assert alarms[1].volume == 0
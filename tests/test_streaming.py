@@ -0,0 +1,79 @@
+import struct
+import time
+
+import pytest
+
+from conftest import AUDIO_RATE
+from streaming import CHUNK_SECONDS, SoundStream, native_layout, open_stream, wav_layout
+
+
+def write_wav(path, seconds, channels=1, bits=16, rate=AUDIO_RATE, tag=1, extra=b"",
+              cut=0):
+    # A WAV written by hand, so that odd layouts can be made: extra is put
+    # in a chunk of its own ahead of the data, and cut bytes are left off
+    # the end while the header still counts them
+    frame = channels * bits // 8
+    data = bytes(int(rate * seconds) * frame)
+    fmt = struct.pack("<HHIIHH", tag, channels, rate, rate * frame, frame, bits)
+    chunks = b"fmt " + struct.pack("<I", len(fmt)) + fmt
+    if extra:
+        chunks += b"LIST" + struct.pack("<I", len(extra)) + extra + b"\0" * (len(extra) % 2)
+    chunks += b"data" + struct.pack("<I", len(data)) + data[:len(data) - cut]
+    path.write_bytes(b"RIFF" + struct.pack("<I", 4 + len(chunks)) + b"WAVE" + chunks)
+    return str(path)
+
+
+def test_wav_layout(tmp_path):
+    path = write_wav(tmp_path / "odd.wav", 1, channels=2, extra=b"odd")
+    channels, rate, width, offset, size = wav_layout(path)
+    assert (channels, rate, width, size) == (2, AUDIO_RATE, 2, AUDIO_RATE * 4)
+    with open(path, "rb") as f:
+        f.seek(offset - 8)
+        assert f.read(4) == b"data"
+    # A data size that runs past the end of a file cut short is clipped
+    assert wav_layout(write_wav(tmp_path / "cut.wav", 1, cut=100))[4] == AUDIO_RATE * 2 - 100
+    # Only integer PCM of 8 or 16 bits
+    assert wav_layout(write_wav(tmp_path / "float.wav", 1, bits=32, tag=3)) is None
+    assert wav_layout(write_wav(tmp_path / "24.wav", 1, bits=24)) is None
+    (tmp_path / "sound.mp3").write_bytes(b"ID3" + bytes(100))
+    assert wav_layout(str(tmp_path / "sound.mp3")) is None
+
+
+def test_only_the_mixers_own_format_is_native(audio, tmp_path):
+    assert native_layout(write_wav(tmp_path / "native.wav", 0.1)) is not None
+    assert native_layout(write_wav(tmp_path / "stereo.wav", 0.1, channels=2)) is None
+    assert native_layout(write_wav(tmp_path / "8bit.wav", 0.1, bits=8)) is None
+    assert native_layout(write_wav(tmp_path / "44k.wav", 0.1, rate=44100)) is None
+
+
+def play_out(player, channel, timeout):
+    deadline = time.monotonic() + timeout
+    while channel.get_busy() or player.active:
+        assert time.monotonic() < deadline, "the stream did not finish"
+        time.sleep(0.01)
+
+
+def test_stream_plays_every_chunk(audio, tmp_path):
+    import pygame
+    seconds = 3 * CHUNK_SECONDS + 0.2
+    stream = open_stream(write_wav(tmp_path / "long.wav", seconds))
+    assert isinstance(stream, SoundStream)
+    assert stream.get_length() == pytest.approx(seconds)
+    channel = pygame.mixer.Channel(0)
+    started = time.monotonic()
+    player = stream.play(channel)
+    play_out(player, channel, seconds + 5)
+    assert time.monotonic() - started >= seconds - 0.1  # nothing was skipped
+
+
+def test_stopped_stream_queues_nothing_more(audio, tmp_path):
+    import pygame
+    stream = open_stream(write_wav(tmp_path / "long.wav", 10 * CHUNK_SECONDS))
+    channel = pygame.mixer.Channel(0)
+    player = stream.play(channel)
+    time.sleep(CHUNK_SECONDS / 2)
+    player.stop()
+    channel.stop()
+    play_out(player, channel, 1)
+    time.sleep(CHUNK_SECONDS)
+    assert not channel.get_busy()
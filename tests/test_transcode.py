@@ -0,0 +1,54 @@
+import struct
+import wave
+
+import pytest
+
+from conftest import AUDIO_RATE
+from transcode import SoundCache
+
+pygame = pytest.importorskip("pygame")
+
+SAMPLES = (0, 16384, -16384, 32767, -32768)
+
+
+def decoded(path, size):
+    # Samples of path as the mixer holds them
+    raw = pygame.mixer.Sound(str(path)).get_raw()
+    code = {-8: "b", 8: "B", -16: "h", 16: "H"}[size]
+    return struct.unpack(f"<{len(raw) // struct.calcsize(code)}{code}", raw)
+
+
+def write_wav(path, samples, width=2):
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(width)
+        out.setframerate(AUDIO_RATE)
+        out.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+
+
+@pytest.mark.parametrize("audio", [-8, 8, -16, 16], indirect=True)
+def test_cached_copy_sounds_like_the_original(audio, tmp_path):
+    # Whatever the sign of the mixer's samples, the cached WAV decodes back
+    # to what the mixer made of the original, give or take SDL's rounding
+    source = tmp_path / "tone.wav"
+    write_wav(source, SAMPLES * 200)
+    if audio[1] == -16:
+        # Already in the mixer's format, so used as it is
+        assert SoundCache(str(tmp_path / "cache")).normalize(str(source)) == str(source)
+        source = tmp_path / "tone8.wav"
+        write_wav(source, [128, 192, 64] * 200, width=1)
+    target = SoundCache(str(tmp_path / "cache")).normalize(str(source))
+    assert target != str(source)
+    size = audio[1]
+    original, cached = decoded(source, size), decoded(target, size)
+    assert len(original) == len(cached)
+    assert max(abs(a - b) for a, b in zip(original, cached)) <= 2
+
+
+@pytest.mark.parametrize("audio", [-8], indirect=True)
+def test_signed_8_bit_mixer_writes_unsigned_wav(audio, tmp_path):
+    source = tmp_path / "silence.wav"
+    write_wav(source, [0] * 100)
+    with wave.open(SoundCache(str(tmp_path / "cache")).normalize(str(source)), "rb") as cached:
+        assert cached.getsampwidth() == 1
+        assert set(cached.readframes(100)) == {128}
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from engine import AlarmEngine
+from recurrence import ONCE_RULE, WEEKLY, RecurrenceRule
+from transfer import engine_rows, export_alarms, import_alarms
+
+
+def always(path):
+    return True
+
+
+def saved(engine):
+    # What an export keeps of each alarm: start, sound, snooze, volume,
+    # enabled, rule and zone
+    return sorted((row[8], row[4], row[5], row[6], row[7], row[9], row[10])
+                  for row in engine_rows(engine))
+
+
+@pytest.fixture
+def engine():
+    engine = AlarmEngine()
+    start = datetime.now().replace(second=0, microsecond=0) + timedelta(days=1)
+    weekly = RecurrenceRule(WEEKLY, interval=2, weekdays=0b0010101, count=20,
+                            exdates=[int((start + timedelta(days=14)).timestamp())])
+    engine.add(start, "/sounds/bell, loud.wav")
+    engine.add(start + timedelta(hours=1), "quiet.wav", snooze_duration=0, volume=0)
+    engine.add(start + timedelta(hours=2), None, enabled=False, rule=ONCE_RULE)
+    engine.add(start + timedelta(hours=3), "week.mp3", volume=35, rule=weekly)
+    engine.add(datetime(2031, 3, 30, 2, 30), "tokyo.wav", snooze_duration=9,
+               rule=RecurrenceRule(WEEKLY, weekdays=0b1100000, until=1956528000),
+               zone="Asia/Tokyo")
+    return engine
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl", ".ics"])
+def test_round_trip(engine, tmp_path, suffix):
+    path = tmp_path / ("alarms" + suffix)
+    assert export_alarms(engine_rows(engine), str(path)) == len(engine)
+    copy = AlarmEngine()
+    assert import_alarms(copy, str(path), always) == (len(engine), 0, [])
+    assert saved(copy) == saved(engine)
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".jsonl", ".ics"])
+def test_missing_sounds_are_skipped(engine, tmp_path, suffix):
+    path = tmp_path / ("alarms" + suffix)
+    export_alarms(engine_rows(engine), str(path))
+    copy = AlarmEngine()
+    imported, skipped, rejected = import_alarms(copy, str(path), lambda p: p != "quiet.wav")
+    assert (imported, skipped, rejected) == (4, 1, [])
+    assert "quiet.wav" not in {alarm.sound for alarm in copy}
+
+
+def test_bad_csv_rows_are_rejected_by_line(tmp_path):
+    path = tmp_path / "alarms.csv"
+    path.write_text(
+        "time,sound,snooze,volume,enabled,rule,zone\n"
+        "2030-01-01T07:00,a.wav,5,50,1,FREQ=DAILY,\n"
+        "2030-01-01T07:00,a.wav,5,300,1,FREQ=DAILY,\n"
+        "tomorrow,a.wav,5,50,1,FREQ=DAILY,\n"
+        "2030-01-01T07:00,a.wav,5,50,1,FREQ=YEARLY,\n"
+        "2030-01-01T07:00,a.wav,5,50,1,FREQ=DAILY,Nowhere/Special\n"
+        "2030-01-01T08:00,b.wav,0,0,0,FREQ=ONCE,Europe/Paris\n"
+        "2030-01-01T07:00+01:00,a.wav,5,50,1,FREQ=DAILY,Bogus/Zone\n"
+        "2030-01-01T07:00,a.wav,5,50,1,\"FREQ=WEEKLY;BYDAY=MO,XX\",\n")
+    engine = AlarmEngine()
+    imported, skipped, rejected = import_alarms(engine, str(path), always)
+    assert (imported, skipped) == (2, 0)
+    assert [message.split(":")[0] for message in rejected] == [
+        "line 3", "line 4", "line 5", "line 6", "line 8", "line 9"]
+    assert "Bogus/Zone" in rejected[4]
+    assert "'XX'" in rejected[5]
+    assert sorted((alarm.sound, alarm.volume, alarm.snooze_duration) for alarm in engine) == [
+        ("a.wav", 50, 5), ("b.wav", 0, 0)]
+
+
+def test_bad_jsonl_lines_are_rejected_by_line(tmp_path):
+    path = tmp_path / "alarms.jsonl"
+    path.write_text(
+        '{"time": "2030-01-01T07:00", "sound": "a.wav"}\n'
+        "not json\n"
+        '{"sound": "a.wav"}\n'
+        '{"time": "2030-01-01T07:00", "sound": "a.wav", "snooze": -5}\n'
+        "\n"
+        '{"time": "2030-01-01T09:00", "sound": "a.wav", "volume": 0}\n')
+    engine = AlarmEngine()
+    imported, skipped, rejected = import_alarms(engine, str(path), always)
+    assert imported == 2
+    assert [message.split(":")[0] for message in rejected] == ["line 2", "line 3", "line 4"]
+    assert sorted(alarm.volume for alarm in engine) == [0, 100]
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        import_alarms(AlarmEngine(), str(tmp_path / "alarms.txt"), always)
+
+
+def test_bad_zone_after_a_full_batch_imports_nothing_more(tmp_path):
+    # Every row is checked as it is read, so a bad row late in the file
+    # never stops the import with earlier batches already added
+    path = tmp_path / "alarms.csv"
+    good = "2030-01-01T07:00+01:00,a.wav,5,50,1,FREQ=DAILY,Europe/Paris\n"
+    path.write_text("time,sound,snooze,volume,enabled,rule,zone\n" + good * 5
+                    + "2030-01-01T07:00+01:00,a.wav,5,50,1,FREQ=DAILY,Bogus/Zone\n" + good)
+    engine = AlarmEngine()
+    imported, skipped, rejected = import_alarms(engine, str(path), always, batch_size=2)
+    assert (imported, skipped, len(rejected)) == (6, 0, 1)
+    assert len(engine) == 6
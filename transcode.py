@@ -0,0 +1,145 @@
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import wave
+
+from streaming import native_layout, wav_layout
+
+DEFAULT_DIRECTORY = os.path.join(os.path.expanduser("~"), ".pookie_clock", "sounds")
+
+# Normalized copies are deleted least recently used once they take more
+DEFAULT_BUDGET_BYTES = 2 * 1024 * 1024 * 1024
+
+HASH_BLOCK_BYTES = 1024 * 1024
+
+# Maps each byte to itself with the top bit flipped, which turns signed
+# samples into unsigned ones and back
+SIGN_FLIP = bytes(range(128, 256)) + bytes(range(128))
+
+# Bytes decoded by probe() to tell whether a file can be played
+PROBE_BYTES = 256 * 1024
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def probe(path):
+    # Raise ValueError unless path can be played, decoding no more than its
+    # first PROBE_BYTES. For files that are streamed rather than converted,
+    # where decoding all of the file would cost memory in proportion to it.
+    import pygame  # imported on first use to keep it off the start-up path
+    try:
+        if wav_layout(path) is not None:
+            return  # integer PCM, which the mixer always plays
+        with open(path, "rb") as f:
+            head = f.read(PROBE_BYTES)
+    except OSError as e:
+        raise ValueError(f"Cannot open sound {path}: {e.strerror}") from e
+    try:
+        sound = pygame.mixer.Sound(file=io.BytesIO(head))
+    except pygame.error as e:
+        raise ValueError(f"Cannot play {os.path.basename(path)}: {e}") from e
+    if sound.get_length() <= 0:
+        raise ValueError(f"{os.path.basename(path)} contains no audio")
+
+
+class SoundCache:
+    # On-disk copies of sounds converted once to the open mixer's own rate,
+    # sample format and channel count, stored as WAV files named after a hash
+    # of the original's content and the format. Playing a normalized copy
+    # needs no decoding or resampling, and being decodable at all is checked
+    # when the copy is made: normalize() raises ValueError for a file that
+    # cannot be played. WAVs already in the mixer's format are used as they
+    # are. Safe to share between threads and processes.
+    def __init__(self, directory=DEFAULT_DIRECTORY, budget_bytes=DEFAULT_BUDGET_BYTES):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self._known = {}  # (path, mtime, size) -> normalized path
+        self._lock = threading.Lock()
+
+    def normalize(self, path):
+        # Path of a copy of path in the mixer's format, made if need be
+        import pygame  # imported on first use to keep it off the start-up path
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            raise ValueError(f"Cannot open sound {path}: {e.strerror}") from e
+        known = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            target = self._known.get(known)
+        if target is not None and os.path.exists(target):
+            return target
+        if os.path.dirname(path) == os.path.abspath(self.directory) or native_layout(path):
+            target = path
+        else:
+            frequency, size, channels = pygame.mixer.get_init()
+            # Named after the WAV's own sample format, which is unsigned for
+            # 8 bits and signed for 16 whatever the mixer's sign
+            sign = "u" if abs(size) == 8 else "s"
+            name = f"{file_digest(path)}-{frequency}-{sign}{abs(size)}-{channels}.wav"
+            target = os.path.join(self.directory, name)
+            if os.path.exists(target):
+                os.utime(target)  # recently used, for pruning
+            else:
+                self._convert(path, target)
+                self.prune(keep=target)
+        with self._lock:
+            self._known[known] = target
+        return target
+
+    def _convert(self, path, target):
+        import pygame
+        try:
+            sound = pygame.mixer.Sound(path)
+        except pygame.error as e:
+            raise ValueError(f"Cannot play {os.path.basename(path)}: {e}") from e
+        if sound.get_length() <= 0:
+            raise ValueError(f"{os.path.basename(path)} contains no audio")
+        frequency, size, channels = pygame.mixer.get_init()
+        if abs(size) not in (8, 16):
+            raise ValueError(f"The mixer's {abs(size)}-bit samples cannot be cached as WAV")
+        raw = sound.get_raw()
+        if size == -8:
+            raw = raw.translate(SIGN_FLIP)  # 8-bit WAV samples are unsigned
+        elif size == 16:
+            raw = bytearray(raw)  # 16-bit ones signed; flip the high byte of each
+            raw[1::2] = raw[1::2].translate(SIGN_FLIP)
+        os.makedirs(self.directory, exist_ok=True)
+        # Written under a temporary name, so a reader never sees half a file
+        fd, temporary = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, "wb") as f, wave.open(f, "wb") as out:
+                out.setnchannels(channels)
+                out.setsampwidth(abs(size) // 8)
+                out.setframerate(frequency)
+                out.writeframes(raw)
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def prune(self, keep=None):
+        # Delete the least recently used copies beyond the byte budget, other
+        # than keep
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.name.endswith(".wav") and entry.is_file()]
+        except OSError:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        total = 0
+        for entry in entries:
+            total += entry.stat().st_size
+            if total > self.budget_bytes and entry.path != keep:
+                try:
+                    os.unlink(entry.path)
+                except OSError:
+                    pass
@@ -0,0 +1,311 @@
+import csv
+import json
+import os
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+
+from recurrence import ONCE, ONCE_RULE, STAMP_FORMAT, RecurrenceRule, parse_stamp, utc_stamp
+from store import check_fields
+from zones import get_zone, local_datetime, local_timestamp
+
+# Alarms parsed and inserted per batch; memory use is bounded by this, not
+# by the size of the file
+BATCH_SIZE = 10000
+
+FORMATS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl", ".ics": "ics"}
+
+# Columns of the CSV format; JSON Lines objects use the same names
+FIELDS = ("time", "sound", "snooze", "volume", "enabled", "rule", "zone")
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Longest iCalendar content line before it is folded, in characters
+ICS_LINE_LENGTH = 75
+
+# What a malformed row can raise while it is parsed
+ROW_ERRORS = (ValueError, TypeError, KeyError, AttributeError, OverflowError, OSError)
+
+
+def format_of(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f"Unsupported alarm file type: {extension or path}")
+    return FORMATS[extension]
+
+
+@lru_cache(maxsize=256)
+def _rule(text):
+    return RecurrenceRule.parse(text) if text else ONCE_RULE
+
+
+def _flag(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+@lru_cache(maxsize=4096)
+def _timestamp(text, zone=None):
+    # Rosters repeat the same few times, so parsing is cached. Times without
+    # a UTC offset are wall-clock times in zone.
+    moment = datetime.fromisoformat(text.strip())
+    if moment.tzinfo is None:
+        return local_timestamp(moment, get_zone(zone))
+    return int(moment.timestamp())
+
+
+@lru_cache(maxsize=4096)
+def _stamp(text, zone=None):
+    if zone and not text.endswith("Z"):
+        return local_timestamp(datetime.strptime(text, STAMP_FORMAT), get_zone(zone))
+    return parse_stamp(text)
+
+
+def _number(fields, name, default):
+    # A missing or blank field takes the default; 0 is kept
+    value = fields.get(name)
+    if value is None or value == "":
+        return default
+    return int(value)
+
+
+def _record(fields):
+    # (start_time, sound, snooze, enabled, volume, rule, zone) from a dict
+    # of FIELDS
+    zone = fields.get("zone") or None
+    return (_timestamp(str(fields["time"]), zone), fields.get("sound") or None,
+            _number(fields, "snooze", 5), _flag(fields.get("enabled", True)),
+            _number(fields, "volume", 100), _rule(fields.get("rule") or "FREQ=DAILY"), zone)
+
+
+# Readers yield (line number, row) pairs; a row becomes a record through
+# its format's parser in read_alarms(), where bad rows are dealt with
+
+def read_csv(stream):
+    reader = csv.reader(stream)
+    header = next(reader, None)
+    if header is None:
+        return
+    header = [name.strip().lower() for name in header]
+    if "time" not in header:
+        raise ValueError("CSV alarm file has no time column")
+    for row in reader:
+        if row:
+            yield reader.line_num, dict(zip(header, row))
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if line.strip():
+            yield number, line
+
+
+def _jsonl_record(line):
+    fields = json.loads(line)
+    if not isinstance(fields, dict):
+        raise ValueError("expected a JSON object")
+    return _record(fields)
+
+
+def _unfolded(stream):
+    # (line number, content line) with RFC 5545 folding (CRLF followed by a
+    # space) undone
+    line = start = None
+    for number, raw in enumerate(stream, 1):
+        raw = raw.rstrip("\r\n")
+        if raw[:1] in (" ", "\t") and line is not None:
+            line += raw[1:]
+            continue
+        if line:
+            yield start, line
+        line, start = raw, number
+    if line:
+        yield start, line
+
+
+def read_ics(stream):
+    # One alarm per VEVENT: DTSTART, RRULE and EXDATE give the time and
+    # recurrence, the ATTACH of an AUDIO VALARM gives the sound
+    event = None
+    for number, line in _unfolded(stream):
+        name, _, value = line.partition(":")
+        name, _, params = name.partition(";")
+        name = name.upper()
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event, start = {"exdate": []}, number
+        elif event is None:
+            continue
+        elif name == "END" and value.upper() == "VEVENT":
+            if "dtstart" in event:
+                yield start, event
+            event = None
+        elif name == "DTSTART":
+            event["dtstart"] = value
+            event["zone"] = _tzid(params)
+        elif name == "RRULE":
+            event["rrule"] = value
+        elif name == "EXDATE":
+            event["exdate"].append(value)
+        elif name == "ATTACH":
+            event["sound"] = value[7:] if value.startswith("file://") else value
+        elif name == "STATUS":
+            event["enabled"] = value.upper() != "CANCELLED"
+        elif name in ("X-SNOOZE", "X-VOLUME"):
+            event[name[2:].lower()] = value
+
+
+def _tzid(params):
+    for param in params.split(";"):
+        name, _, value = param.partition("=")
+        if name.upper() == "TZID":
+            return value.strip('"')
+    return None
+
+
+def _ics_record(event):
+    rule = event.get("rrule")
+    if event["exdate"]:
+        rule = f"{rule or 'FREQ=ONCE'};EXDATE={','.join(event['exdate'])}"
+    return (_stamp(event["dtstart"], event["zone"]), event.get("sound"),
+            _number(event, "snooze", 5), event.get("enabled", True), _number(event, "volume", 100),
+            _rule(rule), event["zone"])
+
+
+READERS = {"csv": (read_csv, _record), "jsonl": (read_jsonl, _jsonl_record),
+           "ics": (read_ics, _ics_record)}
+
+
+def read_alarms(path, rejected=None):
+    # Generator of alarm records, read lazily from a CSV, JSON Lines or
+    # iCalendar file. A row that cannot be parsed or holds values out of
+    # range raises ValueError naming its line, or, if rejected is a list, is
+    # skipped and its message appended there.
+    reader, parse = READERS[format_of(path)]
+    with open(path, newline="", encoding="utf-8") as stream:
+        for number, row in reader(stream):
+            try:
+                record = parse(row)
+                check_fields(record[0], record[2], record[4])
+                get_zone(record[6])  # times with a UTC offset never looked the zone up
+            except ROW_ERRORS as e:
+                message = f"line {number}: {e}"
+                if rejected is None:
+                    raise ValueError(message) from e
+                rejected.append(message)
+                continue
+            yield record
+
+
+def batches(records, size=BATCH_SIZE):
+    records = iter(records)
+    while True:
+        batch = list(islice(records, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_alarms(engine, path, sound_exists=os.path.isfile, batch_size=BATCH_SIZE):
+    # Stream the alarms in path into engine, one bulk insert per batch.
+    # Each distinct sound path is checked once; alarms whose sound is missing
+    # are skipped. Malformed rows are skipped too, so that one bad line does
+    # not leave half a file imported. Returns (number imported, number
+    # skipped for a missing sound, messages about rejected rows).
+    checked = {None: True}  # alarms without a sound ring silently
+    imported = skipped = 0
+    rejected = []
+    for batch in batches(read_alarms(path, rejected), batch_size):
+        valid = []
+        for record in batch:
+            sound = record[1]
+            if sound not in checked:
+                checked[sound] = sound_exists(sound)
+            if checked[sound]:
+                valid.append(record)
+        imported += len(engine.add_many(valid))
+        skipped += len(batch) - len(valid)
+    return imported, skipped, rejected
+
+
+def _fields(row):
+    # FIELDS of a store row (see AlarmStore.row())
+    (key, fire_time, snoozed_until, last_triggered, sound, snooze_minutes, volume, enabled,
+     start_time, rule, zone) = row
+    return {
+        "time": local_datetime(start_time, get_zone(zone)).strftime(TIME_FORMAT),
+        "sound": sound or "",
+        "snooze": snooze_minutes,
+        "volume": volume,
+        "enabled": int(enabled),
+        "rule": rule,
+        "zone": zone or "",
+    }
+
+
+def write_csv(stream, rows):
+    writer = csv.DictWriter(stream, FIELDS, lineterminator="\n")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(_fields(row))
+
+
+def write_jsonl(stream, rows):
+    for row in rows:
+        stream.write(json.dumps(_fields(row)) + "\n")
+
+
+def _fold(line):
+    parts = [line[i:i + ICS_LINE_LENGTH] for i in range(0, len(line), ICS_LINE_LENGTH)]
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def write_ics(stream, rows):
+    stream.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Pookie Clock//Alarms//EN\r\n")
+    for row in rows:
+        key, sound, snooze, volume, enabled, start, text, zone = (
+            row[0], row[4], row[5], row[6], row[7], row[8], row[9], row[10])
+        rule = _rule(text)
+        stamp = local_datetime(start, get_zone(zone)).strftime(STAMP_FORMAT)
+        dtstart = f"DTSTART;TZID={zone}:{stamp}" if zone else f"DTSTART:{stamp}"
+        lines = ["BEGIN:VEVENT", f"UID:alarm-{key}@pookie-clock", f"DTSTAMP:{utc_stamp(start)}",
+                 dtstart, "SUMMARY:Alarm"]
+        if rule.freq != ONCE:
+            rrule = RecurrenceRule(rule.freq, rule.interval, rule.weekdays, rule.until, rule.count)
+            lines.append(f"RRULE:{rrule}")
+        if rule.exdates:
+            lines.append("EXDATE:" + ",".join(map(utc_stamp, sorted(rule.exdates))))
+        if not enabled:
+            lines.append("STATUS:CANCELLED")
+        lines += [f"X-SNOOZE:{snooze}", f"X-VOLUME:{volume}",
+                  "BEGIN:VALARM", "ACTION:AUDIO", "TRIGGER:PT0S"]
+        if sound:
+            lines.append(f"ATTACH:{sound}")
+        lines += ["END:VALARM", "END:VEVENT"]
+        stream.write("".join(map(_fold, lines)))
+    stream.write("END:VCALENDAR\r\n")
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "ics": write_ics}
+
+
+def engine_rows(engine):
+    # Rows of every alarm in engine, for export_alarms() where there is no
+    # database (AlarmDatabase.rows()) to read them from
+    store = engine.store
+    return (store.row(alarm_id) for alarm_id in store)
+
+
+def export_alarms(rows, path):
+    # Write rows (see AlarmStore.row()) to path one at a time; returns the count
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    with open(path, "w", newline="", encoding="utf-8") as stream:
+        WRITERS[format_of(path)](stream, counted())
+    return count
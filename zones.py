@@ -0,0 +1,163 @@
+import bisect
+import time
+from array import array
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Transitions are indexed from the epoch up to this instant; times outside
+# the index ask zoneinfo directly
+INDEX_END = int(datetime(2100, 1, 1, tzinfo=timezone.utc).timestamp())
+
+# The index samples each zone's offset once a day and then bisects to the
+# exact second of every change, so zones are assumed to change their offset
+# at most once in any 24 hours
+SAMPLE_SECONDS = 86400
+
+LOCAL_EPOCH = datetime(1970, 1, 1)
+
+
+class ZoneIndex:
+    # The UTC offset history of one IANA zone as two parallel arrays: the
+    # instant each offset took effect and the offset in seconds. Converting
+    # between an instant and local wall-clock time is a bisect, with no
+    # zoneinfo call, so recurrence rules can step through days in any zone
+    # cheaply.
+    #
+    # Local times that do not map to exactly one instant are resolved like
+    # RFC 5545 does:
+    #   ambiguous (clocks go back, the hour happens twice): the first instant,
+    #       so a daily 02:30 alarm rings once on that day
+    #   nonexistent (clocks go forward, the hour is skipped): the offset from
+    #       before the gap, which moves the time later by the length of the
+    #       gap (02:30 rings at 03:30)
+    __slots__ = ("name", "zone", "starts", "offsets")
+
+    def __init__(self, name):
+        self.name = name
+        self.zone = ZoneInfo(name)
+        self.starts = array("q", [0])
+        self.offsets = array("l", [self._offset(0)])
+        # The scan steps a UTC time tagged with the zone through fromutc(),
+        # which is the cheapest way to ask zoneinfo for an offset
+        fromutc, step = self.zone.fromutc, timedelta(seconds=SAMPLE_SECONDS)
+        utc = LOCAL_EPOCH.replace(tzinfo=self.zone)
+        offset = fromutc(utc).utcoffset()
+        when = 0
+        while when < INDEX_END:
+            when += SAMPLE_SECONDS
+            utc += step
+            following = fromutc(utc).utcoffset()
+            if following != offset:
+                low, high = when - SAMPLE_SECONDS, when
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if self._offset(middle) == self.offsets[-1]:
+                        low = middle
+                    else:
+                        high = middle
+                self.starts.append(high)
+                self.offsets.append(self._offset(high))
+                offset = following
+
+    def __repr__(self):
+        return f"ZoneIndex({self.name!r})"
+
+    def _offset(self, epoch):
+        return int(datetime.fromtimestamp(epoch, self.zone).utcoffset().total_seconds())
+
+    def offset_at(self, epoch):
+        # UTC offset in seconds in effect at an instant
+        if 0 <= epoch < INDEX_END:
+            return self.offsets[bisect.bisect_right(self.starts, epoch) - 1]
+        return self._offset(epoch)
+
+    def to_local(self, epoch):
+        # Local wall-clock time as seconds since 1970-01-01 00:00 local
+        return epoch + self.offset_at(epoch)
+
+    def from_local(self, local):
+        # Inverse of to_local(), see the class comment for ambiguous and
+        # nonexistent times
+        before = self.offset_at(local - SAMPLE_SECONDS)
+        after = self.offset_at(local + SAMPLE_SECONDS)
+        for offset in sorted({before, after}, reverse=True):  # earliest instant first
+            if self.offset_at(local - offset) == offset:
+                return local - offset
+        return local - before
+
+
+@lru_cache(maxsize=None)
+def zone_index(name):
+    return ZoneIndex(name)
+
+
+def get_zone(name):
+    # ZoneIndex of an IANA zone name, or None for the system's local zone.
+    # Indexes are built once per zone and shared by every alarm in it.
+    if not name:
+        return None
+    try:
+        return zone_index(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {name}") from None
+
+
+def local_datetime(epoch, zone):
+    # Naive wall-clock datetime of an instant in zone (None: system zone)
+    if zone is None:
+        return datetime.fromtimestamp(epoch)
+    return LOCAL_EPOCH + timedelta(seconds=zone.to_local(epoch))
+
+
+def local_seconds(epoch, zone):
+    # Wall-clock time of an instant in zone as seconds since 1970-01-01 00:00
+    # local, like ZoneIndex.to_local()
+    if zone is None:
+        return (datetime.fromtimestamp(epoch) - LOCAL_EPOCH) // timedelta(seconds=1)
+    return zone.to_local(epoch)
+
+
+def _system_offset(epoch):
+    return time.localtime(epoch).tm_gmtoff
+
+
+@lru_cache(maxsize=256)
+def offset_table(zone, low, high):
+    # UTC offsets of zone (None: system zone) between the instants low and
+    # high, for converting many local times at once: (bounds, offsets), where
+    # offsets[i + 1] applies from local time bounds[i] on. Each bound is the
+    # later of the two wall-clock readings at a change, which resolves
+    # skipped and repeated hours the way ZoneIndex.from_local() does.
+    offset_at = _system_offset if zone is None else zone.offset_at
+    bounds, offsets = [], [offset_at(low)]
+    when = low
+    while when < high:
+        following = min(when + SAMPLE_SECONDS, high)
+        if offset_at(following) != offsets[-1]:
+            while following - when > 1:
+                middle = (when + following) // 2
+                if offset_at(middle) == offsets[-1]:
+                    when = middle
+                else:
+                    following = middle
+            offset = offset_at(following)
+            bounds.append(following + max(offsets[-1], offset))
+            offsets.append(offset)
+        when = following
+    return bounds, offsets
+
+
+def local_timestamp(moment, zone):
+    # Epoch seconds of a naive wall-clock datetime in zone. The system zone
+    # follows the same rules through fold=0 (PEP 495).
+    if zone is None:
+        return int(moment.timestamp())
+    return zone.from_local((moment - LOCAL_EPOCH) // timedelta(seconds=1))
+
+
+def aware_datetime(epoch, zone):
+    # Instant as a datetime: aware in zone, naive system-local time for None
+    if zone is None:
+        return datetime.fromtimestamp(epoch)
+    return datetime.fromtimestamp(epoch, zone.zone)